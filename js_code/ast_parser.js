@@ -1,20 +1,106 @@
 // jsファイルを読み込んでASTを生成
 const esprima = require("esprima");
 const fs = require("fs");
+const readline = require("readline");
 
-// コマンドライン引数からファイルパスを取得
-const filePath = process.argv[2];
-if (!filePath) {
-    console.error("Usage: node ast_parser.js <path_to_js_file>");
-    process.exit(1);
+// 位置情報の出力形式からesprimaのオプションを生成する
+// full: loc（行・列）を出力 / range: [開始, 終了] のオフセットのみ出力 / none: 出力しない
+function parseOptions(locMode) {
+    switch (locMode || "full") {
+        case "full":
+            return { loc: true };
+        case "range":
+            return { range: true };
+        case "none":
+            return {};
+        default:
+            throw new Error(`Unknown loc mode: ${locMode}`);
+    }
 }
 
-// ファイルを読み込んでASTに変換し、JSONとして標準出力に出力
-try {
-    const code = fs.readFileSync(filePath, "utf-8");
-    const ast = esprima.parseScript(code, { loc: true });
-    console.log(JSON.stringify(ast, null, 2));
-} catch (e) {
-    console.error(`Error parsing file ${filePath}:`, e.message);
-    process.exit(1);
-}
\ No newline at end of file
+// 複数のソースコードを解析する。解析エラーはスニペットごとに {"error": ...} として返す
+function parseMany(codes, options) {
+    return codes.map((code) => {
+        try {
+            return { ast: esprima.parseScript(code, options) };
+        } catch (e) {
+            return { error: e.message };
+        }
+    });
+}
+
+// ワーカーモード: 標準入力から1行1リクエストのJSONを受け取り、1行1レスポンスで返す
+// リクエスト: {"id": <任意>, "code": "<ソースコード>", "loc": "full" | "range" | "none"}
+//            または {"id": <任意>, "codes": ["<ソースコード>", ...], "loc": ...}
+// レスポンス: {"id": <任意>, "ast": {...}} または {"id": <任意>, "error": "<メッセージ>"}
+//            codesの場合は {"id": <任意>, "results": [{"ast": {...}} | {"error": "<メッセージ>"}, ...]}
+function runWorker() {
+    const rl = readline.createInterface({ input: process.stdin, terminal: false });
+    rl.on("line", (line) => {
+        if (!line.trim()) {
+            return;
+        }
+        let request;
+        try {
+            request = JSON.parse(line);
+        } catch (e) {
+            process.stdout.write(JSON.stringify({ id: null, error: `Invalid request: ${e.message}` }) + "\n");
+            return;
+        }
+        let response;
+        try {
+            if (Array.isArray(request.codes)) {
+                response = { id: request.id, results: parseMany(request.codes, parseOptions(request.loc)) };
+                process.stdout.write(JSON.stringify(response) + "\n");
+                return;
+            }
+            const ast = esprima.parseScript(request.code, parseOptions(request.loc));
+            response = { id: request.id, ast: ast };
+        } catch (e) {
+            response = { id: request.id, error: e.message };
+        }
+        process.stdout.write(JSON.stringify(response) + "\n");
+    });
+}
+
+const args = process.argv.slice(2);
+const flags = args.filter((arg) => arg.startsWith("--"));
+const positional = args.filter((arg) => !arg.startsWith("--"));
+
+// コンパクト出力・位置情報の形式をコマンドライン引数から取得
+// --compact: インデントなしで出力 / --loc=...: 位置情報の出力形式
+const compact = flags.includes("--compact");
+const locFlag = flags.find((flag) => flag.startsWith("--loc="));
+const locMode = locFlag ? locFlag.slice("--loc=".length) : "full";
+
+if (flags.includes("--worker")) {
+    runWorker();
+} else if (flags.includes("--batch")) {
+    // バッチモード: 標準入力からソースコードの配列(JSON)を受け取り、結果の配列を出力する
+    try {
+        const codes = JSON.parse(fs.readFileSync(0, "utf-8"));
+        const results = parseMany(codes, parseOptions(locMode));
+        console.log(compact ? JSON.stringify(results) : JSON.stringify(results, null, 2));
+    } catch (e) {
+        console.error("Error reading batch from stdin:", e.message);
+        process.exit(1);
+    }
+} else {
+    // コマンドライン引数からファイルパスを取得（省略または "-" の場合は標準入力から読み込む）
+    const filePath = positional[0];
+    if (flags.includes("--help")) {
+        console.error("Usage: node ast_parser.js [<path_to_js_file> | - | --batch] [--compact] [--loc=full|range|none] | --worker");
+        process.exit(1);
+    }
+    const fromStdin = !filePath || filePath === "-";
+
+    // ファイルを読み込んでASTに変換し、JSONとして標準出力に出力
+    try {
+        const code = fs.readFileSync(fromStdin ? 0 : filePath, "utf-8");
+        const ast = esprima.parseScript(code, parseOptions(locMode));
+        console.log(compact ? JSON.stringify(ast) : JSON.stringify(ast, null, 2));
+    } catch (e) {
+        console.error(`Error parsing ${fromStdin ? "stdin" : `file ${filePath}`}:`, e.message);
+        process.exit(1);
+    }
+}
@@ -9,6 +9,9 @@ JSCODE = ROOT / "js_code"
 QUERIES = ROOT / "codeql_queries_js"
 PATTERN = ROOT / "pattern"
 MB_DATA = ROOT / "mb_data"
+CACHE = ROOT / ".cache"
+CODEQL_DB = CACHE / "codeql-db"
+RESULTS = ROOT / "results"
 
 SRC = ROOT / "src"
 SEARCH = SRC / "mb_search"
@@ -3,34 +3,87 @@ import json
 import subprocess
 import os
 import uuid
+from array import array
+from bisect import bisect_left
 from functools import reduce
 
 from mb_search import path_const
+from mb_search import metrics
+from mb_search.ast import backends, cache, worker
+from mb_search.ast.compact import CompactNode, compact_ast
+from mb_search.ast.worker import DEFAULT_LOCATIONS, LOCATION_MODES, ASTParseError
 
-def generate_ast(code_snippet: str, filename="temp_code.js") -> dict:
+# 差分比較で無視する位置情報のキー
+_LOCATION_KEYS = ("loc", "range")
+
+# ASTのノード・子ノードのリストとして扱う型（dict・listの表現と省メモリな表現の両方）
+_NODE_TYPES = (dict, CompactNode)
+_LIST_TYPES = (list, tuple)
+_CONTAINER_TYPES = _NODE_TYPES + _LIST_TYPES
+
+def _cache_options(locations: str, backend: str) -> str:
+    """ASTキャッシュのキーに使う生成オプション（既定のNode.jsパーサーは従来のキーのまま）"""
+    cache_tag = backends.get_backend(backend).cache_tag if backend != backends.DEFAULT_BACKEND else None
+    return f"loc={locations}" if cache_tag is None else f"loc={locations};parser={cache_tag}"
+
+def generate_ast(code_snippet: str, use_worker: bool = True, use_cache: bool = True, locations: str = DEFAULT_LOCATIONS, compact: bool = False, backend: str | None = None) -> dict:
     """与えられたコードスニペットからAST(JSON)を生成する"
 
+    コードは標準入力経由でパーサーに渡すため、一時ファイルは作成しない
+    （スレッド・プロセスから並行に呼び出しても安全）。
+
     Args:
         code_snippet (str): コードスニペット
-        filename (str, optional): 一時ファイル名. Defaults to "temp_code.js".
+        use_worker (bool, optional): 常駐ワーカーを利用するか. Defaults to True.
+        use_cache (bool, optional): ディスク上のASTキャッシュを利用するか. Defaults to True.
+        locations (str, optional): 位置情報の出力形式（"full", "range", "none"）. Defaults to DEFAULT_LOCATIONS.
+        compact (bool, optional): 省メモリな表現（CompactNode）で返すか. Defaults to False.
+        backend (str | None, optional): パーサーのバックエンド名（Noneの場合は環境変数 MB_SEARCH_PARSER、なければ "node"）. Defaults to None.
 
     Returns:
         dict: 生成されたAST
     """
-    with open(filename, "w", encoding="utf-8") as f:
-        f.write(code_snippet)
-    
+    if locations not in LOCATION_MODES:
+        raise ValueError(f"locations must be one of {LOCATION_MODES}: {locations}")
+    backend = backends.resolve_name(backend)
+
+    if compact:
+        return compact_ast(generate_ast(code_snippet, use_worker=use_worker, use_cache=use_cache, locations=locations, backend=backend))
+
+    if use_cache:
+        # 同じソースコード・パーサーのASTが既にあれば再解析しない
+        ast_cache = cache.get_cache()
+        options = _cache_options(locations, backend)
+        with metrics.timer("parse.cache_lookup"):
+            ast = ast_cache.get(code_snippet, options)
+        if ast is None:
+            metrics.count("parse.cache_miss")
+            with metrics.timer("parse"):
+                ast = generate_ast(code_snippet, use_worker=use_worker, use_cache=False, locations=locations, backend=backend)
+            with metrics.timer("parse.cache_store"):
+                ast_cache.put(code_snippet, ast, options)
+        else:
+            metrics.count("parse.cache_hit")
+        return ast
+
+    if backend != backends.DEFAULT_BACKEND:
+        return backends.get_backend(backend).parse(code_snippet, locations)
+
+    if use_worker:
+        # 常駐させたNode.jsプロセスに解析させる（起動コストは初回のみ）
+        return worker.get_worker().parse(code_snippet, locations)
+
     # プロジェクトルートからの相対パスを使用
     ast_parser_path = path_const.JSCODE / "ast_parser.js"
 
     result = subprocess.run(
-        ["node", ast_parser_path, filename],
+        ["node", ast_parser_path, "-", "--compact", f"--loc={locations}"],
+        input=code_snippet,
         capture_output=True,
         text=True,
+        encoding="utf-8",
         check=True
     )
-    
-    os.remove(filename)
 
     # デバッグ：ASTをJSONとして出力
     # os.makedirs(path_const.SRC / "debug" / "ast", exist_ok=True)
@@ -41,25 +94,160 @@ def generate_ast(code_snippet: str, filename="temp_code.js") -> dict:
 
     return json.loads(result.stdout)
 
-def find_structural_difference(node1: dict, node2: dict) -> tuple[dict | None, list]:
+def generate_asts(code_snippets: list[str], use_worker: bool = True, use_cache: bool = True, locations: str = DEFAULT_LOCATIONS, compact: bool = False, backend: str | None = None) -> list:
+    """複数のコードスニペットをまとめて解析し、ASTのリストを生成する
+
+    Node.jsへの問い合わせは1回にまとめ、解析エラーはスニペットごとに返す。
+
+    Args:
+        code_snippets (list[str]): コードスニペットのリスト
+        use_worker (bool, optional): 常駐ワーカーを利用するか. Defaults to True.
+        use_cache (bool, optional): ディスク上のASTキャッシュを利用するか. Defaults to True.
+        locations (str, optional): 位置情報の出力形式（"full", "range", "none"）. Defaults to DEFAULT_LOCATIONS.
+        compact (bool, optional): 省メモリな表現（CompactNode）で返すか. Defaults to False.
+        backend (str | None, optional): パーサーのバックエンド名（Noneの場合は環境変数 MB_SEARCH_PARSER、なければ "node"）. Defaults to None.
+
+    Returns:
+        list: 入力と同じ順序のASTのリスト（解析に失敗したスニペットはASTParseError）
+    """
+    if locations not in LOCATION_MODES:
+        raise ValueError(f"locations must be one of {LOCATION_MODES}: {locations}")
+    backend = backends.resolve_name(backend)
+
+    if compact:
+        asts = generate_asts(code_snippets, use_worker=use_worker, use_cache=use_cache, locations=locations, backend=backend)
+        return [ast if isinstance(ast, ASTParseError) else compact_ast(ast) for ast in asts]
+
+    code_snippets = list(code_snippets)
+    if not code_snippets:
+        return []
+
+    if use_cache:
+        # キャッシュにないスニペットだけをまとめて解析する
+        ast_cache = cache.get_cache()
+        options = _cache_options(locations, backend)
+        with metrics.timer("parse.cache_lookup"):
+            asts = [ast_cache.get(code, options) for code in code_snippets]
+        missing = [i for i, ast in enumerate(asts) if ast is None]
+        metrics.count("parse.cache_hit", len(asts) - len(missing))
+        if missing:
+            metrics.count("parse.cache_miss", len(missing))
+            with metrics.timer("parse"):
+                parsed = generate_asts([code_snippets[i] for i in missing], use_worker=use_worker, use_cache=False, locations=locations, backend=backend)
+            with metrics.timer("parse.cache_store"):
+                for i, ast in zip(missing, parsed):
+                    asts[i] = ast
+                    if not isinstance(ast, ASTParseError):
+                        ast_cache.put(code_snippets[i], ast, options)
+        return asts
+
+    if backend != backends.DEFAULT_BACKEND:
+        return backends.get_backend(backend).parse_many(code_snippets, locations)
+
+    if use_worker:
+        return worker.get_worker().parse_many(code_snippets, locations)
+
+    # プロジェクトルートからの相対パスを使用
+    ast_parser_path = path_const.JSCODE / "ast_parser.js"
+    command = ["node", ast_parser_path, "--batch", "--compact", f"--loc={locations}"]
+
+    result = subprocess.run(
+        command,
+        input=json.dumps(code_snippets),
+        capture_output=True,
+        text=True,
+        encoding="utf-8",
+        check=True
+    )
+
+    return worker.results_to_asts(json.loads(result.stdout), command)
+
+def compute_structural_hashes(node, hashes: dict | None = None) -> dict:
+    """ASTの各ノードについて、位置情報を除いた部分木の構造ハッシュ（Merkleハッシュ）を求める
+
+    ハッシュは組み込みの hash() で合成するため、文字列のハッシュはプロセスごとに異なる
+    （PYTHONHASHSEED によるランダム化）。同じプロセス内での比較にだけ使い、
+    保存したり、別のワーカープロセスで計算したハッシュと比較したりしてはならない。
+
+    Args:
+        node: ASTのルートノード
+        hashes (dict | None, optional): 結果を追記する辞書. Defaults to None.
+
+    Returns:
+        dict: id(ノード) をキー、部分木のハッシュ値を値とする辞書（dictとlistのみ）
+    """
+    if hashes is None:
+        hashes = {}
+    _structural_hash(node, hashes)
+    return hashes
+
+def _structural_hash(value, hashes: dict) -> int:
+    """部分木のハッシュを再帰的に計算し、dict・listの結果をhashesに記録する
+
+    dictはキーの順序に依存しないようfrozensetで、listは要素順のtupleでハッシュを合成する。
+    """
+    if isinstance(value, _NODE_TYPES):
+        digest = hash(frozenset([
+            (key, _structural_hash(child, hashes))
+            for key, child in value.items()
+            if key not in _LOCATION_KEYS
+        ]))
+    elif isinstance(value, _LIST_TYPES):
+        digest = hash(("[", tuple([_structural_hash(child, hashes) for child in value])))
+    else:
+        # プリミティブ値は型を含めて区別する（1 と 1.0 や True を同一視しない）
+        return hash((type(value).__name__, value))
+
+    hashes[id(value)] = digest
+    return digest
+
+def find_structural_difference(node1: dict, node2: dict, hashes1: dict | None = None, hashes2: dict | None = None) -> tuple[dict | None, list]:
     """2つのASTノードを再帰的に比較し、構造的な差分を見つける
 
+    同一の部分木は比較せずに読み飛ばす。構造ハッシュが渡された場合はハッシュで、
+    渡されない場合は等値比較（最初の不一致で止まる）で同一かを判定する。
+    最初の差分で走査を終えるため、ハッシュを求めるためだけに木全体を辿ることはしない。
+
     Args:
         node1 (dict): 比較対象のASTノード1
         node2 (dict): 比較対象のASTノード2
+        hashes1 (dict | None, optional): node1の構造ハッシュ（同じプロセスで compute_structural_hashes で求めたもの）. Defaults to None.
+        hashes2 (dict | None, optional): node2の構造ハッシュ（同じプロセスで compute_structural_hashes で求めたもの）. Defaults to None.
 
     Returns:
         tuple[dict | None, list]: 構造的な差分を含むタプル
     """
-    if not isinstance(node1, dict) or not isinstance(node2, dict):
+    if hashes1 is None or hashes2 is None:
+        hashes1 = hashes2 = None
+    return _find_difference(node1, node2, hashes1, hashes2)
+
+def _same_subtree(value1, value2, hashes1: dict | None, hashes2: dict | None) -> bool:
+    """2つの部分木が同一か判定する（ハッシュがない場合は等値比較で判定する）
+
+    等値比較は位置情報も比較するため、位置情報を含むASTでは同一の部分木を見逃すことがあるが、
+    その場合も呼び出し側が子ノードを辿って比較するため結果は変わらない。
+    """
+    if hashes1 is None:
+        return value1 == value2
+    hash1 = hashes1.get(id(value1))
+    return hash1 is not None and hash1 == hashes2.get(id(value2))
+
+def _find_difference(node1: dict, node2: dict, hashes1: dict | None, hashes2: dict | None) -> tuple[dict | None, list]:
+    """find_structural_difference の再帰処理"""
+    if not isinstance(node1, _NODE_TYPES) or not isinstance(node2, _NODE_TYPES):
+        return None, []
+
+    # 同一構造の部分木には差分がない
+    if _same_subtree(node1, node2, hashes1, hashes2):
         return None, []
         
     if node1.get("type") != node2.get("type"):
         return node1, []
 
-    # "loc"キーを除いたすべてのキーを比較対象とする
+    # 位置情報のキーを除いたすべてのキーを比較対象とする
     keys = set(node1.keys()) | set(node2.keys())
-    keys.discard("loc")
+    for location_key in _LOCATION_KEYS:
+        keys.discard(location_key)
 
     for key in sorted(list(keys)): # 順序を固定して再現性を担保
         
@@ -74,10 +262,13 @@ def find_structural_difference(node1: dict, node2: dict) -> tuple[dict | None, l
         val1 = node1[key]
         val2 = node2[key]
         
-        if isinstance(val1, list) and isinstance(val2, list):
+        if isinstance(val1, _LIST_TYPES) and isinstance(val2, _LIST_TYPES):
+            if _same_subtree(val1, val2, hashes1, hashes2):
+                continue
+
             # 共通の長さの部分を比較
             for i, (child1, child2) in enumerate(zip(val1, val2)):
-                diff_node, child_path = find_structural_difference(child1, child2)
+                diff_node, child_path = _find_difference(child1, child2, hashes1, hashes2)
                 if diff_node:
                     return diff_node, path_to_diff + [i] + child_path
             
@@ -85,51 +276,401 @@ def find_structural_difference(node1: dict, node2: dict) -> tuple[dict | None, l
             if len(val1) > len(val2):
                 return val1[len(val2)], path_to_diff + [len(val2)]
 
-        elif isinstance(val1, dict) and isinstance(val2, dict):
-            diff_node, child_path = find_structural_difference(val1, val2)
+        elif isinstance(val1, _NODE_TYPES) and isinstance(val2, _NODE_TYPES):
+            diff_node, child_path = _find_difference(val1, val2, hashes1, hashes2)
             if diff_node:
                 return diff_node, path_to_diff + child_path
         
         # プリミティブな値が異なる場合は差分とする
-        elif not isinstance(val1, (dict, list)) and val1 != val2:
+        elif not isinstance(val1, _CONTAINER_TYPES) and val1 != val2:
             return node1, []
 
     return None, []
 
-def _is_in_loop_recursive(ast_root: dict, path: list) -> bool:
-    """指定されたパスの祖先にループ構造があるか再帰的に判定する
+def find_structural_differences(node1: dict, node2: dict, hashes1: dict | None = None, hashes2: dict | None = None) -> list[tuple[dict, list]]:
+    """2つのASTを1回の走査で比較し、差分となる最小の部分木を全て列挙する
+
+    GumTreeのトップダウン照合と同様に、構造ハッシュが一致する部分木を対応付けてから
+    残りを比較する。子ノードのリストは先頭・末尾の一致部分と、両方のリストに1度だけ
+    現れるハッシュ（patience diff のアンカー）で対応付け、アンカーの間に残った小さな区間
+    だけを最長共通部分列で対応付ける。文の挿入・削除があっても後続の比較がずれず、
+    大きなリストでも処理時間・メモリはほぼ線形に収まる。
+
+    Args:
+        node1 (dict): 比較対象のASTノード1（slow_code側）
+        node2 (dict): 比較対象のASTノード2（fast_code側）
+        hashes1 (dict | None, optional): node1の構造ハッシュ（Noneの場合は計算する）. Defaults to None.
+        hashes2 (dict | None, optional): node2の構造ハッシュ（Noneの場合は計算する）. Defaults to None.
+
+    Returns:
+        list[tuple[dict, list]]: (差分ノード, 差分ノードへのパス) のリスト（出現順）
+    """
+    if hashes1 is None:
+        hashes1 = compute_structural_hashes(node1)
+    if hashes2 is None:
+        hashes2 = compute_structural_hashes(node2)
+
+    differences = []
+    _collect_differences(node1, node2, [], hashes1, hashes2, differences)
+    return differences
+
+def _collect_differences(node1: dict, node2: dict, path: list, hashes1: dict, hashes2: dict, differences: list) -> None:
+    """find_structural_differences の再帰処理（差分をdifferencesに追記する）"""
+    if not isinstance(node1, _NODE_TYPES) or not isinstance(node2, _NODE_TYPES):
+        return
+
+    if _same_subtree(node1, node2, hashes1, hashes2):
+        return
+
+    if node1.get("type") != node2.get("type"):
+        differences.append((node1, path))
+        return
+
+    keys = set(node1.keys()) | set(node2.keys())
+    for location_key in _LOCATION_KEYS:
+        keys.discard(location_key)
+
+    node_reported = False
+    for key in sorted(keys):
+        if key not in node2:
+            differences.append((node1, path + [key]))
+            continue
+        if key not in node1:
+            # fast_code側にのみ存在するノードは差分として扱わない
+            continue
+
+        val1 = node1[key]
+        val2 = node2[key]
+
+        if isinstance(val1, _LIST_TYPES) and isinstance(val2, _LIST_TYPES):
+            if not _same_subtree(val1, val2, hashes1, hashes2):
+                _collect_list_differences(val1, val2, path + [key], hashes1, hashes2, differences)
+
+        elif isinstance(val1, _NODE_TYPES) and isinstance(val2, _NODE_TYPES):
+            _collect_differences(val1, val2, path + [key], hashes1, hashes2, differences)
+
+        # プリミティブな値が異なる場合はノード自体を差分とする（1ノードにつき1回）
+        elif not isinstance(val1, _CONTAINER_TYPES) and val1 != val2 and not node_reported:
+            differences.append((node1, path))
+            node_reported = True
+
+def _collect_list_differences(list1: list, list2: list, path: list, hashes1: dict, hashes2: dict, differences: list) -> None:
+    """子ノードのリストを対応付けて差分を収集する"""
+    def child_key(child, hashes):
+        return hashes.get(id(child), ("value", child)) if isinstance(child, _CONTAINER_TYPES) else ("value", child)
+
+    keys1 = [child_key(child, hashes1) for child in list1]
+    keys2 = [child_key(child, hashes2) for child in list2]
+    anchors = _align_keys(keys1, keys2) + [(len(keys1), len(keys2))]
+
+    # 対応付けられた要素の間に残った要素は、順に組にして再帰的に比較する
+    prev1, prev2 = 0, 0
+    for anchor1, anchor2 in anchors:
+        gap1 = range(prev1, anchor1)
+        gap2 = range(prev2, anchor2)
+        for offset, i in enumerate(gap1):
+            child1 = list1[i]
+            if not isinstance(child1, _NODE_TYPES):
+                continue
+            j = prev2 + offset
+            child2 = list2[j] if j < anchor2 else None
+            if isinstance(child2, _NODE_TYPES) and child1.get("type") == child2.get("type"):
+                _collect_differences(child1, child2, path + [i], hashes1, hashes2, differences)
+            else:
+                # 対応する要素がない、または種類が異なるslow_code側の要素は部分木ごと差分とする
+                differences.append((child1, path + [i]))
+        prev1, prev2 = anchor1 + 1, anchor2 + 1
+
+# 最長共通部分列の表を作る区間の大きさ（要素数の積）の上限
+_LCS_TABLE_LIMIT = 4096
+
+def _align_keys(keys1: list, keys2: list) -> list[tuple[int, int]]:
+    """2つの列の要素を patience diff の方法で対応付ける
+
+    先頭・末尾の一致部分を対応付けた後、区間内で両方の列に1度だけ現れる要素を
+    アンカーとし、その間の区間を同様に分割する。アンカーのない区間は、小さければ
+    最長共通部分列で対応付け、大きければ対応付けない（呼び出し側で位置順に比較する）。
+
+    Args:
+        keys1 (list): 列1（ハッシュ可能な要素）
+        keys2 (list): 列2（ハッシュ可能な要素）
+
+    Returns:
+        list[tuple[int, int]]: 対応する添字の組のリスト（添字の昇順）
+    """
+    pairs = []
+    stack = [(0, len(keys1), 0, len(keys2))]
+    while stack:
+        lo1, hi1, lo2, hi2 = stack.pop()
+        while lo1 < hi1 and lo2 < hi2 and keys1[lo1] == keys2[lo2]:
+            pairs.append((lo1, lo2))
+            lo1 += 1
+            lo2 += 1
+        while lo1 < hi1 and lo2 < hi2 and keys1[hi1 - 1] == keys2[hi2 - 1]:
+            hi1 -= 1
+            hi2 -= 1
+            pairs.append((hi1, hi2))
+        if lo1 == hi1 or lo2 == hi2:
+            continue
+
+        anchors = _unique_anchors(keys1, keys2, lo1, hi1, lo2, hi2)
+        if anchors:
+            pairs.extend(anchors)
+            bounds = [(lo1 - 1, lo2 - 1)] + anchors + [(hi1, hi2)]
+            stack.extend((prev1 + 1, next1, prev2 + 1, next2) for (prev1, prev2), (next1, next2) in zip(bounds, bounds[1:]))
+        elif (hi1 - lo1) * (hi2 - lo2) <= _LCS_TABLE_LIMIT:
+            pairs.extend((i + lo1, j + lo2) for i, j in _longest_common_subsequence(keys1[lo1:hi1], keys2[lo2:hi2]))
+    pairs.sort()
+    return pairs
+
+def _unique_anchors(keys1: list, keys2: list, lo1: int, hi1: int, lo2: int, hi2: int) -> list[tuple[int, int]]:
+    """区間内で両方の列に1度だけ現れる要素の組のうち、順序を保つ最長のものを求める"""
+    positions1, positions2 = {}, {}
+    for i in range(lo1, hi1):
+        positions1[keys1[i]] = -1 if keys1[i] in positions1 else i
+    for j in range(lo2, hi2):
+        positions2[keys2[j]] = -1 if keys2[j] in positions2 else j
+    candidates = [
+        (i, positions2[key])
+        for key, i in positions1.items()
+        if i >= 0 and positions2.get(key, -1) >= 0
+    ]
+    candidates.sort()
+
+    # 列2の添字の最長増加部分列（patience sorting、O(k log k)）
+    tails, tail_indices, previous = [], [], []
+    for n, (_, j) in enumerate(candidates):
+        k = bisect_left(tails, j)
+        if k == len(tails):
+            tails.append(j)
+            tail_indices.append(n)
+        else:
+            tails[k] = j
+            tail_indices[k] = n
+        previous.append(tail_indices[k - 1] if k else -1)
+
+    anchors = []
+    n = tail_indices[-1] if tail_indices else -1
+    while n >= 0:
+        anchors.append(candidates[n])
+        n = previous[n]
+    anchors.reverse()
+    return anchors
+
+def _longest_common_subsequence(keys1: list, keys2: list) -> list[tuple[int, int]]:
+    """2つの列の最長共通部分列を求め、対応する添字の組を返す（_LCS_TABLE_LIMIT 以下の小さな列に使う）"""
+    if not keys1 or not keys2:
+        return []
+
+    rows, cols = len(keys1), len(keys2)
+    table = [[0] * (cols + 1) for _ in range(rows + 1)]
+    for i in range(rows - 1, -1, -1):
+        row, next_row = table[i], table[i + 1]
+        for j in range(cols - 1, -1, -1):
+            if keys1[i] == keys2[j]:
+                row[j] = next_row[j + 1] + 1
+            else:
+                row[j] = max(next_row[j], row[j + 1])
+
+    pairs = []
+    i = j = 0
+    while i < rows and j < cols:
+        if keys1[i] == keys2[j]:
+            pairs.append((i, j))
+            i += 1
+            j += 1
+        elif table[i + 1][j] >= table[i][j + 1]:
+            i += 1
+        else:
+            j += 1
+    return pairs
+
+# JavaScriptのループ構造を全て含める
+LOOP_TYPES = frozenset([
+    "ForStatement",           # for (;;) {}
+    "WhileStatement",         # while () {}
+    "DoWhileStatement",       # do {} while ()
+    "ForInStatement",         # for (key in obj) {}
+    "ForOfStatement"          # for (value of iterable) {}
+])
+
+# 関数の種類（ループのネストの深さは関数の本体で数え直す）
+FUNCTION_TYPES = frozenset(["FunctionDeclaration", "FunctionExpression", "ArrowFunctionExpression"])
+
+# ノードの種類名とIDの対応（AncestorIndexで種類を整数で保持するため）
+_TYPE_IDS: dict[str | None, int] = {}
+_TYPE_NAMES: list[str | None] = []
+
+def _type_id(node_type: str | None) -> int:
+    """ノードの種類名に対応するIDを取得する（未登録の場合は登録する）"""
+    type_id = _TYPE_IDS.get(node_type)
+    if type_id is None:
+        type_id = _TYPE_IDS[node_type] = len(_TYPE_NAMES)
+        _TYPE_NAMES.append(node_type)
+    return type_id
+
+class AncestorIndex:
+    """ASTの各ノードの種類と親ノードを配列で保持する索引
+
+    ASTごとに1度だけ構築し、任意のパスの祖先ノードをルートからの再探索なしに辿る。
+    ノード（dict）は深さ優先の出現順に番号付けし、types[i] に種類のID、
+    parents[i] に親ノードの番号（ルートは-1）を格納する。
+    path を指定した場合はそのパス上のノードだけを登録する（O(深さ)で構築でき、
+    そのパスとその接頭辞についての問い合わせにだけ答えられる）。
+    """
+
+    __slots__ = ("root", "types", "parents", "_positions")
+
+    def __init__(self, ast_root: dict, path: list | None = None):
+        self.root = ast_root
+        self.types = array("H")
+        self.parents = array("i")
+        self._positions = {}
+
+        if path is not None:
+            self._add_path(path)
+            return
+
+        stack = [(ast_root, -1)]
+        while stack:
+            value, parent = stack.pop()
+            if isinstance(value, _NODE_TYPES):
+                position = len(self.types)
+                self._positions[id(value)] = position
+                self.types.append(_type_id(value.get("type")))
+                self.parents.append(parent)
+                parent = position
+                children = value.values()
+            elif isinstance(value, _LIST_TYPES):
+                children = value
+            else:
+                continue
+            stack.extend((child, parent) for child in reversed(list(children)) if isinstance(child, _CONTAINER_TYPES))
+
+    def _add_path(self, path: list) -> None:
+        """ルートから path を辿り、パス上のノードだけを登録する"""
+        value = self.root
+        nodes = [value]
+        for key in path:
+            try:
+                value = value[key]
+            except (KeyError, TypeError, IndexError):
+                break
+            if isinstance(value, _NODE_TYPES):
+                nodes.append(value)
+        for position, node in enumerate(nodes):
+            self._positions[id(node)] = position
+            self.types.append(_type_id(node.get("type")))
+            self.parents.append(position - 1)
+
+    def _deepest_node(self, path: list) -> int:
+        """パスを辿り、到達できた最も深いノードの番号を返す"""
+        position = 0
+        value = self.root
+        for key in path:
+            try:
+                value = value[key]
+            except (KeyError, TypeError, IndexError):
+                break
+            if isinstance(value, _NODE_TYPES):
+                position = self._positions.get(id(value), position)
+        return position
+
+    def ancestor_types(self, path: list, include_self: bool = True, include_root: bool = True):
+        """パス上のノードの種類を深い方から順に列挙する
+
+        Args:
+            path (list): ノードのパス
+            include_self (bool, optional): パスが指すノード自身を含めるか. Defaults to True.
+            include_root (bool, optional): ルートノードを含めるか. Defaults to True.
+
+        Yields:
+            str | None: ノードの種類
+        """
+        if not include_self:
+            if not path:
+                return
+            path = path[:-1]
+
+        position = self._deepest_node(path)
+        while position >= 0:
+            if position == 0 and not include_root:
+                return
+            yield _TYPE_NAMES[self.types[position]]
+            position = self.parents[position]
+
+    def has_ancestor(self, path: list, node_types, include_self: bool = True, include_root: bool = True) -> bool:
+        """パス上に指定された種類のノードがあるか判定する"""
+        return any(node_type in node_types for node_type in self.ancestor_types(path, include_self, include_root))
+
+    def count_ancestors(self, path: list, node_types, include_self: bool = True, include_root: bool = True) -> int:
+        """パス上にある指定された種類のノードの数を数える（ループのネストの深さなど）"""
+        return sum(1 for node_type in self.ancestor_types(path, include_self, include_root) if node_type in node_types)
+
+def build_ancestor_index(ast_root: dict, path: list | None = None) -> AncestorIndex:
+    """ASTの祖先ノードの索引を構築する
+
+    1つのパスについてだけ問い合わせる場合は path を指定し、パス上のノードだけを登録する。
+    多数のパスに問い合わせる場合は path を省略し、AST全体の索引を共有する。
+
+    Args:
+        ast_root (dict): ASTのルートノード
+        path (list | None, optional): 索引に登録するパス（Noneの場合はAST全体）. Defaults to None.
+
+    Returns:
+        AncestorIndex: 構築された索引
+    """
+    return AncestorIndex(ast_root, path)
+
+def _is_in_loop_recursive(ast_root: dict, path: list, index: AncestorIndex | None = None) -> bool:
+    """指定されたパスの祖先にループ構造があるか判定する
 
     Args:
         ast_root (dict): ASTのルートノード
         path (list): ノードのパス
+        index (AncestorIndex | None, optional): 構築済みの索引（Noneの場合はパス上だけの索引を構築する）. Defaults to None.
 
     Returns:
         bool: ループ構造が存在する場合はTrue、それ以外はFalse
     """
     if not path:
         return False
-    
-    # パスを逆順に辿って親ノードをチェック
-    for i in range(len(path), 0, -1):
-        parent_path = path[:i]
+
+    if index is None:
+        index = build_ancestor_index(ast_root, path)
+
+    # パスが指すノード自身からルートの直下までを深い順にチェック
+    return index.has_ancestor(path, LOOP_TYPES, include_self=True, include_root=False)
+
+def _loop_depth(ast_root: dict, path: list) -> int:
+    """指定されたパスを囲むループのネストの深さを求める
+
+    クエリの loopDepth と同じく、本体（"body"）を通って入ったループだけを数える
+    （ループの条件式・更新式はそのループの深さに含めない）。
+    getAChildStmt* は関数の本体に入らないため、本体がブロックの関数に入った時点で数え直す。
+
+    Args:
+        ast_root (dict): ASTのルートノード
+        path (list): ノードのパス
+
+    Returns:
+        int: ループのネストの深さ（ループ外の場合は0）
+    """
+    depth = 0
+    value = ast_root
+    for key in path:
         try:
-            # ルートから指定されたパスのノードを取得
-            current_node = _get_property_by_path(ast_root, parent_path)
-            if isinstance(current_node, dict):
-                node_type = current_node.get("type")
-                # JavaScriptのループ構造を全て含める
-                if node_type in [
-                    "ForStatement",           # for (;;) {}
-                    "WhileStatement",         # while () {}
-                    "DoWhileStatement",       # do {} while ()
-                    "ForInStatement",         # for (key in obj) {}
-                    "ForOfStatement"          # for (value of iterable) {}
-                ]:
-                    return True
+            child = value[key]
         except (KeyError, TypeError, IndexError):
-            continue
-    
-    return False
+            break
+        if key == "body" and isinstance(value, _NODE_TYPES):
+            node_type = value.get("type")
+            if node_type in LOOP_TYPES:
+                depth += 1
+            elif node_type in FUNCTION_TYPES and isinstance(child, _NODE_TYPES) and child.get("type") == "BlockStatement":
+                depth = 0
+        value = child
+    return depth
 
 def _get_property_by_path(node: dict, path: list):
     """ASTノードからパスでプロパティを取得するヘルパー関数
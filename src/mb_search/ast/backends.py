@@ -0,0 +1,177 @@
+# ESTree形式のASTを生成するパーサーを切り替えるためのモジュール
+# 既定は esprima(Node.js) の常駐ワーカーで、Python版 esprima によるプロセス内の解析も選べる
+import os
+
+from mb_search.ast import worker
+from mb_search.ast.worker import DEFAULT_LOCATIONS, ASTParseError
+
+# 既定のバックエンド（環境変数 MB_SEARCH_PARSER で変更できる）
+DEFAULT_BACKEND = "node"
+
+
+class ParserBackend:
+    """パーサーのバックエンドの共通インターフェース
+
+    parse は ast_parser.js と同じ形（JSONとして読み込んだESTree）のASTを返し、
+    解析できない場合は ASTParseError を送出する。
+    """
+
+    name = None
+
+    # ASTキャッシュのキーに加える文字列（Noneの場合は既定のNode.jsパーサーとキャッシュを共有する）
+    cache_tag = None
+
+    def parse(self, code_snippet: str, locations: str = DEFAULT_LOCATIONS) -> dict:
+        """コードスニペットを解析する
+
+        Args:
+            code_snippet (str): コードスニペット
+            locations (str, optional): 位置情報の出力形式（"full", "range", "none"）. Defaults to DEFAULT_LOCATIONS.
+
+        Returns:
+            dict: 生成されたAST
+
+        Raises:
+            ASTParseError: 解析に失敗した場合
+        """
+        raise NotImplementedError
+
+    def parse_many(self, code_snippets: list, locations: str = DEFAULT_LOCATIONS) -> list:
+        """複数のコードスニペットを解析する
+
+        Args:
+            code_snippets (list): コードスニペットのリスト
+            locations (str, optional): 位置情報の出力形式（"full", "range", "none"）. Defaults to DEFAULT_LOCATIONS.
+
+        Returns:
+            list: 入力と同じ順序のASTのリスト（解析に失敗したスニペットはASTParseError）
+        """
+        asts = []
+        for code_snippet in code_snippets:
+            try:
+                asts.append(self.parse(code_snippet, locations))
+            except ASTParseError as e:
+                asts.append(e)
+        return asts
+
+
+class NodeBackend(ParserBackend):
+    """常駐させた ast_parser.js（esprima / Node.js）で解析するバックエンド"""
+
+    name = "node"
+
+    def parse(self, code_snippet: str, locations: str = DEFAULT_LOCATIONS) -> dict:
+        return worker.get_worker().parse(code_snippet, locations)
+
+    def parse_many(self, code_snippets: list, locations: str = DEFAULT_LOCATIONS) -> list:
+        return worker.get_worker().parse_many(code_snippets, locations)
+
+
+class PythonBackend(ParserBackend):
+    """Python版 esprima（pip install esprima）でプロセス内で解析するバックエンド
+
+    Node.jsの起動・プロセス間通信が不要なため、小さなスニペットの解析とプロファイリングに向く。
+    生成されるASTは ast_parser.js と一致するが、解析の成否が異なる構文がある
+    （Python版はオブジェクトのスプレッド構文を受け付け、Unicodeプロパティを含む正規表現は受け付けない）。
+    """
+
+    name = "python"
+
+    def __init__(self):
+        try:
+            import esprima
+        except ImportError as e:
+            raise ImportError("The 'python' parser backend requires the esprima package (pip install esprima)") from e
+        from esprima import nodes, objects
+        self._esprima = esprima
+        self._error = getattr(esprima, "Error", Exception)
+        self._node_class = nodes.Node
+        self._object_class = objects.Object
+        # 変換の仕方を変えた場合は _CONVERSION_VERSION を上げ、以前のキャッシュを使わないようにする
+        self.cache_tag = f"python-esprima-{getattr(esprima, 'version', 'unknown')}-{_CONVERSION_VERSION}"
+
+    def parse(self, code_snippet: str, locations: str = DEFAULT_LOCATIONS) -> dict:
+        options = {"full": {"loc": True}, "range": {"range": True}, "none": {}}[locations]
+        try:
+            ast = self._esprima.parseScript(code_snippet, options)
+        except self._error as e:
+            raise ASTParseError(1, ["esprima-python"], stderr=str(e)) from e
+        return _to_json_ast(ast, self._node_class, self._object_class)
+
+
+# _to_json_ast の出力形式の版（ASTキャッシュのキーに含める）
+_CONVERSION_VERSION = 2
+
+# Python版 esprima の属性名と ast_parser.js のキーの対応（toDict() と同じ）
+_KEY_NAMES = {"isAsync": "async", "allowAwait": "await"}
+
+# Node.js版だけが null で出力するノードのフィールド（Python版では属性自体がない）
+_NULL_FIELDS = {"ArrowFunctionExpression": ("id",)}
+
+
+def _to_json_ast(value, node_class: type, object_class: type):
+    """esprima のASTを ast_parser.js の出力をJSONとして読み込んだものと同じ値に揃える
+
+    toDict() は値がNoneのフィールドを全て除くが、ast_parser.js はノードの null のフィールド
+    （if文の alternate、宣言の init など）を残すため、ノードの属性はそのまま変換する。
+    位置情報などノード以外のオブジェクトは、Node.js版が出力しない None の属性
+    （offset, source）を除く。整数値の浮動小数点数は整数に、JSONで表現できない値
+    （正規表現リテラルの値など）は JSON.stringify と同じく空のオブジェクトにする。
+    """
+    if isinstance(value, node_class):
+        node = {
+            _KEY_NAMES.get(key, key): _to_json_ast(child, node_class, object_class)
+            for key, child in vars(value).items()
+            if not key.startswith("_")
+        }
+        for key in _NULL_FIELDS.get(node.get("type"), ()):
+            node.setdefault(key, None)
+        return node
+    if isinstance(value, object_class):
+        return {
+            _KEY_NAMES.get(key, key): _to_json_ast(child, node_class, object_class)
+            for key, child in vars(value).items()
+            if child is not None and not key.startswith("_")
+        }
+    if isinstance(value, dict):
+        return {key: _to_json_ast(child, node_class, object_class) for key, child in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_json_ast(child, node_class, object_class) for child in value]
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else value
+    if value is None or isinstance(value, (str, int, bool)):
+        return value
+    return {}
+
+
+# バックエンド名からクラスへの対応
+BACKENDS = {
+    NodeBackend.name: NodeBackend,
+    PythonBackend.name: PythonBackend,
+}
+
+_instances = {}
+
+
+def resolve_name(name: str | None = None) -> str:
+    """バックエンド名を決定する（Noneの場合は環境変数 MB_SEARCH_PARSER、なければ既定のバックエンド）"""
+    name = name or os.environ.get("MB_SEARCH_PARSER") or DEFAULT_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"parser backend must be one of {tuple(BACKENDS)}: {name}")
+    return name
+
+
+def get_backend(name: str | None = None) -> ParserBackend:
+    """プロセス内で共有されるバックエンドを取得する（初回呼び出し時に生成）
+
+    Args:
+        name (str | None, optional): バックエンド名（"node", "python"）. Defaults to None.
+
+    Returns:
+        ParserBackend: バックエンド
+    """
+    name = resolve_name(name)
+    backend = _instances.get(name)
+    if backend is None:
+        backend = _instances[name] = BACKENDS[name]()
+    return backend
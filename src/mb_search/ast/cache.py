@@ -0,0 +1,165 @@
+# 生成したASTをソースコードのハッシュをキーとしてディスクにキャッシュするモジュール
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from mb_search import path_const
+
+# キャッシュの既定の上限サイズ（バイト）
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# 上限を超えた場合、この割合まで古いエントリを削除する
+_EVICT_RATIO = 0.9
+
+# 合計サイズを再計算する間隔（put回数）
+_SIZE_CHECK_INTERVAL = 64
+
+
+def parser_version() -> str:
+    """パーサーのバージョン文字列を取得する
+
+    ast_parser.js の内容とesprimaのバージョンから求めるため、
+    どちらかが変わると以前のキャッシュは参照されなくなる。
+
+    Returns:
+        str: パーサーのバージョン
+    """
+    hasher = hashlib.sha256()
+    hasher.update((path_const.JSCODE / "ast_parser.js").read_bytes())
+
+    esprima_package = path_const.JSCODE / "node_modules" / "esprima" / "package.json"
+    try:
+        with open(esprima_package, "r", encoding="utf-8") as f:
+            esprima_version = json.load(f).get("version", "unknown")
+    except (OSError, ValueError):
+        esprima_version = "unknown"
+
+    return f"esprima-{esprima_version}-{hasher.hexdigest()[:12]}"
+
+
+def cache_key(code_snippet: str, version: str, options: str = "") -> str:
+    """ソースコード・パーサーのバージョン・オプションからキャッシュキーを求める"""
+    hasher = hashlib.sha256()
+    for part in (version, options, code_snippet):
+        hasher.update(part.encode("utf-8"))
+        hasher.update(b"\0")
+    return hasher.hexdigest()
+
+
+class ASTCache:
+    """SQLiteに保存するサイズ上限付きのLRUキャッシュ
+
+    ASTはpickle形式のバイナリで保存する。複数のプロセスから同じファイルを共有できる。
+    """
+
+    def __init__(self, path=None, max_bytes: int = DEFAULT_MAX_BYTES, version: str | None = None):
+        self.path = path or path_const.CACHE / "ast_cache.sqlite3"
+        self.max_bytes = max_bytes
+        self.version = version or parser_version()
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._puts_since_check = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # fork後の子プロセスでは新しい接続を開く
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS ast_cache ("
+                "key TEXT PRIMARY KEY, data BLOB NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ast_cache_last_access ON ast_cache(last_access)")
+            self._conn.commit()
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, code_snippet: str, options: str = "") -> dict | None:
+        """キャッシュからASTを取得する
+
+        Args:
+            code_snippet (str): コードスニペット
+            options (str, optional): パーサーのオプション. Defaults to "".
+
+        Returns:
+            dict | None: キャッシュされたAST（存在しない場合はNone）
+        """
+        key = cache_key(code_snippet, self.version, options)
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT data FROM ast_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE ast_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+        return pickle.loads(row[0])
+
+    def put(self, code_snippet: str, ast: dict, options: str = "") -> None:
+        """ASTをキャッシュに保存する
+
+        Args:
+            code_snippet (str): コードスニペット
+            ast (dict): 保存するAST
+            options (str, optional): パーサーのオプション. Defaults to "".
+        """
+        key = cache_key(code_snippet, self.version, options)
+        data = pickle.dumps(ast, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO ast_cache (key, data, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, data, len(data), time.time()),
+            )
+            conn.commit()
+
+            self._puts_since_check += 1
+            if self._puts_since_check >= _SIZE_CHECK_INTERVAL:
+                self._puts_since_check = 0
+                self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """合計サイズが上限を超えていれば、最後に参照された時刻が古いものから削除する"""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM ast_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        target = self.max_bytes * _EVICT_RATIO
+        to_delete = []
+        for key, size in conn.execute("SELECT key, size FROM ast_cache ORDER BY last_access"):
+            if total <= target:
+                break
+            to_delete.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM ast_cache WHERE key = ?", to_delete)
+        conn.commit()
+
+    def clear(self) -> None:
+        """キャッシュを全て削除する"""
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM ast_cache")
+            conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+
+_cache = None
+
+
+def get_cache() -> ASTCache:
+    """プロセス内で共有されるキャッシュを取得する（初回呼び出し時に生成）"""
+    global _cache
+    if _cache is None:
+        _cache = ASTCache()
+    return _cache
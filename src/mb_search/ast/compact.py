@@ -0,0 +1,124 @@
+# 大量のASTを保持するための省メモリなAST表現を提供するモジュール
+import sys
+from collections.abc import Mapping
+
+
+class _Shape:
+    """同じキー構成を持つノードで共有するキーの並びと位置の対応"""
+
+    __slots__ = ("keys", "positions")
+
+    def __init__(self, keys: tuple):
+        self.keys = keys
+        self.positions = {key: i for i, key in enumerate(keys)}
+
+
+# キーの並びごとに1つだけ生成した _Shape を共有する
+_SHAPES: dict[tuple, _Shape] = {}
+
+
+def _shape(keys: tuple) -> _Shape:
+    shape = _SHAPES.get(keys)
+    if shape is None:
+        shape = _SHAPES[keys] = _Shape(tuple(sys.intern(key) for key in keys))
+    return shape
+
+
+class CompactNode(Mapping):
+    """__slots__ で値だけを保持する読み取り専用のASTノード
+
+    キーの並びはノードの種類ごとに共有し、各ノードは値のタプルのみを持つ。
+    dictと同じく get・[]・in・items() で参照できるため、analyzer と creator はそのまま扱える。
+    """
+
+    __slots__ = ("_shape", "_values")
+
+    def __init__(self, shape: _Shape, values: tuple):
+        self._shape = shape
+        self._values = values
+
+    def __getitem__(self, key):
+        return self._values[self._shape.positions[key]]
+
+    def get(self, key, default=None):
+        position = self._shape.positions.get(key)
+        return default if position is None else self._values[position]
+
+    def __contains__(self, key) -> bool:
+        return key in self._shape.positions
+
+    def __iter__(self):
+        return iter(self._shape.keys)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def keys(self):
+        return self._shape.keys
+
+    def values(self):
+        return self._values
+
+    def items(self):
+        return zip(self._shape.keys, self._values)
+
+    def __eq__(self, other) -> bool:
+        # キーの並びが共有されていれば値のタプルだけを比較する（差分探索で同一の部分木を読み飛ばす際に使う）
+        if isinstance(other, CompactNode) and other._shape is self._shape:
+            return self._values == other._values
+        return Mapping.__eq__(self, other)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"CompactNode({dict(self.items())!r})"
+
+    def __reduce__(self):
+        # 読み込み時にキーの並びを再び共有させる
+        return (_from_items, (self._shape.keys, self._values))
+
+
+def _from_items(keys: tuple, values: tuple) -> CompactNode:
+    return CompactNode(_shape(keys), values)
+
+
+def compact_ast(value):
+    """dict・listで表現されたASTを省メモリな表現に変換する
+
+    "type" を持つノードは CompactNode に、リストはタプルに変換し、
+    ノードの種類・キー・識別子名などの文字列はインターンして共有する。
+    正規表現リテラルの値など "type" を持たないdictはそのまま残す。
+
+    Args:
+        value: ASTのノード（またはその値）
+
+    Returns:
+        変換後のノード
+    """
+    if isinstance(value, dict):
+        if "type" not in value:
+            return value
+        keys = tuple(value.keys())
+        values = tuple(compact_ast(child) for child in value.values())
+        return CompactNode(_shape(keys), values)
+    if isinstance(value, list):
+        return tuple(compact_ast(child) for child in value)
+    if isinstance(value, str):
+        return sys.intern(value)
+    return value
+
+
+def to_dict(value):
+    """省メモリな表現のASTをdict・listの表現に戻す
+
+    Args:
+        value: 変換前のノード（またはその値）
+
+    Returns:
+        変換後のノード
+    """
+    if isinstance(value, CompactNode):
+        return {key: to_dict(child) for key, child in value.items()}
+    if isinstance(value, tuple):
+        return [to_dict(child) for child in value]
+    return value
@@ -0,0 +1,134 @@
+# パーサーのバックエンド同士で生成されるASTが一致するかを確認し、
+# スニペットごとの解析時間を比較するモジュール
+import argparse
+import itertools
+import statistics
+import time
+
+from mb_search import path_const, stream
+from mb_search.ast import backends
+from mb_search.ast.worker import DEFAULT_LOCATIONS, LOCATION_MODES, ASTParseError
+
+
+def first_difference(expected, actual, path: tuple = ()) -> tuple | None:
+    """2つのASTを比較し、最初に異なる箇所のパスを返す
+
+    Args:
+        expected: 基準のAST
+        actual: 比較するAST
+        path (tuple, optional): 比較している箇所のパス. Defaults to ().
+
+    Returns:
+        tuple | None: 最初に異なる箇所のパス（一致する場合はNone）
+    """
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        for key in [*expected, *(key for key in actual if key not in expected)]:
+            if key not in expected or key not in actual:
+                return (*path, key)
+            difference = first_difference(expected[key], actual[key], (*path, key))
+            if difference is not None:
+                return difference
+        return None
+    if isinstance(expected, list) and isinstance(actual, list):
+        if len(expected) != len(actual):
+            return (*path, "length")
+        for i, (expected_child, actual_child) in enumerate(zip(expected, actual)):
+            difference = first_difference(expected_child, actual_child, (*path, i))
+            if difference is not None:
+                return difference
+        return None
+    return None if expected == actual and type(expected) is type(actual) else path
+
+
+def _timed_parse(backend: backends.ParserBackend, code_snippet: str, locations: str) -> tuple:
+    start = time.perf_counter()
+    try:
+        ast = backend.parse(code_snippet, locations)
+    except ASTParseError as e:
+        ast = e
+    return ast, time.perf_counter() - start
+
+
+def _latency(seconds: list) -> dict:
+    if not seconds:
+        return {"median_ms": None, "p95_ms": None}
+    ordered = sorted(seconds)
+    return {
+        "median_ms": round(statistics.median(ordered) * 1000, 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+    }
+
+
+def compare(code_snippets: list, reference: str = "node", candidate: str = "python", locations: str = DEFAULT_LOCATIONS, max_examples: int = 5) -> dict:
+    """2つのバックエンドで各スニペットを解析し、ASTの一致とスニペットごとの解析時間を比較する
+
+    キャッシュを通さずにバックエンドを直接呼び出すため、解析時間はスニペット1件ごとの往復を含む。
+
+    Args:
+        code_snippets (list): コードスニペットのリスト
+        reference (str, optional): 基準のバックエンド名. Defaults to "node".
+        candidate (str, optional): 比較するバックエンド名. Defaults to "python".
+        locations (str, optional): 位置情報の出力形式（"full", "range", "none"）. Defaults to DEFAULT_LOCATIONS.
+        max_examples (int, optional): 記録する不一致の例の数. Defaults to 5.
+
+    Returns:
+        dict: スニペット数 ("snippets")、一致数 ("equal")、ASTの不一致数 ("different")、
+              片方だけ解析に失敗した数 ("error_mismatch")、両方失敗した数 ("both_failed")、
+              不一致の例 ("examples": [{"index", "path"}])、バックエンドごとの解析時間 ("latency")
+    """
+    reference_backend = backends.get_backend(reference)
+    candidate_backend = backends.get_backend(candidate)
+    result = {"snippets": len(code_snippets), "equal": 0, "different": 0, "error_mismatch": 0, "both_failed": 0, "examples": []}
+    seconds = {reference: [], candidate: []}
+
+    for i, code_snippet in enumerate(code_snippets):
+        expected, expected_seconds = _timed_parse(reference_backend, code_snippet, locations)
+        actual, actual_seconds = _timed_parse(candidate_backend, code_snippet, locations)
+        seconds[reference].append(expected_seconds)
+        seconds[candidate].append(actual_seconds)
+
+        expected_failed = isinstance(expected, ASTParseError)
+        actual_failed = isinstance(actual, ASTParseError)
+        if expected_failed and actual_failed:
+            result["both_failed"] += 1
+            continue
+        if expected_failed != actual_failed:
+            result["error_mismatch"] += 1
+            difference = ("<parse error>",)
+        else:
+            difference = first_difference(expected, actual)
+            if difference is None:
+                result["equal"] += 1
+                continue
+            result["different"] += 1
+        if len(result["examples"]) < max_examples:
+            result["examples"].append({"index": i, "path": list(difference)})
+
+    result["latency"] = {name: _latency(values) for name, values in seconds.items()}
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="パーサーのバックエンド同士でASTの一致と解析時間を比較する")
+    parser.add_argument("--input", default=f"{path_const.MB_DATA}/mb_speed_diff_sort.json", help="MBデータセットのパス(.json / .jsonl)")
+    parser.add_argument("--max-items", type=int, default=500, help="比較する実装対の上限")
+    parser.add_argument("--reference", default="node", choices=tuple(backends.BACKENDS), help="基準のバックエンド")
+    parser.add_argument("--candidate", default="python", choices=tuple(backends.BACKENDS), help="比較するバックエンド")
+    parser.add_argument("--locations", default=DEFAULT_LOCATIONS, choices=LOCATION_MODES, help="位置情報の出力形式")
+    args = parser.parse_args()
+
+    try:
+        backends.get_backend(args.candidate)
+    except ImportError as e:
+        parser.exit(1, f"--> バックエンド {args.candidate} は利用できません: {e}\n")
+
+    items = itertools.islice(stream.iter_mb_items(args.input), args.max_items)
+    codes = [code for item in items for code in (item["slow"], item["fast"])]
+    result = compare(codes, args.reference, args.candidate, args.locations)
+
+    print(f"--> {result['snippets']}件: 一致 {result['equal']}件 / 不一致 {result['different']}件 / "
+          f"解析の成否が異なる {result['error_mismatch']}件 / 両方失敗 {result['both_failed']}件")
+    for example in result["examples"]:
+        print(f"    #{example['index']}: {'.'.join(map(str, example['path']))}")
+    for name, latency in result["latency"].items():
+        print(f"--> {name}: 中央値 {latency['median_ms']}ms / p95 {latency['p95_ms']}ms")
@@ -0,0 +1,172 @@
+# ast_parser.js をワーカーモードで常駐させ、AST生成ごとのNode.js起動コストを削減するモジュール
+import atexit
+import json
+import os
+import subprocess
+import threading
+
+from mb_search import metrics, path_const
+
+# 位置情報の出力形式（"full": loc, "range": [開始, 終了]オフセット, "none": 出力しない）
+LOCATION_MODES = ("full", "range", "none")
+
+# 位置情報の出力形式の既定値。差分の比較には位置情報を使わないため出力しない
+DEFAULT_LOCATIONS = "none"
+
+
+class ASTParseError(subprocess.CalledProcessError):
+    """esprimaがコードスニペットを解析できなかった場合の例外
+
+    従来の subprocess.run(check=True) と同じく CalledProcessError として捕捉できる
+    """
+
+    def __str__(self) -> str:
+        return f"AST parse failed: {self.stderr}"
+
+
+class ParserWorker:
+    """常駐させた ast_parser.js プロセスとの通信を管理するクラス
+
+    リクエストは改行区切りのJSONで標準入力に送り、ASTは1行のJSONとして標準出力から受け取る。
+    プロセスが異常終了していた場合は自動的に再起動する。
+    """
+
+    def __init__(self, parser_path=None):
+        self.parser_path = parser_path or path_const.JSCODE / "ast_parser.js"
+        self._process = None
+        self._pid = None
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @property
+    def command(self) -> list:
+        return ["node", str(self.parser_path), "--worker"]
+
+    def _start(self) -> None:
+        """ワーカープロセスを起動する"""
+        metrics.count("parse.node_startup")
+        self._process = subprocess.Popen(
+            self.command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding="utf-8",
+            bufsize=1,
+        )
+        self._pid = os.getpid()
+
+    def _is_alive(self) -> bool:
+        # fork後の子プロセスでは親のワーカーを共有しない
+        if self._process is None or self._pid != os.getpid():
+            return False
+        return self._process.poll() is None
+
+    def _request(self, payload: dict) -> dict:
+        """1件のリクエストを送信し、レスポンスを受け取る
+
+        Raises:
+            BrokenPipeError: ワーカーが応答せずに終了した場合
+        """
+        with metrics.timer("parse.worker_roundtrip"):
+            self._process.stdin.write(json.dumps(payload) + "\n")
+            self._process.stdin.flush()
+            line = self._process.stdout.readline()
+        if not line:
+            raise BrokenPipeError("ast_parser.js worker exited unexpectedly")
+        with metrics.timer("parse.json_decode"):
+            return json.loads(line)
+
+    def _send(self, payload: dict) -> dict:
+        """ワーカーにリクエストを送信する
+
+        ワーカーが落ちていれば再起動し、通信中に落ちた場合も1度だけ再試行する
+        """
+        with self._lock:
+            self._next_id += 1
+            payload = {"id": self._next_id, **payload}
+
+            for attempt in range(2):
+                if not self._is_alive():
+                    self._start()
+                try:
+                    return self._request(payload)
+                except (BrokenPipeError, OSError):
+                    self._kill()
+                    if attempt == 1:
+                        raise
+
+    def parse(self, code_snippet: str, locations: str = DEFAULT_LOCATIONS) -> dict:
+        """コードスニペットをワーカーに送ってASTを取得する
+
+        Args:
+            code_snippet (str): コードスニペット
+            locations (str, optional): 位置情報の出力形式（"full", "range", "none"）. Defaults to DEFAULT_LOCATIONS.
+
+        Returns:
+            dict: 生成されたAST
+
+        Raises:
+            ASTParseError: esprimaが解析に失敗した場合
+        """
+        response = self._send({"code": code_snippet, "loc": locations})
+        if "error" in response:
+            raise ASTParseError(1, self.command, stderr=response["error"])
+        return response["ast"]
+
+    def parse_many(self, code_snippets: list, locations: str = DEFAULT_LOCATIONS) -> list:
+        """複数のコードスニペットを1回のリクエストでまとめて解析する
+
+        Args:
+            code_snippets (list): コードスニペットのリスト
+            locations (str, optional): 位置情報の出力形式（"full", "range", "none"）. Defaults to DEFAULT_LOCATIONS.
+
+        Returns:
+            list: 入力と同じ順序のASTのリスト（解析に失敗したスニペットはASTParseError）
+
+        Raises:
+            ASTParseError: リクエスト自体が不正な場合
+        """
+        response = self._send({"codes": list(code_snippets), "loc": locations})
+        if "error" in response:
+            raise ASTParseError(1, self.command, stderr=response["error"])
+        return results_to_asts(response["results"], self.command)
+
+    def _kill(self) -> None:
+        if self._process is not None and self._pid == os.getpid():
+            self._process.kill()
+            self._process.wait()
+        self._process = None
+
+    def close(self) -> None:
+        """ワーカープロセスを終了する"""
+        with self._lock:
+            if self._process is None or self._pid != os.getpid():
+                return
+            try:
+                self._process.stdin.close()
+                self._process.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self._process.kill()
+                self._process.wait()
+            self._process = None
+
+
+def results_to_asts(results: list, command: list) -> list:
+    """ast_parser.js の一括解析結果をASTまたはASTParseErrorのリストに変換する"""
+    return [
+        result["ast"] if "ast" in result else ASTParseError(1, command, stderr=result["error"])
+        for result in results
+    ]
+
+
+_worker = None
+
+
+def get_worker() -> ParserWorker:
+    """プロセス内で共有されるワーカーを取得する（初回呼び出し時に生成）"""
+    global _worker
+    if _worker is None:
+        _worker = ParserWorker()
+        atexit.register(_worker.close)
+    return _worker
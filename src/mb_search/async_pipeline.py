@@ -0,0 +1,421 @@
+# asyncio でAST生成・パターン生成・クエリ保存の各段階を並行に実行するパイプライン
+# 段階の間は上限のあるキューでつなぎ、Node.jsの解析待ち・ファイル書き込みと差分計算を重ねる
+import argparse
+import asyncio
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from mb_search import journal, logs, main, metrics, path_const, stream
+from mb_search.ast import analyzer, backends, cache, worker
+from mb_search.query import manifest
+
+logger = logs.get_logger(__name__)
+
+# 1回の解析リクエストで送る実装対の数（小さいほど段階同士が重なりやすい）
+ASYNC_BATCH_SIZE = 32
+
+# 既定の同時実行数（Node.jsのワーカープロセス数と、パターン生成を同時に行うチャンク数）
+DEFAULT_CONCURRENCY = min(4, os.cpu_count() or 1)
+
+# ASTは1行のJSONとして返されるため、StreamReaderの1行の上限を大きくする
+_LINE_LIMIT = 1 << 30
+
+# キューの終端を表す値
+_DONE = object()
+
+
+class AsyncParserWorker:
+    """asyncio のサブプロセスとして常駐させた ast_parser.js との通信を管理するクラス
+
+    プロトコルは worker.ParserWorker と同じで、リクエストのIDでレスポンスを対応付けるため、
+    複数のリクエストを応答を待たずに送信できる。
+    worker.ParserWorker と同じく、プロセスが異常終了していた場合は再起動し、通信中に落ちた場合は1度だけ再試行する。
+    """
+
+    # ASTキャッシュのキーに使うパーサーのバックエンド名
+    backend = backends.DEFAULT_BACKEND
+
+    def __init__(self, parser_path=None):
+        self.parser_path = parser_path or path_const.JSCODE / "ast_parser.js"
+        self._process = None
+        self._reader = None
+        self._pending = {}
+        self._next_id = 0
+        self._starting = None
+
+    @property
+    def command(self) -> list:
+        return ["node", str(self.parser_path), "--worker"]
+
+    def _is_alive(self) -> bool:
+        # レスポンスの読み込みが終わっている場合はプロセスが終了している（または応答が壊れている）
+        return self._process is not None and self._process.returncode is None and not self._reader.done()
+
+    async def start(self) -> "AsyncParserWorker":
+        """ワーカープロセスを起動する（parse_many の呼び出し時にも、起動していなければ自動的に起動する）"""
+        # 同時に失敗した複数のリクエストが再起動しても、起動するプロセスは1つにする
+        if self._starting is None or (self._starting.done() and not self._is_alive()):
+            self._starting = asyncio.ensure_future(self._start())
+        await self._starting
+        return self
+
+    async def _start(self) -> None:
+        await self._kill(self._process)
+        metrics.count("parse.node_startup")
+        self._process = await asyncio.create_subprocess_exec(
+            *self.command,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            limit=_LINE_LIMIT,
+        )
+        self._reader = asyncio.create_task(self._read_responses(self._process, self._pending))
+
+    async def _read_responses(self, process, pending: dict) -> None:
+        """レスポンスを読み込み、IDが一致するリクエストの結果にする"""
+        try:
+            while line := await process.stdout.readline():
+                response = json.loads(line)
+                future = pending.pop(response.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        finally:
+            # ワーカーが終了した場合は応答待ちのリクエストを全て失敗させる（再起動後のリクエストは別の表で待つ）
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(BrokenPipeError("ast_parser.js worker exited unexpectedly"))
+            pending.clear()
+
+    async def _request(self, payload: dict) -> dict:
+        """1件のリクエストを送信し、レスポンスを受け取る
+
+        Raises:
+            BrokenPipeError: ワーカーが応答せずに終了した場合
+        """
+        await self.start()
+        if not self._is_alive():
+            raise BrokenPipeError("ast_parser.js worker is not running")
+        process = self._process
+        self._next_id += 1
+        request_id = self._next_id
+        future = self._pending[request_id] = asyncio.get_running_loop().create_future()
+        try:
+            with metrics.timer("parse.worker_roundtrip"):
+                process.stdin.write((json.dumps({"id": request_id, **payload}) + "\n").encode("utf-8"))
+                await process.stdin.drain()
+                return await future
+        except OSError:
+            # 送信中に失敗した場合は応答待ちの結果を使わない（既に失敗していれば、その例外を取り出したことにする）
+            if not future.cancel():
+                future.exception()
+            # 他のリクエストが既に再起動していれば、新しいプロセスは終了させない
+            if process is self._process:
+                await self._kill(process)
+            raise
+
+    async def _send(self, payload: dict) -> dict:
+        """ワーカーにリクエストを送信する
+
+        ワーカーが落ちていれば再起動し、通信中に落ちた場合も1度だけ再試行する
+        """
+        for attempt in range(2):
+            try:
+                return await self._request(payload)
+            except OSError:
+                if attempt == 1:
+                    raise
+
+    async def parse_many(self, code_snippets: list, locations: str = worker.DEFAULT_LOCATIONS) -> list:
+        """複数のコードスニペットを1回のリクエストでまとめて解析する
+
+        Args:
+            code_snippets (list): コードスニペットのリスト
+            locations (str, optional): 位置情報の出力形式（"full", "range", "none"）. Defaults to "none".
+
+        Returns:
+            list: 入力と同じ順序のASTのリスト（解析に失敗したスニペットはASTParseError）
+
+        Raises:
+            ASTParseError: リクエスト自体が不正な場合
+            BrokenPipeError: 再起動したワーカーも応答せずに終了した場合
+        """
+        response = await self._send({"codes": list(code_snippets), "loc": locations})
+        if "error" in response:
+            raise worker.ASTParseError(1, self.command, stderr=response["error"])
+        return worker.results_to_asts(response["results"], self.command)
+
+    async def _kill(self, process) -> None:
+        if process is None:
+            return
+        if process.returncode is None:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+            await process.wait()
+        if process is self._process:
+            # 読み込みが壊れた応答で止まった場合も、応答待ちのリクエストを失敗させるだけにする
+            await asyncio.gather(self._reader, return_exceptions=True)
+            self._pending = {}
+
+    async def close(self) -> None:
+        """ワーカープロセスを終了する"""
+        if self._process is None:
+            return
+        if self._process.returncode is None:
+            self._process.stdin.close()
+            try:
+                await asyncio.wait_for(self._process.wait(), timeout=5)
+            except asyncio.TimeoutError:
+                self._process.kill()
+                await self._process.wait()
+        await asyncio.gather(self._reader, return_exceptions=True)
+        self._process = None
+
+
+async def _parse_with_cache(parser: AsyncParserWorker, codes: list, use_cache: bool, locations: str = worker.DEFAULT_LOCATIONS) -> list:
+    """キャッシュにないコードだけをワーカーで解析する（キャッシュの読み書きは別スレッドで行う）"""
+    if not use_cache:
+        return await parser.parse_many(codes, locations)
+
+    ast_cache = cache.get_cache()
+    # analyzer.generate_asts と同じキーにし、同期版のパイプラインとキャッシュを共有する
+    options = analyzer._cache_options(locations, parser.backend)
+    asts = await asyncio.to_thread(lambda: [ast_cache.get(code, options) for code in codes])
+    missing = [i for i, ast in enumerate(asts) if ast is None]
+    if missing:
+        parsed = await parser.parse_many([codes[i] for i in missing], locations)
+
+        def store() -> None:
+            for i, ast in zip(missing, parsed):
+                asts[i] = ast
+                if not isinstance(ast, analyzer.ASTParseError):
+                    ast_cache.put(codes[i], ast, options)
+
+        await asyncio.to_thread(store)
+    return asts
+
+
+async def _read_chunks(items, batch_size: int, run_journal: journal.RunJournal, stats: dict, outbox: asyncio.Queue, consumers: int) -> None:
+    """実装対をチャンクに分けて順番付きでキューに入れる（完了済みの実装対はスキップする）"""
+
+    def pending(chunk: list) -> list:
+        remaining = [item for item in chunk if not run_journal.is_done(item["id"])]
+        stats["skipped"] += len(chunk) - len(remaining)
+        return remaining
+
+    index = 0
+    if hasattr(items, "__aiter__"):
+        chunk = []
+        async for item in items:
+            chunk.append(item)
+            if len(chunk) == batch_size:
+                await outbox.put((index, pending(chunk)))
+                index, chunk = index + 1, []
+        if chunk:
+            await outbox.put((index, pending(chunk)))
+    else:
+        # ファイルからの読み込みはイベントループを止めないよう別スレッドで行う
+        iterator = iter(items)
+        while chunk := await asyncio.to_thread(lambda: list(islice(iterator, batch_size))):
+            await outbox.put((index, pending(chunk)))
+            index += 1
+    for _ in range(consumers):
+        await outbox.put(_DONE)
+
+
+async def _parse_stage(parser: AsyncParserWorker, inbox: asyncio.Queue, outbox: asyncio.Queue, use_cache: bool, locations: str) -> None:
+    """チャンクのslow/fastコードを解析する"""
+    while (entry := await inbox.get()) is not _DONE:
+        index, chunk = entry
+        codes = [item["slow"] for item in chunk] + [item["fast"] for item in chunk]
+        try:
+            asts = await _parse_with_cache(parser, codes, use_cache, locations) if codes else []
+        except (worker.ASTParseError, BrokenPipeError) as e:
+            # パーサー自体が失敗した場合はチャンク内の全ての実装対を失敗とする
+            asts = [e] * len(codes)
+        await outbox.put((index, chunk, asts))
+
+
+async def _pattern_stage(inbox: asyncio.Queue, outbox: asyncio.Queue, multiple: bool, selectivity_options: dict | None, executor) -> None:
+    """解析済みのチャンクからパターンを生成する（CPU処理は executor で行う）
+
+    ProcessPoolExecutor の場合は、ワーカープロセスでの計測値も結果と共に受け取って合算する
+    （スレッドでは計測値をこのプロセスで共有しているため合算しない）。
+    """
+    loop = asyncio.get_running_loop()
+    in_processes = isinstance(executor, ProcessPoolExecutor)
+    create_chunk = main._collecting(_create_chunk_patterns) if in_processes else _create_chunk_patterns
+    while (entry := await inbox.get()) is not _DONE:
+        index, chunk, asts = entry
+        slow_asts, fast_asts = asts[:len(chunk)], asts[len(chunk):]
+        results = await loop.run_in_executor(executor, create_chunk, chunk, slow_asts, fast_asts, multiple, selectivity_options)
+        if in_processes:
+            (results,) = main._merge_collected([results])
+        await outbox.put((index, results))
+
+
+def _create_chunk_patterns(chunk: list, slow_asts: list, fast_asts: list, multiple: bool, selectivity_options: dict | None) -> list:
+    results = []
+    for item, slow_ast, fast_ast in zip(chunk, slow_asts, fast_asts):
+        if isinstance(slow_ast, BrokenPipeError):
+            results.append({"id": item["id"], "status": journal.STATUS_FAILED, "stage": None, "patterns": [], "error": repr(slow_ast)})
+            continue
+        results.append(main.create_item_patterns(item, slow_ast, fast_ast, multiple, selectivity_options))
+    return results
+
+
+async def _write_stage(inbox: asyncio.Queue, producers: int, folder_name: str, write_queries: bool, writer: stream.PatternWriter,
+                       run_journal: journal.RunJournal, query_manifest: manifest.QueryManifest, stats: dict, report: dict, progress: logs.Progress) -> None:
+    """パターン・クエリ・ジャーナルを入力の順に書き出す
+
+    書き出しを1つのタスクに限ることで、マニフェストとジャーナルを排他制御なしで更新する。
+    """
+    buffered = {}
+    next_index = 0
+    finished = 0
+    while finished < producers:
+        entry = await inbox.get()
+        if entry is _DONE:
+            finished += 1
+            continue
+        buffered[entry[0]] = entry[1]
+        while next_index in buffered:
+            results = buffered.pop(next_index)
+            pattern_results = [result for result in results if result["stage"] == "pattern"]
+            if write_queries:
+                # クエリの生成・保存はチャンクごとにまとめて別スレッドで行う
+                await asyncio.to_thread(_write_chunk_queries, pattern_results, folder_name)
+            else:
+                for result in pattern_results:
+                    result["status"] = journal.STATUS_DONE
+            for result in results:
+                stats["items"] += 1
+                # 失敗した実装対は再開時に処理し直すため、完了した実装対のパターンだけを書き出す
+                if result["status"] == journal.STATUS_DONE:
+                    for pattern in result["patterns"]:
+                        writer.write(pattern)
+                main._record_queries(query_manifest, result["patterns"], result.get("queries", []), report)
+                if result["status"] == journal.STATUS_FAILED:
+                    stats["failed"] += 1
+                progress.update(failed=result["status"] == journal.STATUS_FAILED)
+                run_journal.record(result)
+            next_index += 1
+
+
+def _write_chunk_queries(results: list, folder_name: str) -> None:
+    for result in results:
+        try:
+            result["queries"] = [main.write_query_if_changed(pattern, folder_name) for pattern in result["patterns"]]
+            result["stage"] = "query"
+            result["status"] = journal.STATUS_DONE
+        except Exception as e:
+            logger.warning(f"--> RESULT: 処理に失敗しました(id = {result['id']}): {e!r}", extra={"event": "item_failed", "id": result["id"], "stage": result["stage"]})
+            result["error"] = repr(e)
+
+
+async def run_async(items, concurrency: int = DEFAULT_CONCURRENCY, queue_size: int | None = None, batch_size: int = ASYNC_BATCH_SIZE,
+                    pattern_file: str = "MB_patterns.jsonl", folder_name: str = "MBQL", multiple: bool = False, resume: bool = False,
+                    write_queries: bool = True, use_cache: bool = True, selectivity_options: dict | None = None, executor=None,
+                    locations: str = worker.DEFAULT_LOCATIONS) -> dict:
+    """実装対に対してAST生成・パターン生成・クエリ保存を asyncio で並行に実行する
+
+    AST生成は concurrency 個の常駐 ast_parser.js に振り分け、パターン生成は executor
+    （Noneの場合は既定のスレッドプール。CPU処理を並列化する場合は ProcessPoolExecutor）で行う。
+    ProcessPoolExecutor の場合も、ワーカープロセスでの計測値はこのプロセスの計測値に合算する。
+    段階の間のキューには上限があるため、後段が詰まると読み込み・解析も待機し、メモリ使用量は一定に保たれる。
+    書き出しの順序・ジャーナル・マニフェストの扱いは main.run_stream と同じ。
+
+    Args:
+        items: "id", "slow", "fast" を持つMBデータのイテラブル、または非同期イテラブル
+        concurrency (int, optional): Node.jsのワーカープロセス数（executor を指定した場合は同時にパターンを生成するチャンク数も兼ねる）. Defaults to DEFAULT_CONCURRENCY.
+        queue_size (int | None, optional): 段階の間のキューの上限（Noneの場合は concurrency の2倍）. Defaults to None.
+        batch_size (int, optional): 1回の解析リクエストで送る実装対の数. Defaults to ASYNC_BATCH_SIZE.
+        pattern_file (str, optional): パターンの保存先ファイル名. Defaults to "MB_patterns.jsonl".
+        folder_name (str, optional): クエリ保存用のフォルダ名. Defaults to "MBQL".
+        multiple (bool, optional): 1つの実装対の全ての差分からパターンを生成するか. Defaults to False.
+        resume (bool, optional): 前回の実行を再開するか. Defaults to False.
+        write_queries (bool, optional): クエリを保存するか. Defaults to True.
+        use_cache (bool, optional): ASTキャッシュを使うか. Defaults to True.
+        selectivity_options (dict | None, optional): 検出範囲の判定に使う selectivity.load_guard の引数. Defaults to None.
+        executor (optional): パターン生成に使う concurrent.futures の Executor. Defaults to None.
+        locations (str, optional): ASTの位置情報の出力形式（"full", "range", "none"）. Defaults to "none".
+
+    Returns:
+        dict: 処理した実装対の数 ("items")、スキップした数 ("skipped")、失敗した数 ("failed")、
+              保存したパターンの数 ("patterns")、クエリの書き込み・スキップ・削除の件数 ("queries")
+    """
+    concurrency = max(1, concurrency)
+    queue_size = queue_size or concurrency * 2
+    stats = {"items": 0, "skipped": 0, "failed": 0, "patterns": 0}
+    report = {"written": 0, "skipped": 0, "deleted": 0, "failed": 0}
+    query_manifest = await asyncio.to_thread(manifest.load_manifest, folder_name, True)
+
+    parsers = [AsyncParserWorker() for _ in range(concurrency)]
+    chunk_queue = asyncio.Queue(queue_size)
+    ast_queue = asyncio.Queue(queue_size)
+    result_queue = asyncio.Queue(queue_size)
+    progress = logs.Progress(label="処理")
+
+    # スレッドプールではGILのため差分計算は並列化されないので、executor がない場合は1つのタスクで処理する
+    pattern_tasks = concurrency if executor is not None else 1
+
+    async def parse_all() -> None:
+        await asyncio.gather(*(_parse_stage(parser, chunk_queue, ast_queue, use_cache, locations) for parser in parsers))
+        for _ in range(pattern_tasks):
+            await ast_queue.put(_DONE)
+
+    async def create_all() -> None:
+        await asyncio.gather(*(_pattern_stage(ast_queue, result_queue, multiple, selectivity_options, executor) for _ in range(pattern_tasks)))
+        await result_queue.put(_DONE)
+
+    with journal.RunJournal(journal.journal_path(pattern_file), resume=resume) as run_journal, \
+            stream.PatternWriter(pattern_file, append=resume) as writer:
+        try:
+            # ワーカープロセスはキャッシュにないコードを初めて解析する時に起動する
+            async with asyncio.TaskGroup() as group:
+                group.create_task(_read_chunks(items, batch_size, run_journal, stats, chunk_queue, concurrency))
+                group.create_task(parse_all())
+                group.create_task(create_all())
+                group.create_task(_write_stage(result_queue, 1, folder_name, write_queries, writer, run_journal, query_manifest, stats, report, progress))
+        finally:
+            await asyncio.gather(*(parser.close() for parser in parsers))
+
+        progress.finish()
+
+        # 完了した全ての実装対（再開時は前回までの分も含む）のパターンを現在のパターンとする
+        active_names = [name for record in run_journal.records.values() for name in record["patterns"]]
+
+    main._finish_queries(query_manifest, active_names, report)
+    stats["queries"] = report
+    stats["patterns"] = writer.count
+    logger.info(f"--> パターンが保存されました: {writer.path} ({writer.count}件)", extra={"event": "patterns_saved", "path": str(writer.path), "count": writer.count})
+    logger.info(f"--> 処理: {stats['items']}件 / スキップ: {stats['skipped']}件 / 失敗: {stats['failed']}件", extra={"event": "summary", "items": stats["items"], "skipped": stats["skipped"], "failed": stats["failed"]})
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="asyncio でパターン生成からクエリ生成までを並行に実行する")
+    parser.add_argument("--input", default=f"{path_const.MB_DATA}/mb_speed_diff_sort.json", help="MBデータセットのパス(.json / .jsonl)")
+    parser.add_argument("--max-items", type=int, default=None, help="処理する実装対の上限")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Node.jsのワーカープロセス数・同時にパターンを生成するチャンク数")
+    parser.add_argument("--queue-size", type=int, default=None, help="段階の間のキューの上限")
+    parser.add_argument("--batch-size", type=int, default=ASYNC_BATCH_SIZE, help="1回の解析リクエストで送る実装対の数")
+    parser.add_argument("--multiple", action="store_true", help="1つの実装対の全ての差分からパターンを生成する")
+    parser.add_argument("--resume", action="store_true", help="前回の実行を再開し、完了済みの実装対をスキップする")
+    parser.add_argument("--profile", action="store_true", help="段階ごとの処理時間・件数を計測し、/results/MB_async.metrics.json, .csv に保存する")
+    logs.add_arguments(parser)
+    args = parser.parse_args()
+    logs.configure_from_args(args)
+    metrics.enable(args.profile)
+
+    items = islice(stream.iter_mb_items(args.input), args.max_items)
+    asyncio.run(run_async(items, concurrency=args.concurrency, queue_size=args.queue_size, batch_size=args.batch_size,
+                          multiple=args.multiple, resume=args.resume))
+
+    if args.profile:
+        metrics.print_report()
+        json_path, csv_path = metrics.write_report("MB_async")
+        logger.info(f"--> 計測結果が保存されました: {json_path}, {csv_path}", extra={"event": "metrics_saved", "path": str(json_path)})
@@ -0,0 +1 @@
+from const import path_const
\ No newline at end of file
@@ -0,0 +1,221 @@
+# パイプラインの段階ごとの処理速度を計測し、保存した基準値と比較して性能の低下を検出するベンチマーク
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from pathlib import Path
+
+from mb_search import path_const
+from mb_search.ast import analyzer
+from mb_search.bench import samples
+from mb_search.pattern import creator
+from mb_search.query import bench as query_bench
+from mb_search.query import generator
+
+# 計測する段階（end_to_end はAST生成からクエリ生成までを続けて行う時間）
+STAGES = ["parse", "diff", "context", "pattern", "render", "end_to_end"]
+
+# 計測する実装対の組（一行のものから数千文のものまで）
+CASES = {
+    "bundled": lambda: samples.load_bundled_pairs() * 10,
+    "oneliner": lambda: samples.synthetic_pairs(200, 1),
+    "small": lambda: samples.synthetic_pairs(50, 20),
+    "medium": lambda: samples.synthetic_pairs(10, 200),
+    "large": lambda: samples.synthetic_pairs(2, 2000),
+    "xlarge": lambda: samples.synthetic_pairs(1, 5000),
+    # 大きなASTの深い位置にある差分（コンテキスト解析の時間がASTの大きさに比例しないことを確認する）
+    "deep_context": lambda: samples.synthetic_pairs(5, 2000, nesting=30),
+}
+
+# クエリ生成だけを計測するケース（query/bench.py の合成パターン）
+RENDER_CASE = "render_synthetic"
+RENDER_PATTERNS = 20000
+
+# 既定の許容する処理時間の増加率と、比較の対象にする最小の処理時間（これより短い段階は誤差が大きいため比較しない）
+DEFAULT_THRESHOLD = 0.2
+MIN_SECONDS = 0.002
+
+# 基準値と最新の結果の保存先（基準値はリポジトリで管理するためパッケージ内に置く）
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+LATEST_PATH = path_const.RESULTS / "bench.latest.json"
+
+
+def _best_of(fn, repeat: int) -> tuple:
+    """fn を repeat 回呼び出し、最も短い時間と最後の戻り値を返す"""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def _contexts(slow_asts: list, differences: list) -> list:
+    # create_pattern_from_asts と同じく、索引を渡さない既定の経路を計測する
+    contexts = []
+    for slow_ast, (diff_node, path_to_diff) in zip(slow_asts, differences):
+        if diff_node:
+            contexts.append(creator._analyze_context(slow_ast, list(path_to_diff)))
+    return contexts
+
+
+def _end_to_end(pairs: list) -> list:
+    asts = analyzer.generate_asts([pair["slow"] for pair in pairs] + [pair["fast"] for pair in pairs], use_cache=False)
+    patterns = [
+        creator.create_pattern_from_asts(pair["id"], slow_ast, fast_ast)
+        for pair, slow_ast, fast_ast in zip(pairs, asts[:len(pairs)], asts[len(pairs):])
+        if not isinstance(slow_ast, analyzer.ASTParseError) and not isinstance(fast_ast, analyzer.ASTParseError)
+    ]
+    return generator.render_queries([pattern for pattern in patterns if pattern])
+
+
+def measure_case(pairs: list, repeat: int = 3) -> dict:
+    """実装対の組に対して段階ごとの処理時間を計測する
+
+    AST生成はキャッシュを使わずに常駐ワーカーで行い、各段階は前の段階の結果を入力にして単独で計測する。
+
+    Args:
+        pairs (list): "id", "slow", "fast" を持つ実装対のリスト
+        repeat (int, optional): 計測回数（最も速い回を採用する）. Defaults to 3.
+
+    Returns:
+        dict: 実装対の数 ("pairs")、ASTのノード数 ("nodes")、段階ごとの時間（秒）、
+              1秒あたりの実装対の数 ("pairs_per_sec")
+    """
+    codes = [pair["slow"] for pair in pairs] + [pair["fast"] for pair in pairs]
+    # ワーカーの起動を計測に含めない
+    analyzer.generate_asts(codes[:1], use_cache=False)
+
+    result = {"pairs": len(pairs)}
+    result["parse"], asts = _best_of(lambda: analyzer.generate_asts(codes, use_cache=False), repeat)
+    parsed = [
+        (pair, slow_ast, fast_ast)
+        for pair, slow_ast, fast_ast in zip(pairs, asts[:len(pairs)], asts[len(pairs):])
+        if not isinstance(slow_ast, analyzer.ASTParseError) and not isinstance(fast_ast, analyzer.ASTParseError)
+    ]
+    slow_asts = [slow_ast for _, slow_ast, _ in parsed]
+    result["nodes"] = sum(len(analyzer.build_ancestor_index(ast).types) for ast in slow_asts)
+
+    result["diff"], differences = _best_of(lambda: [analyzer.find_structural_difference(slow_ast, fast_ast) for _, slow_ast, fast_ast in parsed], repeat)
+    result["context"], _ = _best_of(lambda: _contexts(slow_asts, differences), repeat)
+    result["pattern"], patterns = _best_of(lambda: [creator.create_pattern_from_asts(pair["id"], slow_ast, fast_ast) for pair, slow_ast, fast_ast in parsed], repeat)
+    valid_patterns = [pattern for pattern in patterns if pattern]
+    result["render"], _ = _best_of(lambda: generator.render_queries(valid_patterns), repeat)
+    result["end_to_end"], _ = _best_of(lambda: _end_to_end(pairs), repeat)
+    result["pairs_per_sec"] = len(pairs) / result["end_to_end"]
+    return result
+
+
+def run_benchmarks(case_names: list | None = None, repeat: int = 3) -> dict:
+    """ベンチマークを実行する
+
+    Args:
+        case_names (list | None, optional): 計測するケース名のリスト（Noneの場合は全て）. Defaults to None.
+        repeat (int, optional): 計測回数. Defaults to 3.
+
+    Returns:
+        dict: 実行環境 ("environment") とケースごとの結果 ("cases")
+    """
+    case_names = case_names or [*CASES, RENDER_CASE]
+    results = {}
+    for name in case_names:
+        if name == RENDER_CASE:
+            measured = query_bench.measure(query_bench.synthetic_patterns(RENDER_PATTERNS), repeat)
+            results[name] = {"patterns": measured["patterns"], "render": measured["seconds"], "patterns_per_sec": measured["patterns_per_sec"]}
+        else:
+            results[name] = measure_case(CASES[name](), repeat)
+    return {
+        "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "cases": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> list:
+    """基準値と比べて処理時間が threshold の割合を超えて増えた段階を求める
+
+    Args:
+        current (dict): run_benchmarks の結果
+        baseline (dict): 基準値（run_benchmarks の結果）
+        threshold (float, optional): 許容する処理時間の増加率. Defaults to DEFAULT_THRESHOLD.
+
+    Returns:
+        list: 性能が低下した段階（"case", "stage", "baseline", "current", "ratio"）のリスト
+    """
+    regressions = []
+    for case, result in current["cases"].items():
+        base = baseline["cases"].get(case)
+        if base is None:
+            continue
+        for stage in STAGES:
+            if stage not in result or stage not in base or base[stage] < MIN_SECONDS:
+                continue
+            ratio = result[stage] / base[stage]
+            if ratio > 1 + threshold:
+                regressions.append({"case": case, "stage": stage, "baseline": base[stage], "current": result[stage], "ratio": round(ratio, 3)})
+    return regressions
+
+
+def save_results(results: dict, path) -> Path:
+    """結果をJSONで保存する"""
+    path = Path(path)
+    os.makedirs(path.parent, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def load_results(path) -> dict | None:
+    """保存した結果を読み込む（存在しない場合はNone）"""
+    path = Path(path)
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def print_results(results: dict, baseline: dict | None = None) -> None:
+    """ケースごとの段階の処理時間（ミリ秒）を表示する（基準値があれば比率も表示する）"""
+    print(f"{'case':<18} {'pairs':>6} " + " ".join(f"{stage:>11}" for stage in STAGES) + f" {'pairs/s':>9}")
+    for case, result in results["cases"].items():
+        base = (baseline or {}).get("cases", {}).get(case, {})
+        cells = []
+        for stage in STAGES:
+            if stage not in result:
+                cells.append(f"{'-':>11}")
+                continue
+            ratio = f"({result[stage] / base[stage]:.2f})" if base.get(stage) else ""
+            cells.append(f"{result[stage] * 1000:>5.1f}{ratio:>6}")
+        per_sec = result.get("pairs_per_sec") or result.get("patterns_per_sec")
+        print(f"{case:<18} {result.get('pairs', result.get('patterns')):>6} " + " ".join(cells) + f" {per_sec:>9.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="パイプラインの段階ごとの処理速度を計測し、基準値と比較する")
+    parser.add_argument("--cases", nargs="*", default=None, choices=[*CASES, RENDER_CASE], help="計測するケース（既定は全て）")
+    parser.add_argument("--repeat", type=int, default=3, help="計測回数（最も速い回を採用する）")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH), help="基準値のパス")
+    parser.add_argument("--save-baseline", action="store_true", help="計測結果を基準値として保存する")
+    parser.add_argument("--check", action="store_true", help="基準値より threshold を超えて遅くなった段階があれば終了コード1で終了する")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="許容する処理時間の増加率")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.cases, args.repeat)
+    baseline = load_results(args.baseline)
+    print_results(results, baseline)
+    print(f"--> 計測結果が保存されました: {save_results(results, LATEST_PATH)}")
+
+    if args.save_baseline:
+        print(f"--> 基準値が保存されました: {save_results(results, args.baseline)}")
+    elif args.check:
+        if baseline is None:
+            parser.exit(2, f"--> 基準値がありません: {args.baseline}（--save-baseline で作成してください）\n")
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"--> 性能低下: {regression['case']}/{regression['stage']} {regression['baseline'] * 1000:.1f}ms -> {regression['current'] * 1000:.1f}ms (x{regression['ratio']})")
+        if regressions:
+            sys.exit(1)
+        print(f"--> 性能低下はありません (threshold = {args.threshold})")
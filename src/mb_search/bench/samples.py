@@ -0,0 +1,100 @@
+# ベンチマークで使う実装対（同梱のサンプルと、文の数を指定して生成する合成データ）を用意するモジュール
+import json
+import random
+from pathlib import Path
+
+# 同梱のサンプルの実装対
+PAIRS_FILE = Path(__file__).with_name("pairs.json")
+
+# 合成する文の雛形（{i} は文の番号、{v} は乱数で決める値）
+_STATEMENTS = [
+    "var v{i} = {v};",
+    "var s{i} = \"item-{v}\" + v{j};",
+    "if (v{j} > {v}) {{\n    v{j} = v{j} - {v};\n}}",
+    "for (var k{i} = 0; k{i} < {v}; k{i}++) {{\n    total += k{i} * v{j};\n}}",
+    "function f{i}(a, b) {{\n    return a * {v} + b;\n}}",
+    "list.push(f{k}(v{j}, {v}));",
+    "while (v{j} > {v}) {{\n    v{j} = Math.floor(v{j} / 2);\n}}",
+    "var o{i} = {{ key: \"k{v}\", value: v{j}, items: [1, 2, {v}] }};",
+]
+
+# 合成データの遅い実装と速い実装の違い（ループ内の不要なコンストラクタ呼び出し）
+_SLOW_STATEMENT = "for (var d = 0; d < 100; d++) {{\n    var text = new String(\"diff-{v}\");\n}}"
+_FAST_STATEMENT = "for (var d = 0; d < 100; d++) {{\n    var text = \"diff-{v}\";\n}}"
+
+# 差分の文を囲む構造（nesting の数だけ順に繰り返して囲む）
+_NESTING = [
+    ("function g{n}() {{", "}}"),
+    ("if (total > {n}) {{", "}}"),
+    ("for (var n{n} = 0; n{n} < 10; n{n}++) {{", "}}"),
+]
+
+
+def load_bundled_pairs() -> list:
+    """同梱のサンプルの実装対を読み込む
+
+    Returns:
+        list: "id", "slow", "fast" を持つ実装対のリスト
+    """
+    with open(PAIRS_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _nest(statement: str, nesting: int) -> str:
+    """文を関数・条件分岐・ループで nesting 段だけ囲む"""
+    for n in range(nesting):
+        opening, closing = _NESTING[n % len(_NESTING)]
+        statement = f"{opening.format(n=n)}\n{statement}\n{closing.format()}"
+    return statement
+
+
+def synthetic_pair(statements: int, seed: int = 0, id=None, nesting: int = 0) -> dict:
+    """指定した数の文からなる実装対を生成する
+
+    遅い実装と速い実装は中央の1文だけが異なり、差分はループ内のコンストラクタ呼び出しになる。
+
+    Args:
+        statements (int): 文の数の目安（共通の宣言と差分の文が加わる）
+        seed (int, optional): 乱数のシード. Defaults to 0.
+        id (optional): 実装対のID（Noneの場合は "synthetic_{statements}_{seed}"）. Defaults to None.
+        nesting (int, optional): 差分の文を囲む関数・条件分岐・ループの段数. Defaults to 0.
+
+    Returns:
+        dict: "id", "slow", "fast" を持つ実装対
+    """
+    rng = random.Random(seed)
+    lines = ["var total = 0;", "var list = [];", "var v0 = 1;", "function f0(a, b) {\n    return a + b;\n}"]
+    variables, functions = [0], [0]
+    for i in range(1, statements):
+        template = _STATEMENTS[rng.randrange(len(_STATEMENTS))]
+        # 宣言済みの変数・関数だけを参照する
+        lines.append(template.format(i=i, j=rng.choice(variables), k=rng.choice(functions), v=rng.randint(1, 999)))
+        if template.startswith("var v{i}"):
+            variables.append(i)
+        elif template.startswith("function f{i}"):
+            functions.append(i)
+
+    middle = len(lines) // 2
+    value = rng.randint(1, 999)
+    slow_lines = lines[:middle] + [_nest(_SLOW_STATEMENT.format(v=value), nesting)] + lines[middle:]
+    fast_lines = lines[:middle] + [_nest(_FAST_STATEMENT.format(v=value), nesting)] + lines[middle:]
+    return {
+        "id": id if id is not None else f"synthetic_{statements}_{seed}",
+        "slow": "\n".join(slow_lines),
+        "fast": "\n".join(fast_lines),
+    }
+
+
+def synthetic_pairs(count: int, statements: int, seed: int = 0, nesting: int = 0) -> list:
+    """同じ大きさの実装対を複数生成する
+
+    Args:
+        count (int): 実装対の数
+        statements (int): 1つの実装の文の数
+        seed (int, optional): 乱数のシード. Defaults to 0.
+        nesting (int, optional): 差分の文を囲む関数・条件分岐・ループの段数. Defaults to 0.
+
+    Returns:
+        list: "id", "slow", "fast" を持つ実装対のリスト
+    """
+    return [synthetic_pair(statements, seed + i, nesting=nesting) for i in range(count)]
@@ -0,0 +1,90 @@
+# パイプライン実行の進捗を実装対ごとに記録し、中断した実行を再開できるようにするモジュール
+import json
+import os
+from pathlib import Path
+
+from mb_search import path_const
+
+# 処理の結果
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+def journal_path(pattern_file: str) -> Path:
+    """パターンファイルに対応するジャーナルのパスを求める"""
+    return path_const.PATTERN / f"{Path(pattern_file).stem}.journal.jsonl"
+
+
+class RunJournal:
+    """実装対ごとの処理状況をJSON Lines形式で追記するジャーナル
+
+    1行が1件の記録で、同じIDの記録が複数ある場合は最後のものが有効になる。
+    処理の段階は "parsed" → "diffed" → "pattern" → "query" の順に進む。
+
+    記録の形式:
+        {"id": <実装対のID>, "status": "done" | "failed",
+         "stage": <完了した最後の段階>, "patterns": [<パターン名>, ...], "error": <エラー内容>}
+    """
+
+    def __init__(self, path, resume: bool = False):
+        self.path = Path(path)
+        self.resume = resume
+        self.records = {}
+        self._file = None
+
+    def __enter__(self) -> "RunJournal":
+        os.makedirs(self.path.parent, exist_ok=True)
+        if self.resume and self.path.exists():
+            self.records = self._load()
+        self._file = open(self.path, "a" if self.resume else "w", encoding="utf-8")
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self._file.close()
+        self._file = None
+
+    def _load(self) -> dict:
+        records = {}
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # 書き込み途中で停止した最終行は無視する
+                    continue
+                records[record["id"]] = record
+        return records
+
+    def is_done(self, item_id) -> bool:
+        """実装対が前回までの実行で完了しているか判定する"""
+        record = self.records.get(item_id)
+        return record is not None and record["status"] == STATUS_DONE
+
+    def failed_ids(self) -> list:
+        """前回までの実行で失敗した実装対のIDを取得する"""
+        return [item_id for item_id, record in self.records.items() if record["status"] == STATUS_FAILED]
+
+    def record(self, result: dict) -> None:
+        """実装対の処理結果を記録する
+
+        Args:
+            result (dict): "id", "status", "stage", "patterns", "error" を持つ処理結果
+        """
+        record = {
+            "id": result["id"],
+            "status": result["status"],
+            "stage": result.get("stage"),
+            "patterns": [pattern["name"] for pattern in result.get("patterns", [])],
+        }
+        if result.get("error"):
+            record["error"] = result["error"]
+        self.records[record["id"]] = record
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def summary(self) -> dict:
+        """状態ごとの件数を集計する"""
+        counts = {STATUS_DONE: 0, STATUS_FAILED: 0}
+        for record in self.records.values():
+            counts[record["status"]] = counts.get(record["status"], 0) + 1
+        return counts
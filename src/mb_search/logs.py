@@ -0,0 +1,207 @@
+# パイプラインのログ出力を設定するモジュール
+# ログはキューに積んで別スレッドで書き出し、大量の実装対を処理する際に端末への書き込みで処理が止まらないようにする
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+
+# 全てのロガーの親になるロガー名
+ROOT_LOGGER = "mb_search"
+
+# 進捗を出力するロガー（静かなモードでも出力する）
+PROGRESS_LOGGER = f"{ROOT_LOGGER}.progress"
+
+# ログの形式
+FORMAT_TEXT = "text"
+FORMAT_JSON = "json"
+
+# 既定の進捗の出力間隔（秒）
+DEFAULT_PROGRESS_INTERVAL = 5.0
+
+# LogRecord が標準で持つ属性（これ以外の属性は extra で渡された構造化フィールドとして出力する）
+_STANDARD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+
+def get_logger(name: str) -> logging.Logger:
+    """mb_search 以下のロガーを取得する
+
+    Args:
+        name (str): モジュール名（"mb_search." で始まらない場合は付加する）
+
+    Returns:
+        logging.Logger: ロガー
+    """
+    return logging.getLogger(name if name.startswith(ROOT_LOGGER) else f"{ROOT_LOGGER}.{name}")
+
+
+def fields(record: logging.LogRecord) -> dict:
+    """ログに extra で付加された構造化フィールドを取り出す"""
+    return {key: value for key, value in vars(record).items() if key not in _STANDARD_ATTRIBUTES}
+
+
+class JsonFormatter(logging.Formatter):
+    """1件のログを1行のJSONにする（構造化フィールドも含める）"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **fields(record),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QuietFilter(logging.Filter):
+    """静かなモードで、警告・エラーと進捗以外のログを除く（実装対ごとの失敗は警告で出力される）"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or record.name == PROGRESS_LOGGER
+
+
+_listener = None
+# 書き出し用のスレッドを起動したか（QueueListener の内部状態は参照しない）
+_listener_started = False
+
+
+def configure(level: str | int = "INFO", fmt: str = FORMAT_TEXT, quiet: bool = False, log_file=None, stream=None) -> None:
+    """mb_search のログ出力を設定する（再設定した場合は以前の設定を置き換える）
+
+    ログはキューを経由して別スレッドで書き出す。fork したワーカープロセスでは
+    書き出し用のスレッドが引き継がれないため、同じ出力先に直接書き出す。
+
+    Args:
+        level (str | int, optional): 出力するログの最低レベル. Defaults to "INFO".
+        fmt (str, optional): 端末に出力する形式（"text" または "json"）. Defaults to "text".
+        quiet (bool, optional): 端末には警告・エラーと進捗だけを出力するか. Defaults to False.
+        log_file (optional): 全てのログをJSON Lines形式で追記するファイルのパス. Defaults to None.
+        stream (optional): 端末の出力先（Noneの場合は標準エラー出力）. Defaults to None.
+    """
+    global _listener, _listener_started
+    shutdown()
+
+    console = logging.StreamHandler(stream or sys.stderr)
+    console.setFormatter(JsonFormatter() if fmt == FORMAT_JSON else logging.Formatter("%(message)s"))
+    if quiet:
+        console.addFilter(_QuietFilter())
+    handlers = [console]
+    if log_file is not None:
+        os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+        file_handler = logging.FileHandler(log_file, encoding="utf-8")
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+
+    logger = logging.getLogger(ROOT_LOGGER)
+    logger.setLevel(level.upper() if isinstance(level, str) else level)
+    logger.propagate = False
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    _listener_started = True
+
+
+def shutdown() -> None:
+    """キューに残ったログを書き出し、書き出し用のスレッドを終了する
+
+    configure で追加したキューへのハンドラーを取り除き、ロガーの伝播を元に戻す。
+    """
+    global _listener, _listener_started
+    if _listener is None:
+        return
+    listener, _listener = _listener, None
+    logger = logging.getLogger(ROOT_LOGGER)
+    for handler in list(logger.handlers):
+        if isinstance(handler, logging.handlers.QueueHandler):
+            logger.removeHandler(handler)
+    logger.propagate = True
+    if _listener_started:
+        _listener_started = False
+        listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+
+
+def _write_directly_after_fork() -> None:
+    # 子プロセスにはキューを読むスレッドがないため、書き出し先のハンドラーを直接使う
+    global _listener, _listener_started
+    if _listener is None:
+        return
+    logger = logging.getLogger(ROOT_LOGGER)
+    for handler in list(logger.handlers):
+        if isinstance(handler, logging.handlers.QueueHandler):
+            logger.removeHandler(handler)
+    for handler in _listener.handlers:
+        logger.addHandler(handler)
+    _listener = None
+    _listener_started = False
+
+
+def add_arguments(parser) -> None:
+    """ログ出力の設定をコマンドライン引数に追加する"""
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"], help="出力するログの最低レベル（DEBUGでは実装対ごとのクエリ保存も出力する）")
+    parser.add_argument("--log-format", default=FORMAT_TEXT, choices=[FORMAT_TEXT, FORMAT_JSON], help="端末に出力するログの形式")
+    parser.add_argument("--quiet", action="store_true", help="端末には一定間隔の進捗と警告・エラーだけを出力する")
+    parser.add_argument("--log-file", default=None, help="全てのログをJSON Lines形式で保存するファイルのパス")
+
+
+def configure_from_args(args) -> None:
+    """add_arguments で追加した引数からログ出力を設定する"""
+    configure(args.log_level, args.log_format, args.quiet, args.log_file)
+
+
+atexit.register(shutdown)
+os.register_at_fork(after_in_child=_write_directly_after_fork)
+
+
+class Progress:
+    """処理件数を集計し、一定の間隔でだけ進捗を出力する"""
+
+    def __init__(self, total: int | None = None, interval: float = DEFAULT_PROGRESS_INTERVAL, label: str = "処理"):
+        """
+        Args:
+            total (int | None, optional): 全体の件数（不明な場合はNone）. Defaults to None.
+            interval (float, optional): 進捗の出力間隔（秒）. Defaults to DEFAULT_PROGRESS_INTERVAL.
+            label (str, optional): 進捗の見出し. Defaults to "処理".
+        """
+        self.total = total
+        self.interval = interval
+        self.label = label
+        self.done = 0
+        self.failed = 0
+        self._logger = logging.getLogger(PROGRESS_LOGGER)
+        self._start = time.perf_counter()
+        self._last = self._start
+
+    def update(self, n: int = 1, failed: int = 0) -> None:
+        """処理件数を加え、前回の出力から interval 秒以上経っていれば進捗を出力する"""
+        self.done += n
+        self.failed += failed
+        now = time.perf_counter()
+        if now - self._last >= self.interval:
+            self._last = now
+            self._emit(now)
+
+    def finish(self) -> None:
+        """最終的な件数を出力する"""
+        self._emit(time.perf_counter(), finished=True)
+
+    def _emit(self, now: float, finished: bool = False) -> None:
+        elapsed = now - self._start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        total = f"/{self.total}" if self.total is not None else ""
+        self._logger.info(
+            f"--> {self.label}: {self.done}{total}件 / 失敗 {self.failed}件 ({rate:.1f}件/s, {elapsed:.1f}s){' 完了' if finished else ''}",
+            extra={"event": "progress", "done": self.done, "total": self.total, "failed": self.failed,
+                   "rate": round(rate, 2), "elapsed": round(elapsed, 3), "finished": finished},
+        )
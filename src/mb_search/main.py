@@ -1,11 +1,21 @@
 # 差分からパターン生成・クエリ生成を行うメインのパイプライン
+import argparse
 import json
 import os
-from mb_search.pattern import creator
-from mb_search.query import generator
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+
+from mb_search import journal, logs, metrics, stream
+from mb_search.ast import analyzer
+from mb_search.pattern import creator, dedup, selectivity
+from mb_search.query import generator, manifest
 
 from mb_search import path_const
 
+logger = logs.get_logger(__name__)
+
 
 def create_pattern(id: int, slow_code: str, fast_code: str) -> dict:
     """コードの差分からslowコードのパターンを生成する
@@ -21,7 +31,7 @@ def create_pattern(id: int, slow_code: str, fast_code: str) -> dict:
     created_pattern = creator.create_pattern_from_diff(id, slow_code, fast_code)
 
     if not created_pattern:
-        print(f"--> RESULT: パターンが生成されませんでした(id = {id})")
+        logger.info(f"--> RESULT: パターンが生成されませんでした(id = {id})", extra={"event": "no_pattern", "id": id})
         return
     
     return created_pattern
@@ -42,13 +52,13 @@ def save_pattern(patterns: dict, file_name: str) -> None:
     os.makedirs(path_const.PATTERN, exist_ok=True)
 
     # 更新されたパターンリストをファイルに保存
-    with open(pattern_file_path, "w", encoding="utf-8") as f:
+    with metrics.timer("write.patterns"), open(pattern_file_path, "w", encoding="utf-8") as f:
         json.dump(patterns, f, ensure_ascii=False, indent=2)
 
-    print(f"--> パターンが保存されました: {pattern_file_path}")
+    logger.info(f"--> パターンが保存されました: {pattern_file_path}", extra={"event": "patterns_saved", "path": str(pattern_file_path), "count": len(patterns)})
 
 
-def create_query(pattern: dict, folder_name: str) -> None:
+def create_query(pattern: dict, folder_name: str) -> str | None:
     """パターンからCodeQLクエリを生成する
 
     Args:
@@ -56,33 +66,100 @@ def create_query(pattern: dict, folder_name: str) -> None:
         folder_name (str): クエリ保存用のフォルダ名
 
     Returns:
+        str | None: 保存したクエリのパス（生成に失敗した場合はNone）
         /codeql_queries_js/{folder_name}/ にクエリが保存される
     """
     # パターンからクエリを生成
     codeql_query = generator.generate_query_from_pattern(pattern)
 
     if codeql_query is None:
-        print(f"--> クエリ生成に失敗しました: {pattern['name']}")
+        logger.warning(f"--> クエリ生成に失敗しました: {pattern['name']}", extra={"event": "query_failed", "pattern": pattern["name"]})
         return None
     
-    print(f"--> クエリ生成成功: {pattern['name']}")
+    logger.debug(f"--> クエリ生成成功: {pattern['name']}", extra={"event": "query_generated", "pattern": pattern["name"]})
+    return _save_query(codeql_query, pattern["name"], folder_name)
+
+
+def save_context_library() -> str:
+    """生成したクエリが共有するコンテキスト述語のライブラリを保存する（内容が異なる場合のみ）
+
+    Returns:
+        str: ライブラリのパス（/codeql_queries_js/MBContext.qll）
+    """
+    library_path = path_const.QUERIES / f"{generator.CONTEXT_LIBRARY}.qll"
+    if library_path.exists() and library_path.read_text(encoding="utf-8") == generator.CONTEXT_LIBRARY_SOURCE:
+        return str(library_path)
+
+    os.makedirs(path_const.QUERIES, exist_ok=True)
+    # 並列に保存するワーカーが書き込み途中のファイルを読まないよう、置き換えで保存する
+    tmp_path = library_path.with_name(f"{library_path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(generator.CONTEXT_LIBRARY_SOURCE)
+    os.replace(tmp_path, library_path)
+    return str(library_path)
+
+
+# プロセス内でライブラリを保存済みのクエリディレクトリ
+_saved_libraries = set()
+
+
+def _save_query(codeql_query: str, pattern_name: str, folder_name: str) -> str:
+    """生成されたクエリを /codeql_queries_js/{folder_name}/ に保存する"""
+    # クエリがimportするライブラリをプロセスごとに1度だけ保存する
+    if path_const.QUERIES not in _saved_libraries:
+        save_context_library()
+        _saved_libraries.add(path_const.QUERIES)
 
     # 生成されたクエリをファイルに保存
     # クエリ保存ディレクトリのパスを取得
     codeql_dir = path_const.QUERIES / folder_name
 
     # ファイル名を生成（pattern_nameを小文字に変換し、.qlを付加）
-    filename = f"{pattern['name'].lower()}.ql"
+    filename = f"{pattern_name.lower()}.ql"
     filepath = os.path.join(codeql_dir, filename)
     
     # ディレクトリが存在しない場合は作成
     os.makedirs(codeql_dir, exist_ok=True)
     
     # クエリをファイルに保存
-    with open(filepath, "w", encoding="utf-8") as f:
+    with metrics.timer("write.query"), open(filepath, "w", encoding="utf-8") as f:
         f.write(codeql_query)
     
-    print(f"--> クエリが保存されました: {filepath}")
+    logger.debug(f"--> クエリが保存されました: {filepath}", extra={"event": "query_saved", "path": filepath})
+    return filepath
+
+
+def write_query_if_changed(pattern: dict, folder_name: str) -> str:
+    """前回から変更があったパターンのクエリだけを生成・保存する
+
+    Args:
+        pattern (dict): 生成されたパターン
+        folder_name (str): クエリ保存用のフォルダ名
+
+    Returns:
+        str: "skipped"（変更なし）、"written"（保存した）、"failed"（生成に失敗した）のいずれか
+    """
+    if manifest.load_manifest(folder_name).is_current(pattern):
+        return "skipped"
+    return "written" if create_query(pattern, folder_name) else "failed"
+
+
+def _record_queries(query_manifest: manifest.QueryManifest, patterns: list, statuses: list, report: dict) -> None:
+    """クエリの保存結果をマニフェストと集計に反映する"""
+    for pattern, status in zip(patterns, statuses):
+        report[status] += 1
+        if status == "failed":
+            query_manifest.entries.pop(pattern["name"], None)
+        else:
+            query_manifest.update(pattern)
+
+
+def _finish_queries(query_manifest: manifest.QueryManifest, active_names, report: dict) -> dict:
+    """現在のパターンにないクエリを削除してマニフェストを保存し、集計を表示する"""
+    report["deleted"] = len(query_manifest.prune(active_names))
+    query_manifest.save()
+    logger.info(f"--> クエリ: 書き込み {report['written']}件 / スキップ {report['skipped']}件 / 削除 {report['deleted']}件 / 失敗 {report['failed']}件", extra={"event": "queries_summary", **report})
+    return report
 
 
 def run_pipeline(slow_code: str, fast_code: str):
@@ -92,13 +169,8 @@ def run_pipeline(slow_code: str, fast_code: str):
         slow_code (str): 遅い実装のコード
         fast_code (str): 速い実装のコード
     """
-    print("="*50)
-    print("Target Code Pair:")
-    print("--- SLOW ---")
-    print(slow_code.strip())
-    print("\n--- FAST ---")
-    print(fast_code.strip())
-    print("="*50)
+    # 実装対のコードは長くなるため、詳細なログでのみ出力する
+    logger.debug(f"{'=' * 50}\nTarget Code Pair:\n--- SLOW ---\n{slow_code.strip()}\n\n--- FAST ---\n{fast_code.strip()}\n{'=' * 50}", extra={"event": "target_pair"})
 
     patterns = []
     # ステップ1: コードの差分からパターンを生成
@@ -113,6 +185,418 @@ def run_pipeline(slow_code: str, fast_code: str):
             create_query(pattern, "testQL")
 
 
+# 1回のAST一括生成で解析する実装対の最大数
+BATCH_SIZE = 256
+
+
+def apply_selectivity_guard(patterns: list, selectivity_options: dict | None) -> list:
+    """検出範囲が広すぎるパターンを絞り込み、絞り込めないものを除外する
+
+    Args:
+        patterns (list): パターンのリスト
+        selectivity_options (dict | None): selectivity.load_guard の引数（Noneの場合は判定しない）
+
+    Returns:
+        list: 判定後のパターンのリスト
+    """
+    if not selectivity_options:
+        return patterns
+    guard = selectivity.load_guard(**selectivity_options)
+    checked_patterns = []
+    for pattern in patterns:
+        with metrics.timer("selectivity"):
+            checked, verdict, rate = guard.check(pattern)
+        metrics.count(f"selectivity.{verdict}")
+        if verdict != selectivity.VERDICT_OK:
+            logger.info(f"--> 検出範囲が広すぎるパターン({verdict}): {pattern['name']} (rate = {rate:.2e})", extra={"event": "broad_pattern", "pattern": pattern["name"], "verdict": verdict, "rate": rate})
+        if checked:
+            checked_patterns.append(checked)
+    return checked_patterns
+
+
+def create_patterns_from_items(items: list, multiple: bool = False, selectivity_options: dict | None = None) -> list:
+    """複数のMBデータのslow/fastコードを一括で解析し、それぞれのパターンを生成する
+
+    構文解析に失敗した実装対はその実装対だけをスキップする。
+
+    Args:
+        items (list): "id", "slow", "fast" を持つMBデータのリスト
+        multiple (bool, optional): 1つの実装対の全ての差分からパターンを生成するか. Defaults to False.
+        selectivity_options (dict | None, optional): 検出範囲の判定に使う selectivity.load_guard の引数. Defaults to None.
+
+    Returns:
+        list: 入力と同じ順序のパターンのリスト（生成できなかった実装対はNone、multipleの場合は1つの実装対のパターンが連続して並ぶ）
+    """
+    codes = [item["slow"] for item in items] + [item["fast"] for item in items]
+    asts = analyzer.generate_asts(codes)
+    slow_asts, fast_asts = asts[:len(items)], asts[len(items):]
+
+    patterns = []
+    for item, slow_ast, fast_ast in zip(items, slow_asts, fast_asts):
+        parse_error = next((ast for ast in (slow_ast, fast_ast) if isinstance(ast, analyzer.ASTParseError)), None)
+        if parse_error is not None:
+            logger.info(f"--> RESULT: 構文解析に失敗しました(id = {item['id']}): {parse_error.stderr}", extra={"event": "parse_failed", "id": item["id"]})
+            patterns.append(None)
+            continue
+
+        with metrics.timer("pattern"):
+            if multiple:
+                created_patterns = creator.create_patterns_from_asts(item["id"], slow_ast, fast_ast, record_parent_type=bool(selectivity_options))
+            else:
+                created_patterns = [creator.create_pattern_from_asts(item["id"], slow_ast, fast_ast, record_parent_type=bool(selectivity_options))]
+        created_patterns = apply_selectivity_guard([pattern for pattern in created_patterns if pattern], selectivity_options)
+
+        if not created_patterns:
+            logger.info(f"--> RESULT: パターンが生成されませんでした(id = {item['id']})", extra={"event": "no_pattern", "id": item["id"]})
+            patterns.append(None)
+            continue
+        patterns.extend(created_patterns)
+
+    return patterns
+
+
+def _collecting(fn):
+    """計測が有効な場合、ワーカープロセスでの計測値も結果と共に返すように fn を包む"""
+    return partial(metrics.call_collecting, fn) if metrics.is_enabled() else fn
+
+
+def _merge_collected(results):
+    """_collecting で包んだ関数の結果から計測値を合算し、元の結果を順に返す"""
+    if not metrics.is_enabled():
+        yield from results
+        return
+    for result, snapshot in results:
+        metrics.merge(snapshot)
+        yield result
+
+
+def _chunks(items: list, size: int) -> list:
+    """リストを指定の大きさのチャンクに分割する"""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _chunksize(n_items: int, workers: int) -> int:
+    """プロセス間通信の回数を抑えるため、1ワーカーあたり数回に分けて配る大きさを決める"""
+    return max(1, n_items // (workers * 4))
+
+
+def run_batch(items: list, workers: int | None = None, pattern_file: str = "MB_patterns.json", folder_name: str = "MBQL", multiple: bool = False, selectivity_options: dict | None = None) -> list:
+    """複数の実装対に対してパターン生成からクエリ生成までを並列に実行する
+
+    出力の順序とパターン名は逐次実行した場合と同一になる。
+
+    Args:
+        items (list): "id", "slow", "fast" を持つMBデータのリスト
+        workers (int | None, optional): ワーカープロセス数（Noneの場合はCPU数）. Defaults to None.
+        pattern_file (str, optional): パターンの保存先ファイル名. Defaults to "MB_patterns.json".
+        folder_name (str, optional): クエリ保存用のフォルダ名. Defaults to "MBQL".
+        multiple (bool, optional): 1つの実装対の全ての差分からパターンを生成するか. Defaults to False.
+        selectivity_options (dict | None, optional): 検出範囲の判定に使う selectivity.load_guard の引数. Defaults to None.
+
+    Returns:
+        list: 生成されたパターンのリスト（生成できなかった実装対はNone）
+    """
+    items = list(items)
+    workers = workers or os.cpu_count() or 1
+    report = {"written": 0, "skipped": 0, "deleted": 0, "failed": 0}
+
+    if workers == 1 or len(items) <= 1:
+        # 並列化の必要がない場合はプロセスを起動せずに逐次実行する
+        patterns = [pattern for chunk in _chunks(items, BATCH_SIZE) for pattern in create_patterns_from_items(chunk, multiple, selectivity_options)]
+        save_pattern(patterns, pattern_file)
+        valid_patterns = [pattern for pattern in patterns if pattern]
+        query_manifest = manifest.load_manifest(folder_name, reload=True)
+        statuses = [write_query_if_changed(pattern, folder_name) for pattern in valid_patterns]
+        _record_queries(query_manifest, valid_patterns, statuses, report)
+        _finish_queries(query_manifest, [pattern["name"] for pattern in valid_patterns], report)
+        return patterns
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # ステップ1: コードの差分からパターンを生成（mapは入力順に結果を返す）
+        # チャンクごとにslow/fastコードをまとめて解析する
+        chunks = _chunks(items, min(BATCH_SIZE, _chunksize(len(items), workers)))
+        create_chunk = _collecting(partial(create_patterns_from_items, multiple=multiple, selectivity_options=selectivity_options))
+        patterns = [pattern for chunk_patterns in _merge_collected(executor.map(create_chunk, chunks)) for pattern in chunk_patterns]
+
+        # ステップ2: 生成されたパターンをJSONファイルに保存
+        save_pattern(patterns, pattern_file)
+
+        # ステップ3: 生成されたパターンからCodeQLクエリを自動生成し保存（変更があったものだけ）
+        valid_patterns = [pattern for pattern in patterns if pattern]
+        query_manifest = manifest.load_manifest(folder_name, reload=True)
+        statuses = ["skipped" if query_manifest.is_current(pattern) else None for pattern in valid_patterns]
+        changed = [pattern for pattern, status in zip(valid_patterns, statuses) if status is None]
+        written = _merge_collected(executor.map(_collecting(partial(create_query, folder_name=folder_name)), changed, chunksize=_chunksize(len(changed), workers)))
+        statuses = [status or ("written" if next(written) else "failed") for status in statuses]
+
+    _record_queries(query_manifest, valid_patterns, statuses, report)
+    _finish_queries(query_manifest, [pattern["name"] for pattern in valid_patterns], report)
+    return patterns
+
+def process_items(items: list, multiple: bool = False, folder_name: str = "MBQL", write_queries: bool = True, selectivity_options: dict | None = None) -> list:
+    """複数の実装対を一括で解析し、パターン生成とクエリ保存までを実装対ごとに行う
+
+    いずれかの段階で例外が発生しても、その実装対を失敗として記録して残りの処理を続ける。
+
+    Args:
+        items (list): "id", "slow", "fast" を持つMBデータのリスト
+        multiple (bool, optional): 1つの実装対の全ての差分からパターンを生成するか. Defaults to False.
+        folder_name (str, optional): クエリ保存用のフォルダ名. Defaults to "MBQL".
+        write_queries (bool, optional): クエリを保存するか（Falseの場合はパターン生成までで完了とする）. Defaults to True.
+        selectivity_options (dict | None, optional): 検出範囲の判定に使う selectivity.load_guard の引数. Defaults to None.
+
+    Returns:
+        list: 実装対ごとの処理結果（"id", "status", "stage", "patterns", "queries", "error"）のリスト
+    """
+    codes = [item["slow"] for item in items] + [item["fast"] for item in items]
+    try:
+        asts = analyzer.generate_asts(codes)
+    except Exception as e:
+        # パーサー自体が失敗した場合はチャンク内の全ての実装対を失敗とする
+        return [{"id": item["id"], "status": journal.STATUS_FAILED, "stage": None, "error": repr(e)} for item in items]
+    slow_asts, fast_asts = asts[:len(items)], asts[len(items):]
+
+    results = []
+    for item, slow_ast, fast_ast in zip(items, slow_asts, fast_asts):
+        result = create_item_patterns(item, slow_ast, fast_ast, multiple, selectivity_options)
+        results.append(result)
+        if result["stage"] != "pattern" or not write_queries:
+            if result["stage"] == "pattern":
+                result["status"] = journal.STATUS_DONE
+            continue
+
+        try:
+            result["queries"] = [write_query_if_changed(pattern, folder_name) for pattern in result["patterns"]]
+            result["stage"] = "query"
+            result["status"] = journal.STATUS_DONE
+        except Exception as e:
+            logger.warning(f"--> RESULT: 処理に失敗しました(id = {item['id']}): {e!r}", extra={"event": "item_failed", "id": item["id"], "stage": result["stage"]})
+            result["error"] = repr(e)
+
+    return results
+
+
+def create_item_patterns(item: dict, slow_ast, fast_ast, multiple: bool = False, selectivity_options: dict | None = None) -> dict:
+    """解析済みの1つの実装対からパターンを生成する（クエリの保存は行わない）
+
+    パターンが生成されなかった実装対は完了 ("done") とし、パターンが生成された実装対は
+    段階を "pattern" として、クエリの保存を呼び出し側に任せる。
+
+    Args:
+        item (dict): "id", "slow", "fast" を持つMBデータ
+        slow_ast: slowコードのAST（解析に失敗した場合はASTParseError）
+        fast_ast: fastコードのAST（解析に失敗した場合はASTParseError）
+        multiple (bool, optional): 1つの実装対の全ての差分からパターンを生成するか. Defaults to False.
+        selectivity_options (dict | None, optional): 検出範囲の判定に使う selectivity.load_guard の引数. Defaults to None.
+
+    Returns:
+        dict: 処理結果（"id", "status", "stage", "patterns", "error"）
+    """
+    result = {"id": item["id"], "status": journal.STATUS_FAILED, "stage": None, "patterns": []}
+
+    parse_error = next((ast for ast in (slow_ast, fast_ast) if isinstance(ast, analyzer.ASTParseError)), None)
+    if parse_error is not None:
+        logger.info(f"--> RESULT: 構文解析に失敗しました(id = {item['id']}): {parse_error.stderr}", extra={"event": "parse_failed", "id": item["id"]})
+        result["error"] = str(parse_error)
+        return result
+    result["stage"] = "parsed"
+
+    try:
+        with metrics.timer("pattern"):
+            if multiple:
+                created_patterns = creator.create_patterns_from_asts(item["id"], slow_ast, fast_ast, record_parent_type=bool(selectivity_options))
+            else:
+                created_patterns = [creator.create_pattern_from_asts(item["id"], slow_ast, fast_ast, record_parent_type=bool(selectivity_options))]
+        result["patterns"] = apply_selectivity_guard([pattern for pattern in created_patterns if pattern], selectivity_options)
+        result["stage"] = "diffed"
+
+        if not result["patterns"]:
+            logger.info(f"--> RESULT: パターンが生成されませんでした(id = {item['id']})", extra={"event": "no_pattern", "id": item["id"]})
+            result["status"] = journal.STATUS_DONE
+            return result
+        result["stage"] = "pattern"
+    except Exception as e:
+        logger.warning(f"--> RESULT: 処理に失敗しました(id = {item['id']}): {e!r}", extra={"event": "item_failed", "id": item["id"], "stage": result["stage"]})
+        result["error"] = repr(e)
+    return result
+
+
+def build_pattern_index(pattern_file: str, records: dict) -> dedup.PatternIndex:
+    """保存済みのパターンを同等なものごとにまとめた索引を作成する
+
+    Args:
+        pattern_file (str): PatternWriterで書き出したパターンのファイル名
+        records (dict): ジャーナルの記録（完了した実装対のパターン名の取得に使う）
+
+    Returns:
+        dedup.PatternIndex: パターンの索引
+    """
+    # 完了した実装対のパターンだけを対象にし、パターン名から生成元の実装対を求める
+    source_ids = {
+        name: record["id"]
+        for record in records.values()
+        if record["status"] == journal.STATUS_DONE
+        for name in record["patterns"]
+    }
+    index = dedup.PatternIndex()
+    for pattern in stream.load_patterns(pattern_file):
+        if pattern["name"] in source_ids:
+            index.add(pattern, source_ids[pattern["name"]])
+    logger.info(f"--> 重複除去: {len(source_ids)}件のパターンを{len(index)}件にまとめました", extra={"event": "dedup", "patterns": len(source_ids), "distinct": len(index)})
+    return index
+
+
+def write_deduplicated_queries(patterns: list, folder_name: str, query_manifest: manifest.QueryManifest, report: dict) -> list:
+    """まとめたパターンごとに1つのクエリを保存する（変更があったものだけ）
+
+    Args:
+        patterns (list): まとめたパターンのリスト
+        folder_name (str): クエリ保存用のフォルダ名
+        query_manifest (manifest.QueryManifest): クエリのマニフェスト
+        report (dict): クエリの書き込み・スキップ・失敗の件数の集計
+
+    Returns:
+        list: 保存したクエリのパターン名のリスト
+    """
+    statuses = [write_query_if_changed(pattern, folder_name) for pattern in patterns]
+    _record_queries(query_manifest, patterns, statuses, report)
+    return [pattern["name"] for pattern in patterns]
+
+
+def write_combined_queries(patterns: list, folder_name: str, query_manifest: manifest.QueryManifest, report: dict) -> list:
+    """パターンを対象クラスごとに1つのクエリにまとめて保存する（変更があったものだけ）
+
+    マニフェストには、まとめたクエリの名前と含まれるパターンの組を1つのパターンとして記録する。
+
+    Args:
+        patterns (list): パターンのリスト
+        folder_name (str): クエリ保存用のフォルダ名
+        query_manifest (manifest.QueryManifest): クエリのマニフェスト
+        report (dict): クエリの書き込み・スキップ・失敗の件数の集計
+
+    Returns:
+        list: 保存したクエリのパターン名のリスト
+    """
+    entries, statuses = [], []
+    for ql_class, class_patterns in generator.group_patterns_by_ql_class(patterns).items():
+        entry = {"name": generator.combined_query_name(ql_class), "patterns": class_patterns}
+        entries.append(entry)
+        if query_manifest.is_current(entry):
+            statuses.append("skipped")
+            continue
+        codeql_query = generator.generate_combined_query(ql_class, class_patterns)
+        statuses.append("written" if codeql_query and _save_query(codeql_query, entry["name"], folder_name) else "failed")
+    _record_queries(query_manifest, entries, statuses, report)
+    return [entry["name"] for entry in entries]
+
+
+def _imap_bounded(executor, fn, iterable, max_in_flight: int):
+    """入力順に結果を返しつつ、同時に投入するタスク数を制限したmap
+
+    ProcessPoolExecutor.map は入力を全て先に投入するため、巨大な入力ではメモリが増え続ける。
+    """
+    pending = deque()
+    for args in iterable:
+        pending.append(executor.submit(fn, args))
+        if len(pending) >= max_in_flight:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def run_stream(source, workers: int | None = None, pattern_file: str = "MB_patterns.jsonl", folder_name: str = "MBQL", multiple: bool = False, max_items: int | None = None, resume: bool = False, deduplicate: bool = False, combined: bool = False, selectivity_options: dict | None = None) -> dict:
+    """MBデータセットを逐次的に読み込み、生成したパターンとクエリを順次書き出す
+
+    実装対はチャンク単位で読み込み・処理するため、メモリ使用量はデータセットの大きさによらない。
+    パターンは完了した実装対のものだけをJSON Lines形式で1件ずつ追記するため、途中で停止してもそれまでの結果は残り、
+    再開時に処理し直す実装対のパターンが重複することもない。
+    実装対ごとの処理状況はジャーナルに記録され、resume=True の場合は完了済みの実装対を
+    スキップして、失敗・未処理の実装対だけを処理する。
+    deduplicate=True の場合は、全ての実装対の処理後に同等なパターンをまとめ、
+    まとめたパターンごとに1つのクエリを保存する。combined=True の場合は、まとめたパターンを
+    さらに対象クラスごとに1つのクエリにまとめて保存する。
+
+    Args:
+        source: MBデータセットのファイルパス（.json または .jsonl）、または実装対のイテラブル
+        workers (int | None, optional): ワーカープロセス数（Noneの場合はCPU数）. Defaults to None.
+        pattern_file (str, optional): パターンの保存先ファイル名. Defaults to "MB_patterns.jsonl".
+        folder_name (str, optional): クエリ保存用のフォルダ名. Defaults to "MBQL".
+        multiple (bool, optional): 1つの実装対の全ての差分からパターンを生成するか. Defaults to False.
+        max_items (int | None, optional): 処理する実装対の上限（Noneの場合は全て）. Defaults to None.
+        resume (bool, optional): 前回の実行を再開するか. Defaults to False.
+        deduplicate (bool, optional): 同等なパターンをまとめてクエリを保存するか. Defaults to False.
+        combined (bool, optional): 対象クラスごとに1つのクエリにまとめて保存するか. Defaults to False.
+        selectivity_options (dict | None, optional): 検出範囲の判定に使う selectivity.load_guard の引数. Defaults to None.
+
+    Returns:
+        dict: 処理した実装対の数 ("items")、スキップした数 ("skipped")、失敗した数 ("failed")、
+              保存したパターンの数 ("patterns")、まとめたパターンの数 ("distinct"、deduplicate・combined の場合のみ)、
+              クエリの書き込み・スキップ・削除の件数 ("queries")
+    """
+    items = stream.iter_mb_items(source) if isinstance(source, (str, os.PathLike)) else iter(source)
+    items = islice(items, max_items)
+    workers = workers or os.cpu_count() or 1
+
+    process_chunk = _collecting(partial(process_items, multiple=multiple, folder_name=folder_name, write_queries=not (deduplicate or combined), selectivity_options=selectivity_options))
+    stats = {"items": 0, "skipped": 0, "failed": 0, "patterns": 0}
+    report = {"written": 0, "skipped": 0, "deleted": 0, "failed": 0}
+    query_manifest = manifest.load_manifest(folder_name, reload=True)
+
+    with journal.RunJournal(journal.journal_path(pattern_file), resume=resume) as run_journal, \
+            stream.PatternWriter(pattern_file, append=resume) as writer:
+
+        def pending_items():
+            # 前回までに完了した実装対はスキップする
+            for item in items:
+                if run_journal.is_done(item["id"]):
+                    stats["skipped"] += 1
+                    continue
+                yield item
+
+        remaining = pending_items()
+        progress = logs.Progress(total=max_items, label="処理")
+        chunks = iter(lambda: list(islice(remaining, BATCH_SIZE)), [])
+
+        def consume(chunk_results) -> None:
+            for results in _merge_collected(chunk_results):
+                for result in results:
+                    stats["items"] += 1
+                    progress.update(failed=result["status"] == journal.STATUS_FAILED)
+                    # 失敗した実装対は再開時に処理し直すため、完了した実装対のパターンだけを書き出す
+                    if result["status"] == journal.STATUS_DONE:
+                        for pattern in result.get("patterns", []):
+                            writer.write(pattern)
+                    _record_queries(query_manifest, result.get("patterns", []), result.get("queries", []), report)
+                    if result["status"] == journal.STATUS_FAILED:
+                        stats["failed"] += 1
+                    run_journal.record(result)
+
+        if workers == 1:
+            consume(process_chunk(chunk) for chunk in chunks)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                consume(_imap_bounded(executor, process_chunk, chunks, workers * 2))
+        progress.finish()
+
+        # 完了した全ての実装対（再開時は前回までの分も含む）のパターンを現在のパターンとする
+        active_names = [name for record in run_journal.records.values() for name in record["patterns"]]
+
+    if deduplicate or combined:
+        # 全ての実装対のパターンが揃ってから同等なパターンをまとめる
+        index = build_pattern_index(pattern_file, run_journal.records)
+        distinct_patterns = index.distinct_patterns()
+        save_pattern(distinct_patterns, f"{os.path.splitext(pattern_file)[0]}.distinct.json")
+        stats["distinct"] = len(index)
+        write_queries = write_combined_queries if combined else write_deduplicated_queries
+        active_names = write_queries(distinct_patterns, folder_name, query_manifest, report)
+
+    _finish_queries(query_manifest, active_names, report)
+    stats["queries"] = report
+    stats["patterns"] = writer.count
+    logger.info(f"--> パターンが保存されました: {writer.path} ({writer.count}件)", extra={"event": "patterns_saved", "path": str(writer.path), "count": writer.count})
+    logger.info(f"--> 処理: {stats['items']}件 / スキップ: {stats['skipped']}件 / 失敗: {stats['failed']}件", extra={"event": "summary", "items": stats["items"], "skipped": stats["skipped"], "failed": stats["failed"]})
+    return stats
+
 if __name__ == "__main__":
     # --- テストケース：ループ内での不要なコンストラクタ呼び出し ---
     slow = """
@@ -132,21 +616,45 @@ if __name__ == "__main__":
     # MB_codes = f"{path_const.MB_DATA}/selection.json"
 
     # 何件利用するか(全ての場合はNone)
-    MAX_ITEMS = None
-
-    # JSONファイル読み込み
-    with open(MB_codes, "r", encoding="utf-8") as f:
-        MB_data = json.load(f)[:300]
-
-    patterns = []
-    for item in MB_data:
-        # コードの差分からパターンを生成
-        patterns.append(create_pattern(item["id"], item["slow"], item["fast"]))
-
-    # ステップ2: 生成されたパターンをJSONファイルに保存
-    save_pattern(patterns, "MB_patterns.json")
-
-    # ステップ3: 生成されたパターンからCodeQLクエリを自動生成し保存
-    for pattern in patterns:
-        if pattern:  # Noneでない場合のみ
-            create_query(pattern, "MBQL")
+    MAX_ITEMS = 300
+
+    # 並列実行するワーカー数(CPU数の場合はNone)
+    WORKERS = None
+
+    # データセットを逐次読み込み、パターン(JSON Lines)とクエリを生成ごとに書き出すか
+    STREAMING = True
+
+    parser = argparse.ArgumentParser(description="MBの実装対からパターンとCodeQLクエリを生成する")
+    parser.add_argument("--input", default=MB_codes, help="MBデータセットのパス(.json / .jsonl)")
+    parser.add_argument("--max-items", type=int, default=MAX_ITEMS, help="処理する実装対の上限")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="ワーカープロセス数")
+    parser.add_argument("--multiple", action="store_true", help="1つの実装対の全ての差分からパターンを生成する")
+    parser.add_argument("--resume", action="store_true", help="前回の実行を再開し、完了済みの実装対をスキップする")
+    parser.add_argument("--dedup", action="store_true", help="同等なパターンをまとめ、まとめたパターンごとに1つのクエリを生成する")
+    parser.add_argument("--combined", action="store_true", help="同等なパターンをまとめ、対象クラスごとに1つのクエリを生成する")
+    parser.add_argument("--max-match-rate", type=float, default=None, help="コーパスでの検出率がこれを超えるパターンを絞り込む・除外する")
+    parser.add_argument("--corpus", default=None, help="検出率の見積もりに使うJSコーパスのディレクトリ（既定は path_const.REPO）")
+    parser.add_argument("--profile", action="store_true", help="段階ごとの処理時間・件数を計測し、/results/MB_pipeline.metrics.json, .csv に保存する")
+    logs.add_arguments(parser)
+    args = parser.parse_args()
+    logs.configure_from_args(args)
+    metrics.enable(args.profile)
+
+    selectivity_options = None
+    if args.max_match_rate is not None:
+        selectivity_options = {"corpus_dir": args.corpus, "max_rate": args.max_match_rate}
+
+    if STREAMING or args.resume:
+        run_stream(args.input, workers=args.workers, pattern_file="MB_patterns.jsonl", folder_name="MBQL", multiple=args.multiple, max_items=args.max_items, resume=args.resume, deduplicate=args.dedup, combined=args.combined, selectivity_options=selectivity_options)
+    else:
+        # JSONファイル読み込み
+        with open(args.input, "r", encoding="utf-8") as f:
+            MB_data = json.load(f)[:args.max_items]
+
+        # パターン生成・保存・クエリ生成を並列に実行
+        run_batch(MB_data, workers=args.workers, pattern_file="MB_patterns.json", folder_name="MBQL", multiple=args.multiple, selectivity_options=selectivity_options)
+
+    if args.profile:
+        metrics.print_report()
+        json_path, csv_path = metrics.write_report("MB_pipeline")
+        logger.info(f"--> 計測結果が保存されました: {json_path}, {csv_path}", extra={"event": "metrics_saved", "path": str(json_path)})
@@ -0,0 +1,257 @@
+# パイプラインの段階ごとの処理時間・件数・値の分布を集計する計測モジュール
+# 計測は enable() を呼んだプロセスでのみ行い、無効な場合の呼び出しはほぼ何もしない
+import csv
+import json
+import math
+import os
+import time
+from contextlib import nullcontext
+
+from mb_search import path_const
+
+# レポートの列
+REPORT_FIELDS = ["kind", "name", "count", "total", "mean", "min", "max", "p50", "p95"]
+
+# 計測の種類
+KIND_TIMER = "timer"
+KIND_COUNTER = "counter"
+KIND_HISTOGRAM = "histogram"
+
+# 分布のバケットの細かさ（1バケットあたり 2**(1/_BUCKETS_PER_OCTAVE) 倍、誤差は約9%以内）
+_BUCKETS_PER_OCTAVE = 8
+
+
+class Histogram:
+    """値の件数・合計・最小・最大と、対数スケールのバケットごとの件数を保持する
+
+    バケットの件数を足し合わせるだけで複数のプロセスの分布をまとめられる。
+    """
+
+    __slots__ = ("count", "total", "min", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.buckets = {}
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        bucket = math.floor(math.log2(value) * _BUCKETS_PER_OCTAVE) if value > 0 else None
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def quantile(self, q: float) -> float | None:
+        """バケットから分位点を見積もる（バケットの上限値を返す）"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bucket in sorted(self.buckets, key=lambda b: -math.inf if b is None else b):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return 0.0 if bucket is None else min(self.max, 2 ** ((bucket + 1) / _BUCKETS_PER_OCTAVE))
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {"count": self.count, "total": self.total, "min": self.min, "max": self.max,
+                "buckets": [[bucket, n] for bucket, n in self.buckets.items()]}
+
+    def merge(self, data: dict) -> None:
+        """to_dict の出力を合算する"""
+        self.count += data["count"]
+        self.total += data["total"]
+        self.min = min(self.min, data["min"])
+        self.max = max(self.max, data["max"])
+        for bucket, n in data["buckets"]:
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + n
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Metrics:
+    """段階ごとの処理時間 (timers)、件数 (counters)、値の分布 (histograms) を保持する"""
+
+    def __init__(self):
+        self.timers = {}
+        self.counters = {}
+        self.histograms = {}
+
+    def timer(self, name: str) -> _Timer:
+        histogram = self.timers.get(name)
+        if histogram is None:
+            histogram = self.timers[name] = Histogram()
+        return _Timer(histogram)
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name: str, value: float) -> None:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.observe(value)
+
+    def snapshot(self) -> dict:
+        """プロセス間で受け渡せる形式（JSONに変換できる辞書）で計測値を取得する"""
+        return {
+            "timers": {name: histogram.to_dict() for name, histogram in self.timers.items()},
+            "counters": dict(self.counters),
+            "histograms": {name: histogram.to_dict() for name, histogram in self.histograms.items()},
+        }
+
+    def merge(self, snapshot: dict) -> None:
+        """snapshot の出力（ワーカープロセスの計測値など）を合算する"""
+        for name, data in snapshot["timers"].items():
+            self.timers.setdefault(name, Histogram()).merge(data)
+        for name, n in snapshot["counters"].items():
+            self.count(name, n)
+        for name, data in snapshot["histograms"].items():
+            self.histograms.setdefault(name, Histogram()).merge(data)
+
+    def rows(self) -> list:
+        """REPORT_FIELDS を持つ行のリスト（種類ごと・名前順）に変換する"""
+        rows = []
+        for kind, histograms in ((KIND_TIMER, self.timers), (KIND_HISTOGRAM, self.histograms)):
+            for name in sorted(histograms):
+                histogram = histograms[name]
+                rows.append({
+                    "kind": kind, "name": name, "count": histogram.count,
+                    "total": round(histogram.total, 6), "mean": round(histogram.total / histogram.count, 6) if histogram.count else None,
+                    "min": round(histogram.min, 6) if histogram.count else None, "max": round(histogram.max, 6) if histogram.count else None,
+                    "p50": _round(histogram.quantile(0.5)), "p95": _round(histogram.quantile(0.95)),
+                })
+        for name in sorted(self.counters):
+            rows.append({"kind": KIND_COUNTER, "name": name, "count": self.counters[name],
+                         "total": None, "mean": None, "min": None, "max": None, "p50": None, "p95": None})
+        return rows
+
+
+def _round(value: float | None) -> float | None:
+    return None if value is None else round(value, 6)
+
+
+# プロセスごとの計測値と、計測が有効かどうか
+_metrics = Metrics()
+_enabled = False
+# 計測値を記録しているプロセス（fork したワーカープロセスが親の計測値を引き継がないようにする）
+_owner = os.getpid()
+_NULL_TIMER = nullcontext()
+
+
+def enable(enabled: bool = True) -> None:
+    """このプロセスでの計測を有効（または無効）にする"""
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def get_metrics() -> Metrics:
+    """プロセス内で共有される計測値を取得する"""
+    return _metrics
+
+
+def timer(name: str):
+    """with 文の間の処理時間（秒）を name の段階の時間として記録する"""
+    return _metrics.timer(name) if _enabled else _NULL_TIMER
+
+
+def count(name: str, n: int = 1) -> None:
+    """name の件数を n だけ増やす"""
+    if _enabled:
+        _metrics.count(name, n)
+
+
+def observe(name: str, value: float) -> None:
+    """name の分布に値を追加する"""
+    if _enabled:
+        _metrics.observe(name, value)
+
+
+def collect() -> dict:
+    """このプロセスの計測値を取り出してリセットする（ワーカープロセスから親プロセスへの受け渡し用）"""
+    global _metrics
+    snapshot = _metrics.snapshot()
+    _metrics = Metrics()
+    return snapshot
+
+
+def _discard_inherited() -> None:
+    global _metrics, _owner
+    if _owner != os.getpid():
+        _metrics = Metrics()
+        _owner = os.getpid()
+
+
+def merge(snapshot: dict | None) -> None:
+    """collect で取り出した計測値をこのプロセスの計測値に合算する"""
+    if snapshot:
+        _metrics.merge(snapshot)
+
+
+def call_collecting(fn, *args):
+    """計測を有効にして fn を呼び出し、結果とその間の計測値の組を返す（ワーカープロセスで使う）
+
+    Returns:
+        tuple: (fn の戻り値, collect の出力)
+    """
+    enable()
+    _discard_inherited()
+    return fn(*args), collect()
+
+
+def write_report(name: str, metrics: Metrics | None = None) -> tuple:
+    """計測値をJSONとCSVで保存する
+
+    Args:
+        name (str): 保存するファイル名（拡張子なし）
+        metrics (Metrics | None, optional): 保存する計測値（Noneの場合はこのプロセスの計測値）. Defaults to None.
+
+    Returns:
+        tuple: (JSONのパス, CSVのパス)（/results/{name}.metrics.json, .csv）
+    """
+    rows = (metrics or _metrics).rows()
+    os.makedirs(path_const.RESULTS, exist_ok=True)
+    json_path = path_const.RESULTS / f"{name}.metrics.json"
+    csv_path = path_const.RESULTS / f"{name}.metrics.csv"
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(rows, f, ensure_ascii=False, indent=2)
+    with open(csv_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    return json_path, csv_path
+
+
+def print_report(metrics: Metrics | None = None) -> None:
+    """段階ごとの処理時間（合計の降順）と件数を表示する"""
+    metrics = metrics or _metrics
+    rows = metrics.rows()
+    timers = sorted((row for row in rows if row["kind"] == KIND_TIMER), key=lambda row: row["total"], reverse=True)
+    print(f"{'stage':<28} {'count':>8} {'total(s)':>10} {'mean(ms)':>10} {'p50(ms)':>10} {'p95(ms)':>10}")
+    for row in timers:
+        print(f"{row['name']:<28} {row['count']:>8} {row['total']:>10.3f} {row['mean'] * 1000:>10.3f} {row['p50'] * 1000:>10.3f} {row['p95'] * 1000:>10.3f}")
+    for row in rows:
+        if row["kind"] == KIND_HISTOGRAM:
+            print(f"{row['name']:<28} {row['count']:>8} {'mean':>10} {row['mean']:>10.2f} {row['p50']:>10.2f} {row['p95']:>10.2f}")
+    for row in rows:
+        if row["kind"] == KIND_COUNTER:
+            print(f"{row['name']:<28} {row['count']:>8}")
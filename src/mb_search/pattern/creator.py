@@ -1,6 +1,11 @@
 # MBのAST差分からアンチパターンの検出ルールをヒューリスティックで作成する
+from mb_search import metrics
 from mb_search.ast import analyzer
 
+# 関数・条件分岐に該当するノードの種類
+FUNCTION_TYPES = analyzer.FUNCTION_TYPES
+CONDITIONAL_TYPES = frozenset(["IfStatement", "ConditionalExpression", "SwitchStatement"])
+
 def create_pattern_from_diff(id: int, slow_code: str, fast_code: str) -> dict | None:
     """実装対の差分から、アンチパターンの定義を自動生成する
 
@@ -12,14 +17,99 @@ def create_pattern_from_diff(id: int, slow_code: str, fast_code: str) -> dict |
     Returns:
         dict | None: 生成されたパターン（差分がない場合はNone）
     """
-    slow_ast = analyzer.generate_ast(slow_code, "slow_temp.js")
-    fast_ast = analyzer.generate_ast(fast_code, "fast_temp.js")
+    slow_ast = analyzer.generate_ast(slow_code)
+    fast_ast = analyzer.generate_ast(fast_code)
+
+    return create_pattern_from_asts(id, slow_ast, fast_ast)
+
+def create_pattern_from_asts(id: int, slow_ast: dict, fast_ast: dict, record_parent_type: bool = False) -> dict | None:
+    """生成済みの実装対のASTの差分から、アンチパターンの定義を自動生成する
 
-    diff_node, path_to_diff = analyzer.find_structural_difference(slow_ast, fast_ast)
+    Args:
+        id (int): 実装対のID
+        slow_ast (dict): 差分のパターンになる方のAST
+        fast_ast (dict): 差分のパターンにならない方のAST
+        record_parent_type (bool, optional): 検出範囲の判定で使う親ノードの種類（"parent_node_type"）を記録するか. Defaults to False.
+
+    Returns:
+        dict | None: 生成されたパターン（差分がない場合はNone）
+    """
+    with metrics.timer("diff"):
+        diff_node, path_to_diff = analyzer.find_structural_difference(slow_ast, fast_ast)
 
     if not diff_node:
+        metrics.count("pattern.no_difference")
         return None
 
+    return _build_pattern(id, diff_node, path_to_diff, slow_ast, record_parent_type=record_parent_type)
+
+def create_patterns_from_diff(id: int, slow_code: str, fast_code: str) -> list[dict]:
+    """実装対の全ての差分から、アンチパターンの定義を自動生成する
+
+    Args:
+        id (int): 実装対のID
+        slow_code (str): 差分のパターンになる方
+        fast_code (str): 差分のパターンにならない方
+
+    Returns:
+        list[dict]: 生成されたパターンのリスト（差分がない場合は空）
+    """
+    slow_ast, fast_ast = analyzer.generate_asts([slow_code, fast_code])
+    for ast in (slow_ast, fast_ast):
+        if isinstance(ast, analyzer.ASTParseError):
+            raise ast
+
+    return create_patterns_from_asts(id, slow_ast, fast_ast)
+
+def create_patterns_from_asts(id: int, slow_ast: dict, fast_ast: dict, record_parent_type: bool = False) -> list[dict]:
+    """生成済みの実装対のASTの全ての差分から、アンチパターンの定義を自動生成する
+
+    1つの実装対に複数の差分がある場合、再解析せずに差分ごとのパターンを生成する。
+    2つ目以降のパターンのIDには差分の番号を付加する（例: pattern_12_1_...）。
+
+    Args:
+        id (int): 実装対のID
+        slow_ast (dict): 差分のパターンになる方のAST
+        fast_ast (dict): 差分のパターンにならない方のAST
+        record_parent_type (bool, optional): 検出範囲の判定で使う親ノードの種類（"parent_node_type"）を記録するか. Defaults to False.
+
+    Returns:
+        list[dict]: 生成されたパターンのリスト（差分がない場合は空）
+    """
+    with metrics.timer("diff"):
+        differences = analyzer.find_structural_differences(slow_ast, fast_ast)
+    metrics.observe("diff.differences", len(differences))
+    if not differences:
+        metrics.count("pattern.no_difference")
+
+    patterns = []
+    for diff_node, path_to_diff in differences:
+        pattern_id = id if not patterns else f"{id}_{len(patterns)}"
+        # 祖先ノードの索引は差分のパス上だけで作る（AST全体の索引より差分の数が多くても安い）
+        pattern = _build_pattern(pattern_id, diff_node, list(path_to_diff), slow_ast, record_parent_type=record_parent_type)
+        if pattern is None:
+            continue
+        # 同じ実装対から同一条件のパターンは重複して生成しない
+        if any(existing["conditions"] == pattern["conditions"] and existing["target_node_type"] == pattern["target_node_type"] for existing in patterns):
+            continue
+        patterns.append(pattern)
+
+    return patterns
+
+def _build_pattern(id, diff_node: dict, path_to_diff: list, slow_ast: dict, index: analyzer.AncestorIndex | None = None, record_parent_type: bool = False) -> dict | None:
+    """差分ノードとそのパスからパターンを生成する
+
+    Args:
+        id (int | str): パターン名に使うID
+        diff_node (dict): 差分ノード
+        path_to_diff (list): 差分ノードへのパス
+        slow_ast (dict): 差分のパターンになる方のAST
+        index (analyzer.AncestorIndex | None, optional): slow_astの祖先ノードの索引（Noneの場合は差分のパス上だけの索引を構築する）. Defaults to None.
+        record_parent_type (bool, optional): 親ノードの種類（"parent_node_type"）を記録するか. Defaults to False.
+
+    Returns:
+        dict | None: 生成されたパターン（条件がない場合はNone）
+    """
     # AssignmentExpressionの場合、右辺のCallExpressionを検出対象にする
     if diff_node.get("type") == "AssignmentExpression" and "right" in diff_node:
         right_expr = diff_node["right"]
@@ -112,8 +202,15 @@ def create_pattern_from_diff(id: int, slow_code: str, fast_code: str) -> dict |
             pattern["name"] = f"pattern_{id}_{name}_identifier"
     
     # コンテキスト条件の追加（改良版）
-    context_conditions = _analyze_context(slow_ast, path_to_diff)
+    with metrics.timer("context"):
+        if index is None:
+            index = analyzer.build_ancestor_index(slow_ast, path_to_diff)
+        context_conditions = _analyze_context(slow_ast, path_to_diff, index)
     pattern["conditions"].extend(context_conditions)
+
+    # 検出範囲が広すぎるパターンを絞り込む際に使うため、親ノードの種類を記録する（判定後に selectivity が取り除く）
+    if record_parent_type:
+        pattern["parent_node_type"] = next(index.ancestor_types(path_to_diff, include_self=False, include_root=True), None)
     
     # 条件に基づいてパターン名を調整
     for context in context_conditions:
@@ -123,38 +220,53 @@ def create_pattern_from_diff(id: int, slow_code: str, fast_code: str) -> dict |
             pattern["name"] += "_in_function"
 
     if len(pattern["conditions"]) == 0:
+        metrics.count(f"pattern.none.{node_type}")
         return None
 
+    metrics.count("pattern.created")
+    metrics.observe("pattern.conditions", len(pattern["conditions"]))
     return pattern
 
-def _analyze_context(ast_root: dict, path_to_diff: list) -> list:
+def _analyze_context(ast_root: dict, path_to_diff: list, index: analyzer.AncestorIndex | None = None) -> list:
     """差分ノードのコンテキストを分析してCodeQLクエリ用の条件を生成
 
     Args:
         ast_root (dict): ASTのルートノード
         path_to_diff (list): 差分ノードへのパス
+        index (analyzer.AncestorIndex | None, optional): 構築済みの祖先ノードの索引（Noneの場合はパス上だけの索引を構築する）. Defaults to None.
 
     Returns:
         list: CodeQLクエリ用の条件リスト
     """
     conditions = []
+
+    # 祖先ノードの索引は差分のパス上だけで構築し、全ての判定で共有する
+    if index is None:
+        index = analyzer.build_ancestor_index(ast_root, path_to_diff)
     
     # ループ内かどうかの判定
-    if analyzer._is_in_loop_recursive(ast_root, path_to_diff):
+    if analyzer._is_in_loop_recursive(ast_root, path_to_diff, index):
         conditions.append({
             "type": "in_loop",
             "check": "is_in_loop"
         })
+
+        # ネストしたループ内かどうかの判定
+        if analyzer._loop_depth(ast_root, path_to_diff) > 1:
+            conditions.append({
+                "type": "in_nested_loop",
+                "check": "loop_depth"
+            })
     
     # 関数内かどうかの判定
-    if _is_in_function(ast_root, path_to_diff):
+    if _is_in_function(ast_root, path_to_diff, index):
         conditions.append({
             "type": "in_function",
             "check": "is_in_function"
         })
     
     # 条件分岐内かどうかの判定
-    if _is_in_conditional(ast_root, path_to_diff):
+    if _is_in_conditional(ast_root, path_to_diff, index):
         conditions.append({
             "type": "in_conditional",
             "check": "is_in_conditional"
@@ -162,48 +274,34 @@ def _analyze_context(ast_root: dict, path_to_diff: list) -> list:
     
     return conditions
 
-def _is_in_function(ast_root: dict, path: list) -> bool:
+def _is_in_function(ast_root: dict, path: list, index: analyzer.AncestorIndex | None = None) -> bool:
     """指定されたパスが関数内かチェック
 
     Args:
         ast_root (dict): ASTのルートノード
         path (list): ノードのパス
+        index (analyzer.AncestorIndex | None, optional): 構築済みの祖先ノードの索引（Noneの場合はパス上だけの索引を構築する）. Defaults to None.
 
     Returns:
         bool: 関数内にある場合はTrue、それ以外はFalse
     """
-    current_node = ast_root
-    for i in range(len(path)):
-        parent_path = path[:i+1]
-        try:
-            parent_node = analyzer._get_property_by_path(ast_root, parent_path[:-1]) if len(parent_path) > 1 else ast_root
-            if isinstance(parent_node, dict):
-                node_type = parent_node.get("type")
-                if node_type in ["FunctionDeclaration", "FunctionExpression", "ArrowFunctionExpression"]:
-                    return True
-        except (KeyError, TypeError, IndexError):
-            continue
-    return False
+    if index is None:
+        index = analyzer.build_ancestor_index(ast_root, path)
+    # ルートから親ノードまで（ノード自身は含めない）をチェック
+    return index.has_ancestor(path, FUNCTION_TYPES, include_self=False, include_root=True)
 
-def _is_in_conditional(ast_root: dict, path: list) -> bool:
+def _is_in_conditional(ast_root: dict, path: list, index: analyzer.AncestorIndex | None = None) -> bool:
     """指定されたパスが条件分岐内かチェック
 
     Args:
         ast_root (dict): ASTのルートノード
         path (list): ノードのパス
+        index (analyzer.AncestorIndex | None, optional): 構築済みの祖先ノードの索引（Noneの場合はパス上だけの索引を構築する）. Defaults to None.
 
     Returns:
         bool: 条件分岐内にある場合はTrue、それ以外はFalse
     """
-    current_node = ast_root
-    for i in range(len(path)):
-        parent_path = path[:i+1]
-        try:
-            parent_node = analyzer._get_property_by_path(ast_root, parent_path[:-1]) if len(parent_path) > 1 else ast_root
-            if isinstance(parent_node, dict):
-                node_type = parent_node.get("type")
-                if node_type in ["IfStatement", "ConditionalExpression", "SwitchStatement"]:
-                    return True
-        except (KeyError, TypeError, IndexError):
-            continue
-    return False
\ No newline at end of file
+    if index is None:
+        index = analyzer.build_ancestor_index(ast_root, path)
+    # ルートから親ノードまで（ノード自身は含めない）をチェック
+    return index.has_ancestor(path, CONDITIONAL_TYPES, include_self=False, include_root=True)
@@ -0,0 +1,111 @@
+# 複数の実装対から生成された同等なパターンをまとめ、重複したクエリを生成しないためのモジュール
+import copy
+import json
+
+from mb_search.query import generator
+
+# クエリ生成で名前として扱われないプレースホルダーの接頭辞（generatorと同じ規則）
+_PLACEHOLDER_PREFIXES = {
+    "object_name": "VAR_",
+    "name": "VAR_",
+    "function_name": "FUNCTION_",
+}
+
+# 空の値の場合もクエリで名前の条件にならない項目（generatorと同じ規則）
+_OPTIONAL_NAME_KEYS = frozenset(["object_name"])
+
+# 条件のうちクエリの内容に影響しない項目
+_IGNORED_CONDITION_KEYS = ("path", "check", "raw")
+
+
+def canonical_condition(condition: dict) -> dict:
+    """条件をクエリの内容に影響する項目だけに正規化する
+
+    パスなどの付随情報を除き、VAR_・FUNCTION_で始まるプレースホルダー名と空のオブジェクト名は
+    クエリでは名前の条件にならないため、項目がない場合と同じになるよう取り除く。
+
+    Args:
+        condition (dict): パターンの条件
+
+    Returns:
+        dict: 正規化した条件
+    """
+    canonical = {}
+    for key, value in condition.items():
+        if key in _IGNORED_CONDITION_KEYS:
+            continue
+        prefix = _PLACEHOLDER_PREFIXES.get(key)
+        if prefix and isinstance(value, str) and value.startswith(prefix):
+            continue
+        if key in _OPTIONAL_NAME_KEYS and not value:
+            continue
+        canonical[key] = value
+    return canonical
+
+
+def canonical_key(pattern: dict) -> str:
+    """同等なパターンが同じ値になるキーを求める
+
+    クエリが検出対象にするノードの種類と、クエリで使われる条件を正規化した集合（順序によらない）から求める。
+    メソッド呼び出しパターンは CallExpression・AssignmentExpression のどちらから生成されても
+    同じクエリになるため、同じキーになる。
+
+    Args:
+        pattern (dict): パターンの定義
+
+    Returns:
+        str: 正規化したパターンのキー
+    """
+    node_type, conditions = generator.query_target(pattern)
+    conditions = sorted(
+        json.dumps(canonical_condition(condition), ensure_ascii=False, sort_keys=True)
+        for condition in conditions
+    )
+    return json.dumps([node_type, conditions], ensure_ascii=False)
+
+
+class PatternIndex:
+    """正規化したキーでパターンをまとめ、それぞれの生成元の実装対のIDを保持する索引"""
+
+    def __init__(self):
+        self.groups = {}
+        self._names = set()
+
+    def add(self, pattern: dict, source_id) -> str:
+        """パターンを索引に追加する
+
+        Args:
+            pattern (dict): パターンの定義
+            source_id: パターンの生成元の実装対のID
+
+        Returns:
+            str: パターンをまとめたグループの代表パターン名
+        """
+        key = canonical_key(pattern)
+        group = self.groups.get(key)
+        if group is None:
+            # 最初に追加されたパターンをグループの代表にする
+            group = self.groups[key] = {"pattern": pattern, "source_ids": [], "names": []}
+
+        # 同じパターンが複数回追加された場合（再開した実行など）は1回だけ数える
+        if pattern["name"] not in self._names:
+            self._names.add(pattern["name"])
+            group["source_ids"].append(source_id)
+            group["names"].append(pattern["name"])
+        return group["pattern"]["name"]
+
+    def distinct_patterns(self) -> list:
+        """グループごとの代表パターンを追加された順に取得する
+
+        Returns:
+            list: 代表パターンのリスト（"source_ids" に生成元の実装対のIDを持つ）
+        """
+        patterns = []
+        for group in self.groups.values():
+            pattern = copy.deepcopy(group["pattern"])
+            pattern["source_ids"] = list(group["source_ids"])
+            patterns.append(pattern)
+        return patterns
+
+    def __len__(self) -> int:
+        return len(self.groups)
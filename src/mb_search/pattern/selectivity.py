@@ -0,0 +1,228 @@
+# 生成したパターンがどの程度の範囲を検出するかをサンプルのJSコーパスで見積もり、
+# 検出範囲が広すぎるパターンを絞り込む・除外するためのモジュール
+import math
+from pathlib import Path
+
+from mb_search import path_const
+from mb_search.ast import analyzer
+from mb_search.pattern import creator
+from mb_search.query import generator
+
+# 既定の許容する検出率（コーパスの全ノードのうち、パターンに一致するノードの割合）
+DEFAULT_MAX_RATE = 0.005
+
+# 既定のコーパスとして読み込むファイル数の上限と、1ファイルの大きさの上限（圧縮済みのバンドルを除く）
+DEFAULT_MAX_FILES = 200
+MAX_FILE_BYTES = 512 * 1024
+
+# 判定結果
+VERDICT_OK = "ok"
+VERDICT_NARROWED = "narrowed"
+VERDICT_REJECTED = "rejected"
+
+# クエリで検出対象になるノードの種類（これ以外のノードは件数だけを数える）
+_TARGET_TYPES = frozenset(generator.NODE_TYPE_TO_QL_CLASS)
+
+
+class CorpusProfile:
+    """コーパスの各ノードのうち、検出対象になりうるノードとそのコンテキストを種類ごとに保持する
+
+    コンテキストは (ノード, 親ノードの種類, ループのネストの深さ, 関数内か, 条件分岐内か) のタプルで、
+    ASTを1度だけ走査して求める。判定はクエリのコンテキスト述語（generator.CONTEXT_LIBRARY_SOURCE）に合わせる。
+
+    - ループ・関数は本体（"body"）に含まれるノードだけを対象にする（ループの条件式などは含めない）
+    - if文・switch文・条件演算子は、条件式を含む全ての子ノードを対象にする（getAChildStmt* は文自身も含む）
+    - 本体がブロックの関数に入ると外側のコンテキストを引き継がない（getAChildStmt* は関数の本体に入らない）
+    - 本体が式のアロー関数は、式を含む文が外側の文になるため外側のコンテキストを引き継ぐ
+    """
+
+    def __init__(self, asts: list):
+        self.total_nodes = 0
+        self.sites = {}
+        for ast in asts:
+            self._collect(ast)
+
+    def _collect(self, ast_root) -> None:
+        stack = [(ast_root, None, 0, False, False)]
+        while stack:
+            node, parent_type, loop_depth, in_function, in_conditional = stack.pop()
+            node_type = node.get("type")
+            if node_type is None:
+                continue
+            self.total_nodes += 1
+            if node_type in _TARGET_TYPES:
+                self.sites.setdefault(node_type, []).append((node, parent_type, loop_depth, in_function, in_conditional))
+
+            is_loop = node_type in analyzer.LOOP_TYPES
+            is_function = node_type in creator.FUNCTION_TYPES
+            child_conditional = in_conditional or node_type in creator.CONDITIONAL_TYPES
+            for key, value in node.items():
+                if key == "body" and is_function and isinstance(value, analyzer._NODE_TYPES) and value.get("type") == "BlockStatement":
+                    child_context = (node_type, 0, True, False)
+                else:
+                    child_context = (node_type, loop_depth + 1 if is_loop and key == "body" else loop_depth, in_function, child_conditional)
+                if isinstance(value, analyzer._NODE_TYPES):
+                    stack.append((value, *child_context))
+                elif isinstance(value, analyzer._LIST_TYPES):
+                    stack.extend((child, *child_context) for child in value if isinstance(child, analyzer._NODE_TYPES))
+
+
+def _literal_text(value) -> str:
+    # クエリの getValue() と同じ表記（真偽値は小文字）にそろえる
+    return str(value).lower() if isinstance(value, bool) else str(value)
+
+
+def _callee_name(node):
+    callee = node.get("callee")
+    return callee.get("name") if callee is not None and callee.get("type") == "Identifier" else None
+
+
+def _match_method_call(cond: dict, node) -> bool:
+    callee = node.get("callee")
+    if callee is None or callee.get("type") != "MemberExpression" or callee.get("computed"):
+        return False
+    if (callee.get("property") or {}).get("name") != cond["method_name"]:
+        return False
+    object_name = cond.get("object_name", "")
+    if object_name and not object_name.startswith("VAR_"):
+        return (callee.get("object") or {}).get("name") == object_name
+    return True
+
+
+def _match_literal_value(cond: dict, node) -> bool:
+    if cond.get("value_type") not in ("str", "int", "float", "bool"):
+        return True
+    return _literal_text(node.get("value")) == _literal_text(cond["value"])
+
+
+def _match_name(cond: dict, key: str, prefix: str, actual) -> bool:
+    expected = cond[key]
+    return expected.startswith(prefix) or actual == expected
+
+
+# 条件の種類ごとの判定（引数はノードとそのコンテキスト。未知の条件は検出範囲を狭めないものとする）
+_MATCHERS = {
+    "constructor_call": lambda cond, site: _callee_name(site[0]) == cond["constructor_name"],
+    "function_call": lambda cond, site: _match_name(cond, "function_name", "FUNCTION_", _callee_name(site[0])),
+    "method_call": lambda cond, site: _match_method_call(cond, site[0]),
+    "literal_value": lambda cond, site: _match_literal_value(cond, site[0]),
+    "identifier_name": lambda cond, site: _match_name(cond, "name", "VAR_", site[0].get("name")),
+    "parent_node_type": lambda cond, site: site[1] == cond["node_type"],
+    "in_loop": lambda cond, site: site[2] > 0,
+    "in_nested_loop": lambda cond, site: site[2] > 1,
+    "in_function": lambda cond, site: site[3],
+    "in_conditional": lambda cond, site: site[4],
+}
+
+
+def estimate(profile: CorpusProfile, pattern: dict) -> dict:
+    """パターンから生成されるクエリがコーパスで一致するノードの数を見積もる
+
+    Args:
+        profile (CorpusProfile): コーパスのノードの情報
+        pattern (dict): パターンの定義
+
+    Returns:
+        dict: 一致したノードの数 ("matches")、検出対象の種類のノードの数 ("candidates")、
+              コーパスの全ノードに対する一致したノードの割合 ("rate")
+    """
+    node_type, conditions = generator.query_target(pattern)
+    matchers = [(_MATCHERS[cond["type"]], cond) for cond in conditions if cond["type"] in _MATCHERS]
+    sites = profile.sites.get(node_type, [])
+    matches = sum(1 for site in sites if all(matcher(cond, site) for matcher, cond in matchers))
+    return {"matches": matches, "candidates": len(sites), "rate": matches / profile.total_nodes if profile.total_nodes else 0.0}
+
+
+class SelectivityGuard:
+    """検出範囲が広すぎるパターンを、親ノードの種類の条件で絞り込むか除外する"""
+
+    def __init__(self, profile: CorpusProfile, max_rate: float = DEFAULT_MAX_RATE):
+        self.profile = profile
+        self.max_rate = max_rate
+
+    def check(self, pattern: dict) -> tuple:
+        """パターンの検出率を判定し、必要に応じて絞り込む
+
+        検出率が max_rate を超える場合は、生成元の差分ノードの親ノードの種類（"parent_node_type"）を
+        条件に加えて再判定し、それでも超える場合は除外する。
+        "parent_node_type" は判定にだけ使うため、返すパターンからは取り除く（マニフェストのハッシュを変えない）。
+
+        Args:
+            pattern (dict): パターンの定義
+
+        Returns:
+            tuple: (パターン（除外した場合はNone）, 判定結果, 最後に見積もった検出率)
+        """
+        parent_type = pattern.get("parent_node_type")
+        pattern = {key: value for key, value in pattern.items() if key != "parent_node_type"}
+        rate = estimate(self.profile, pattern)["rate"]
+        if rate <= self.max_rate:
+            return pattern, VERDICT_OK, rate
+
+        if parent_type in generator.PARENT_NODE_TYPE_TO_QL_CLASS:
+            narrowed = dict(pattern, conditions=[*pattern["conditions"], {"type": "parent_node_type", "node_type": parent_type}])
+            rate = estimate(self.profile, narrowed)["rate"]
+            if rate <= self.max_rate:
+                return narrowed, VERDICT_NARROWED, rate
+        return None, VERDICT_REJECTED, rate
+
+
+def find_corpus_files(corpus_dir=None, max_files: int = DEFAULT_MAX_FILES) -> list:
+    """コーパスとして読み込むJSファイルを選ぶ
+
+    node_modules・圧縮済みファイル・大きすぎるファイルを除き、名前順に並べたものから等間隔に選ぶ。
+
+    Args:
+        corpus_dir (optional): コーパスのディレクトリ（Noneの場合は path_const.REPO）. Defaults to None.
+        max_files (int, optional): ファイル数の上限. Defaults to DEFAULT_MAX_FILES.
+
+    Returns:
+        list: JSファイルのパスのリスト
+    """
+    corpus_dir = Path(corpus_dir or path_const.REPO)
+    files = sorted(
+        path for path in corpus_dir.rglob("*.js")
+        if "node_modules" not in path.relative_to(corpus_dir).parts and not path.name.endswith(".min.js") and path.stat().st_size <= MAX_FILE_BYTES
+    )
+    step = max(1, math.ceil(len(files) / max_files))
+    return files[::step][:max_files]
+
+
+def build_profile(corpus_dir=None, max_files: int = DEFAULT_MAX_FILES) -> CorpusProfile:
+    """コーパスのJSファイルを解析してノードの情報を作成する（解析できないファイルは除く）
+
+    Args:
+        corpus_dir (optional): コーパスのディレクトリ（Noneの場合は path_const.REPO）. Defaults to None.
+        max_files (int, optional): ファイル数の上限. Defaults to DEFAULT_MAX_FILES.
+
+    Returns:
+        CorpusProfile: コーパスのノードの情報
+    """
+    codes = [path.read_text(encoding="utf-8", errors="replace") for path in find_corpus_files(corpus_dir, max_files)]
+    asts = [ast for ast in analyzer.generate_asts(codes, compact=True) if not isinstance(ast, analyzer.ASTParseError)]
+    if not asts:
+        raise ValueError(f"No parsable JavaScript files in corpus: {corpus_dir or path_const.REPO}")
+    return CorpusProfile(asts)
+
+
+# プロセスごとに作成したガード（ワーカープロセスでの参照用）
+_guards = {}
+
+
+def load_guard(corpus_dir=None, max_rate: float = DEFAULT_MAX_RATE, max_files: int = DEFAULT_MAX_FILES) -> SelectivityGuard:
+    """プロセス内で共有されるガードを取得する（初回呼び出し時にコーパスを解析する）
+
+    Args:
+        corpus_dir (optional): コーパスのディレクトリ（Noneの場合は path_const.REPO）. Defaults to None.
+        max_rate (float, optional): 許容する検出率. Defaults to DEFAULT_MAX_RATE.
+        max_files (int, optional): ファイル数の上限. Defaults to DEFAULT_MAX_FILES.
+
+    Returns:
+        SelectivityGuard: ガード
+    """
+    key = (str(corpus_dir), max_files)
+    guard = _guards.get(key)
+    if guard is None:
+        guard = _guards[key] = SelectivityGuard(build_profile(corpus_dir, max_files), max_rate)
+    guard.max_rate = max_rate
+    return guard
@@ -0,0 +1,69 @@
+# クエリ生成の処理速度（1秒あたりのパターン数）を計測するマイクロベンチマーク
+import argparse
+import random
+import time
+
+from mb_search.query import generator
+
+# creator が生成するパターンと同じ形の条件
+_TARGETS = [
+    ("NewExpression", {"type": "constructor_call", "constructor_name": "String"}),
+    ("CallExpression", {"type": "method_call", "method_name": "concat", "object_name": "VAR_1"}),
+    ("AssignmentExpression", {"type": "method_call", "method_name": "push", "object_name": "items"}),
+    ("CallExpression", {"type": "function_call", "function_name": "parseInt"}),
+    ("Literal", {"type": "literal_value", "value": "hello", "value_type": "str", "raw": "\"hello\""}),
+    ("Identifier", {"type": "identifier_name", "name": "length"}),
+]
+_CONTEXTS = [{"type": "in_loop"}, {"type": "in_nested_loop"}, {"type": "in_function"}, {"type": "in_conditional"}]
+
+
+def synthetic_patterns(n: int, seed: int = 0) -> list:
+    """計測用のパターンを生成する
+
+    Args:
+        n (int): パターン数
+        seed (int, optional): 乱数のシード. Defaults to 0.
+
+    Returns:
+        list: パターンのリスト
+    """
+    rng = random.Random(seed)
+    patterns = []
+    for i in range(n):
+        node_type, condition = _TARGETS[i % len(_TARGETS)]
+        contexts = [context for context in _CONTEXTS if rng.random() < 0.5]
+        patterns.append({
+            "name": f"pattern_{i}_{node_type}",
+            "description": "Automatically generated pattern from code diff.",
+            "target_node_type": node_type,
+            "conditions": [dict(condition, path=["callee", "name"])] + contexts,
+        })
+    return patterns
+
+
+def measure(patterns: list, repeat: int = 5) -> dict:
+    """パターンのクエリを一括生成する時間を計測する
+
+    Args:
+        patterns (list): パターンのリスト
+        repeat (int, optional): 計測回数（最も速い回を採用する）. Defaults to 5.
+
+    Returns:
+        dict: パターン数 ("patterns")、最短時間 ("seconds")、1秒あたりのパターン数 ("patterns_per_sec")
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        generator.render_queries(patterns)
+        best = min(best, time.perf_counter() - start)
+    return {"patterns": len(patterns), "seconds": best, "patterns_per_sec": len(patterns) / best}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="クエリ生成のマイクロベンチマーク")
+    parser.add_argument("-n", type=int, default=50000, help="パターン数")
+    parser.add_argument("--repeat", type=int, default=5, help="計測回数")
+    args = parser.parse_args()
+
+    result = measure(synthetic_patterns(args.n), args.repeat)
+    print(f"--> {result['patterns']}件: {result['seconds']:.3f}秒 ({result['patterns_per_sec']:.0f} patterns/s)")
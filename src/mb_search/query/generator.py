@@ -1,5 +1,8 @@
 # pattern_creator.pyで作成したパターンから CodeQLクエリを生成するモジュール
 # CodeQL JavaScript/TypeScript AST クラスに基づいたクエリ生成
+from mb_search import logs, metrics
+
+logger = logs.get_logger(__name__)
 
 # CodeQLのAST クラスマッピング（公式ドキュメント準拠）
 NODE_TYPE_TO_QL_CLASS = {
@@ -20,6 +23,147 @@ NODE_TYPE_TO_QL_CLASS = {
     "ArrowFunctionExpression": "ArrowFunctionExpr"
 }
 
+# 親ノードの種類の条件で使うクラスマッピング（式に加えて、式の親になる主な文・宣言）
+PARENT_NODE_TYPE_TO_QL_CLASS = {
+    **NODE_TYPE_TO_QL_CLASS,
+    "ExpressionStatement": "ExprStmt",
+    "VariableDeclarator": "VariableDeclarator",
+    "ReturnStatement": "ReturnStmt",
+    "IfStatement": "IfStmt",
+    "ForStatement": "ForStmt",
+    "WhileStatement": "WhileStmt",
+    "SequenceExpression": "SeqExpr",
+    "TemplateLiteral": "TemplateLiteral",
+    "ThrowStatement": "ThrowStmt",
+}
+
+# 生成したクエリが共有するコンテキスト述語のライブラリ（/codeql_queries_js/MBContext.qll）
+CONTEXT_LIBRARY = "MBContext"
+
+CONTEXT_LIBRARY_SOURCE = """/**
+ * MB-searchで生成したクエリが共有するコンテキスト述語
+ *
+ * ループ・関数・条件分岐の包含関係の推移閉包をクエリごと・変数ごとに計算しないよう、
+ * 文を引数とする cached 述語にまとめ、スイート全体で評価結果を再利用する。
+ */
+
+import javascript
+
+/** 文 `s` がループの本体に含まれるか */
+cached
+predicate inLoop(Stmt s) { exists(LoopStmt loop | loop.getBody().getAChildStmt*() = s) }
+
+/** 文 `s` が関数の本体に含まれるか */
+cached
+predicate inFunction(Stmt s) { exists(Function func | func.getBody().getAChildStmt*() = s) }
+
+/** 文 `s` がif文・switch文に含まれるか（条件式を含む文自身も対象にする） */
+cached
+predicate inConditional(Stmt s) {
+  exists(IfStmt ifstmt | ifstmt.getAChildStmt*() = s) or
+  exists(SwitchStmt switchStmt | switchStmt.getAChildStmt*() = s)
+}
+
+/** 式 `e` が条件演算子に含まれるか */
+cached
+predicate inConditionalExpr(Expr e) { exists(ConditionalExpr cond | cond.getAChildExpr+() = e) }
+
+/** 文 `s` を本体に含むループの数（ループのネストの深さ） */
+cached
+int loopDepth(Stmt s) { result = count(LoopStmt loop | loop.getBody().getAChildStmt*() = s) }
+"""
+
+# コンテキスト条件からライブラリの述語を使ったwhere句への変換
+CONTEXT_CLAUSES = {
+    "in_loop": "inLoop({}.getEnclosingStmt())",
+    "in_nested_loop": "loopDepth({}.getEnclosingStmt()) > 1",
+    "in_function": "inFunction({}.getEnclosingStmt())",
+    "in_conditional": "(inConditional({0}.getEnclosingStmt()) or inConditionalExpr({0}))",
+}
+
+# 条件の種類ごとのwhere句のレンダラー（_renders で登録する）
+_RENDERERS = {}
+
+def _renders(*cond_types: str):
+    """条件の種類に対するwhere句のレンダラーを登録するデコレーター
+
+    レンダラーは (条件, codeql変数名, where句のリスト) を受け取り、where句をリストに追加する関数。
+    """
+    def register(renderer):
+        for cond_type in cond_types:
+            _RENDERERS[cond_type] = renderer
+        return renderer
+    return register
+
+# コンストラクタ呼び出しの条件
+@_renders("constructor_call")
+def _render_constructor_call(cond: dict, ql_variable: str, clauses: list) -> None:
+    clauses.append(f'{ql_variable}.getCallee().(Identifier).getName() = "{cond["constructor_name"]}"')
+
+# メソッド呼び出しの条件（CallExpr向け - プロパティアクセス）
+@_renders("method_call")
+def _render_method_call(cond: dict, ql_variable: str, clauses: list) -> None:
+    object_name = cond.get("object_name", "")
+
+    # CallExprの場合：variable.method() パターン
+    clauses.append(f'{ql_variable}.getCallee() instanceof PropAccess')
+    clauses.append(f'{ql_variable}.getCallee().(PropAccess).getPropertyName() = "{cond["method_name"]}"')
+
+    # オブジェクト名の条件（VAR_で始まらない場合のみ）
+    if object_name and not object_name.startswith("VAR_"):
+        clauses.append(f'{ql_variable}.getCallee().(PropAccess).getBase().(VarAccess).getName() = "{object_name}"')
+
+# 関数呼び出しの条件
+@_renders("function_call")
+def _render_function_call(cond: dict, ql_variable: str, clauses: list) -> None:
+    function_name = cond["function_name"]
+    # function_nameが"FUNCTION_"で始まらない場合にのみ関数名の条件を追加
+    if not function_name.startswith("FUNCTION_"):
+        clauses.append(f'{ql_variable}.getCallee().(Identifier).getName() = "{function_name}"')
+
+# リテラル値の条件
+@_renders("literal_value")
+def _render_literal_value(cond: dict, ql_variable: str, clauses: list) -> None:
+    value = cond["value"]
+    value_type = cond["value_type"]
+    if value_type in ("str", "int", "float"):
+        clauses.append(f'{ql_variable}.getValue() = "{value}"')
+    elif value_type == "bool":
+        clauses.append(f'{ql_variable}.getValue() = "{str(value).lower()}"')
+
+# 識別子名の条件
+@_renders("identifier_name")
+def _render_identifier_name(cond: dict, ql_variable: str, clauses: list) -> None:
+    name = cond["name"]
+    # nameが"VAR_"で始まらない場合にのみ識別子名の条件を追加
+    if not name.startswith("VAR_"):
+        clauses.append(f'{ql_variable}.getName() = "{name}"')
+
+# 親ノードの種類の条件（selectivity で検出範囲を絞り込む際に追加される）
+@_renders("parent_node_type")
+def _render_parent_node_type(cond: dict, ql_variable: str, clauses: list) -> None:
+    ql_class = PARENT_NODE_TYPE_TO_QL_CLASS.get(cond["node_type"])
+    if ql_class:
+        clauses.append(f'{ql_variable}.getParent() instanceof {ql_class}')
+
+# コンテキスト条件（共有ライブラリの述語を使用）
+# 条件の値によらないため、変数名ごとに組み立てた句をそのまま使う
+_CONTEXT_FRAGMENTS = {}
+
+def _context_fragments(ql_variable: str) -> dict:
+    fragments = _CONTEXT_FRAGMENTS.get(ql_variable)
+    if fragments is None:
+        fragments = _CONTEXT_FRAGMENTS[ql_variable] = {
+            cond_type: clause.format(ql_variable) for cond_type, clause in CONTEXT_CLAUSES.items()
+        }
+    return fragments
+
+@_renders(*CONTEXT_CLAUSES)
+def _render_context(cond: dict, ql_variable: str, clauses: list) -> None:
+    clauses.append(_context_fragments(ql_variable)[cond["type"]])
+
+_WHERE_SEPARATOR = " and\n  "
+
 def _translate_conditions_to_where_clauses(pattern_conditions: list, ql_variable: str) -> str:
     """パターン条件をCodeQLのwhere句に変換
 
@@ -31,124 +175,177 @@ def _translate_conditions_to_where_clauses(pattern_conditions: list, ql_variable
         str: クエリのwhere句
     """
     where_clauses = []
-    
     for cond in pattern_conditions:
-        cond_type = cond["type"]
-        
-        # コンストラクタ呼び出しの条件
-        if cond_type == "constructor_call":
-            constructor_name = cond["constructor_name"]
-            where_clauses.append(f'{ql_variable}.getCallee().(Identifier).getName() = "{constructor_name}"')
-
-        # メソッド呼び出しの条件（CallExpr向け - プロパティアクセス）
-        elif cond_type == "method_call":
-            method_name = cond["method_name"]
-            object_name = cond.get("object_name", "")
-            
-            # CallExprの場合：variable.method() パターン
-            where_clauses.append(f'{ql_variable}.getCallee() instanceof PropAccess')
-            where_clauses.append(f'{ql_variable}.getCallee().(PropAccess).getPropertyName() = "{method_name}"')
-
-            # オブジェクト名の条件（VAR_で始まらない場合のみ）
-            if object_name and not object_name.startswith("VAR_"):
-                where_clauses.append(f'{ql_variable}.getCallee().(PropAccess).getBase().(VarAccess).getName() = "{object_name}"')
-
-        # 関数呼び出しの条件
-        elif cond_type == "function_call":
-            function_name = cond["function_name"]
-            # function_nameが"FUNCTION_"で始まらない場合にのみ関数名の条件を追加
-            if not function_name.startswith("FUNCTION_"):
-                where_clauses.append(f'{ql_variable}.getCallee().(Identifier).getName() = "{function_name}"')
-
-        # リテラル値の条件
-        elif cond_type == "literal_value":
-            value = cond["value"]
-            value_type = cond["value_type"]
-            
-            if value_type == "str":
-                where_clauses.append(f'{ql_variable}.getValue() = "{value}"')
-            elif value_type in ["int", "float"]:
-                where_clauses.append(f'{ql_variable}.getValue() = "{value}"')
-            elif value_type == "bool":
-                where_clauses.append(f'{ql_variable}.getValue() = "{str(value).lower()}"')
-
-        # 識別子名の条件
-        elif cond_type == "identifier_name":
-            name = cond["name"]
-            # nameが"VAR_"で始まらない場合にのみ識別子名の条件を追加
-            if not name.startswith("VAR_"):
-                where_clauses.append(f'{ql_variable}.getName() = "{name}"')
-
-        # コンテキスト条件
-        elif cond_type == "in_loop":
-            where_clauses.append(f'exists(LoopStmt loop | loop.getBody().getAChildStmt*() = {ql_variable}.getEnclosingStmt())')
-
-        elif cond_type == "in_function":
-            where_clauses.append(f'exists(Function func | func.getBody().getAChildStmt*() = {ql_variable}.getEnclosingStmt())')
-
-        elif cond_type == "in_conditional":
-            where_clauses.append(f'exists(IfStmt ifstmt | ifstmt.getAChildStmt*() = {ql_variable}.getEnclosingStmt())')
-
-    return " and\n  ".join(where_clauses)
+        renderer = _RENDERERS.get(cond["type"])
+        if renderer is not None:
+            renderer(cond, ql_variable, where_clauses)
+    return _WHERE_SEPARATOR.join(where_clauses)
 
-def generate_query_from_pattern(pattern: dict) -> str | None:
-    """パターンからCodeQLクエリを生成
+# from句のクラスごとの変数名（クラス名の先頭を小文字にしたもの）
+_QL_VARIABLES = {ql_class: ql_class[0].lower() + ql_class[1:] for ql_class in NODE_TYPE_TO_QL_CLASS.values()}
+
+# メソッド呼び出しパターンとして CallExpr で検出するノードの種類
+_METHOD_CALL_NODE_TYPES = frozenset(("CallExpression", "AssignmentExpression"))
+
+# メソッド呼び出しパターンでメソッド呼び出し条件と併せて使う条件の種類
+_METHOD_CALL_EXTRA_TYPES = frozenset((*CONTEXT_CLAUSES, "parent_node_type"))
+
+def _method_call_conditions(conditions: list) -> list | None:
+    """メソッド呼び出しパターンで使う条件（最初のメソッド呼び出し条件とコンテキスト・親ノードの条件）を取り出す"""
+    method_cond = next((c for c in conditions if c["type"] == "method_call"), None)
+    if method_cond is None:
+        return None
+    return [method_cond] + [c for c in conditions if c["type"] in _METHOD_CALL_EXTRA_TYPES]
+
+# パターン名・説明がない場合の既定値（メソッド呼び出しパターンは専用のクエリ生成で使っていた既定値）
+_DEFAULT_NAME_AND_DESCRIPTION = ("CustomGeneratedPattern", "No description provided.")
+_METHOD_CALL_DEFAULT_NAME_AND_DESCRIPTION = ("MethodCallPattern", "Method call pattern detected.")
+
+def _name_and_description(pattern: dict) -> tuple:
+    """クエリに使うパターン名と説明を求める"""
+    is_method_call = pattern.get("target_node_type") in _METHOD_CALL_NODE_TYPES and _method_call_conditions(pattern.get("conditions", [])) is not None
+    default_name, default_description = _METHOD_CALL_DEFAULT_NAME_AND_DESCRIPTION if is_method_call else _DEFAULT_NAME_AND_DESCRIPTION
+    return pattern.get("name", default_name), pattern.get("description", default_description)
+
+def query_target(pattern: dict) -> tuple:
+    """クエリが検出対象にするノードの種類と、クエリで使われる条件を求める
 
     Args:
         pattern (dict): パターンの定義
 
     Returns:
-        str | None: 生成されたCodeQLクエリ
+        tuple: (ESTreeのノードの種類, 条件のリスト)
     """
-    if not pattern:
-        return None
+    node_type = pattern.get("target_node_type")
+    conditions = pattern.get("conditions", [])
+    if node_type in _METHOD_CALL_NODE_TYPES:
+        method_conditions = _method_call_conditions(conditions)
+        if method_conditions is not None:
+            return "CallExpression", method_conditions
+    return node_type, conditions
 
-    pattern_name = pattern.get("name", "CustomGeneratedPattern")
-    description = pattern.get("description", "No description provided.")
+def _query_parts(pattern: dict, warnings: list | None = None) -> tuple | None:
+    """パターンからクエリのfrom句のクラス・変数名とwhere句を求める
+
+    Args:
+        pattern (dict): パターンの定義
+        warnings (list | None, optional): 変換できない理由を追加するリスト. Defaults to None.
+
+    Returns:
+        tuple | None: (CodeQLのクラス名, codeql変数名, where句)（変換できない場合はNone）
+    """
     node_type = pattern.get("target_node_type")
     conditions = pattern.get("conditions", [])
-    
+
     # メソッド呼び出しパターンの特別処理を優先
-    method_conditions = [c for c in conditions if c["type"] == "method_call"]
-    if method_conditions and node_type == "CallExpression":
-        return _generate_method_call_specific_query(pattern)
-    
-    # AssignmentExpressionの場合でもメソッド呼び出しがあれば特別処理
-    if node_type == "AssignmentExpression" and method_conditions:
-        return _generate_method_call_specific_query(pattern)
-    
+    # AssignmentExpressionの場合でもメソッド呼び出しがあれば CallExpr を対象にする
+    if node_type in _METHOD_CALL_NODE_TYPES:
+        method_conditions = _method_call_conditions(conditions)
+        if method_conditions is not None:
+            return "CallExpr", "callExpr", _translate_conditions_to_where_clauses(method_conditions, "callExpr")
+
     ql_class = NODE_TYPE_TO_QL_CLASS.get(node_type)
     if not ql_class:
-        print(f'[WARNING] 未対応のノードタイプ: {node_type}')
+        metrics.count("generator.unsupported_node_type")
+        metrics.count(f"generator.unsupported_node_type.{node_type}")
+        if warnings is not None:
+            warnings.append(f'未対応のノードタイプ: {node_type}')
         return None
 
-    # 変数名の生成
-    ql_variable = ql_class[0].lower() + ql_class[1:]
-    
+    ql_variable = _QL_VARIABLES[ql_class]
     where_clauses = _translate_conditions_to_where_clauses(conditions, ql_variable)
     if not where_clauses:
-        print(f'[WARNING] 変換可能な条件がありません: {pattern_name}')
+        metrics.count("generator.no_conditions")
+        if warnings is not None:
+            warnings.append(f'変換可能な条件がありません: {pattern.get("name", "CustomGeneratedPattern")}')
         return None
+    return ql_class, ql_variable, where_clauses
 
-    # CodeQLクエリテンプレート
-    template = f"""/**
- * @name {pattern_name}
- * @description {description}
+# 全てのクエリで共通のテンプレート（ヘッダーの固定部分とimportは事前に組み立て、値の間に挟んで連結する）
+_HEADER_NAME = "/**\n * @name "
+_HEADER_DESCRIPTION = "\n * @description "
+_HEADER_ID = """
  * @kind problem
  * @problem.severity warning
- * @id js/performance/{pattern_name.lower().replace("_", "-")}
+ * @id js/performance/"""
+_HEADER_END_FROM = f"""
  * @tags performance
  *       maintainability
  */
 
 import javascript
+import {CONTEXT_LIBRARY}
 
-from {ql_class} {ql_variable}
-where
-  {where_clauses}
-select {ql_variable}, "{description}"
-"""
-    return template
+from """
+_WHERE = "\nwhere\n  "
+_SELECT = "\nselect "
+
+def _render(name: str, description: str, from_clause: str, where: str, select: str) -> str:
+    return "".join((
+        _HEADER_NAME, name,
+        _HEADER_DESCRIPTION, description,
+        _HEADER_ID, name.lower().replace("_", "-"),
+        _HEADER_END_FROM, from_clause,
+        _WHERE, where,
+        _SELECT, select, "\n",
+    ))
+
+def render_query(pattern: dict, warnings: list | None = None) -> str | None:
+    """パターンからCodeQLクエリを生成する（出力を伴わない純粋な関数）
+
+    Args:
+        pattern (dict): パターンの定義
+        warnings (list | None, optional): 生成できない理由を追加するリスト. Defaults to None.
+
+    Returns:
+        str | None: 生成されたCodeQLクエリ（生成できない場合はNone）
+    """
+    if not pattern:
+        return None
+
+    parts = _query_parts(pattern, warnings)
+    if parts is None:
+        return None
+    ql_class, ql_variable, where_clauses = parts
+
+    name, description = _name_and_description(pattern)
+    return _render(
+        name,
+        description,
+        f"{ql_class} {ql_variable}",
+        where_clauses,
+        f'{ql_variable}, "{description}"',
+    )
+
+def render_queries(patterns: list) -> list:
+    """複数のパターンからCodeQLクエリを一括で生成する
+
+    Args:
+        patterns (list): パターンのリスト
+
+    Returns:
+        list: 入力と同じ順序のクエリのリスト（生成できないパターンはNone）
+    """
+    with metrics.timer("render"):
+        return [render_query(pattern) for pattern in patterns]
+
+def generate_query_from_pattern(pattern: dict) -> str | None:
+    """パターンからCodeQLクエリを生成
+
+    Args:
+        pattern (dict): パターンの定義
+
+    Returns:
+        str | None: 生成されたCodeQLクエリ
+    """
+    warnings = []
+    with metrics.timer("render"):
+        query = render_query(pattern, warnings)
+    if query is None:
+        metrics.count("generator.none")
+    for warning in warnings:
+        logger.warning(warning, extra={"event": "generator_warning", "pattern": pattern.get("name")})
+    return query
 
 def _generate_method_call_specific_query(pattern: dict) -> str:
     """メソッド呼び出し専用のクエリ生成（CallExpr使用）
@@ -158,59 +355,84 @@ def _generate_method_call_specific_query(pattern: dict) -> str:
     Returns:
         str: 生成されたCodeQLクエリ
     """
-    pattern_name = pattern.get("name", "MethodCallPattern")
-    description = pattern.get("description", "Method call pattern detected.")
-    conditions = pattern.get("conditions", [])
-    
-    # メソッド呼び出し条件を抽出
-    method_cond = next((c for c in conditions if c["type"] == "method_call"), None)
-    if not method_cond:
+    if _method_call_conditions(pattern.get("conditions", [])) is None:
         return None
-    
-    method_name = method_cond["method_name"]
-    object_name = method_cond.get("object_name", "")
-    
-    # where句の構築
-    where_clauses = []
-    
-    # メソッド呼び出しの基本条件（すべてのメソッドで共通）
-    where_clauses.append("callExpr.getCallee() instanceof PropAccess")
-    where_clauses.append(f'callExpr.getCallee().(PropAccess).getPropertyName() = "{method_name}"')
+    return render_query(dict(pattern, target_node_type="CallExpression"))
 
-    # オブジェクト名の条件（VAR_で始まらない場合のみ）
-    if object_name and not object_name.startswith("VAR_"):
-        where_clauses.append(f'callExpr.getCallee().(PropAccess).getBase().(VarAccess).getName() = "{object_name}"')
-
-    # コンテキスト条件を追加
-    for cond in conditions:
-        if cond["type"] == "in_loop":
-            where_clauses.append("exists(LoopStmt loop | loop.getBody().getAChildStmt*() = callExpr.getEnclosingStmt())")
-        elif cond["type"] == "in_function":
-            where_clauses.append("exists(Function func | func.getBody().getAChildStmt*() = callExpr.getEnclosingStmt())")
-        elif cond["type"] == "in_conditional":
-            where_clauses.append("exists(IfStmt ifstmt | ifstmt.getAChildStmt*() = callExpr.getEnclosingStmt())")
-    
-    where_clause_str = " and\n  ".join(where_clauses)
+def combined_query_name(ql_class: str) -> str:
+    """対象クラスごとにまとめたクエリのパターン名"""
+    return f"MB_combined_{ql_class}"
 
-    template = f"""/**
- * @name {pattern_name}
- * @description {description}
- * @kind problem
- * @problem.severity warning
- * @id js/performance/{pattern_name.lower().replace("_", "-")}
- * @tags performance
- *       maintainability
- */
+def group_patterns_by_ql_class(patterns: list) -> dict:
+    """パターンをクエリのfrom句のクラスごとにまとめる
 
-import javascript
+    Args:
+        patterns (list): パターンのリスト
 
-from CallExpr callExpr
-where
-  {where_clause_str}
-select callExpr, "{description}"
-"""
-    
-    return template
+    Returns:
+        dict: CodeQLのクラス名から、そのクラスを対象とするパターンのリストへの辞書（変換できないパターンは含まない）
+    """
+    groups = {}
+    for pattern in patterns:
+        if not pattern:
+            continue
+        warnings = []
+        parts = _query_parts(pattern, warnings)
+        for warning in warnings:
+            logger.warning(warning, extra={"event": "generator_warning", "pattern": pattern.get("name")})
+        if parts is not None:
+            groups.setdefault(parts[0], []).append(pattern)
+    return groups
+
+def generate_combined_query(ql_class: str, patterns: list) -> str | None:
+    """同じクラスを対象とする複数のパターンを1つのクエリにまとめる
+
+    各パターンのwhere句を選言で結合し、一致したパターンごとのメッセージを選択するため、
+    データベースの1回の走査とコンテキスト条件の1回の評価で全てのパターンを検出できる。
+
+    Args:
+        ql_class (str): CodeQLのクラス名
+        patterns (list): ql_class を対象とするパターンのリスト
+
+    Returns:
+        str | None: 生成されたCodeQLクエリ（変換可能なパターンがない場合はNone）
+    """
+    disjuncts = []
+    for pattern in patterns:
+        parts = _query_parts(pattern)
+        if parts is None or parts[0] != ql_class:
+            continue
+        _, ql_variable, where_clauses = parts
+        name, description = _name_and_description(pattern)
+        message = f'{description} ({name})'
+        where_clauses = where_clauses.replace("\n  ", "\n    ")
+        disjuncts.append(f'(\n    {where_clauses} and\n    msg = "{message}"\n  )')
+    if not disjuncts:
+        return None
+
+    return _render(
+        combined_query_name(ql_class),
+        f"Detects {len(disjuncts)} MB-derived performance patterns on {ql_class}",
+        f"{ql_class} {ql_variable}, string msg",
+        "\n  or\n  ".join(disjuncts),
+        f"{ql_variable}, msg",
+    )
+
+def generate_combined_queries(patterns: list) -> dict:
+    """パターンを対象クラスごとに1つのクエリにまとめて生成する
+
+    Args:
+        patterns (list): パターンのリスト
+
+    Returns:
+        dict: まとめたクエリのパターン名から、生成されたCodeQLクエリへの辞書
+    """
+    queries = {}
+    for ql_class, class_patterns in group_patterns_by_ql_class(patterns).items():
+        query = generate_combined_query(ql_class, class_patterns)
+        if query is not None:
+            queries[combined_query_name(ql_class)] = query
+    return queries
 
 def generate_method_call_query(method_name: str, object_type: str = None) -> str:
     """メソッド呼び出しパターン専用クエリ
@@ -0,0 +1,123 @@
+# 生成済みクエリとパターンの対応を記録し、変更があったクエリだけを再生成するためのモジュール
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from mb_search import path_const
+
+MANIFEST_NAME = ".manifest.json"
+
+
+def generator_version() -> str:
+    """クエリ生成器のバージョンを求める
+
+    generator.py の内容から求めるため、生成ロジックを変更すると全てのクエリが再生成される。
+
+    Returns:
+        str: クエリ生成器のバージョン
+    """
+    generator_path = Path(__file__).with_name("generator.py")
+    return hashlib.sha256(generator_path.read_bytes()).hexdigest()[:12]
+
+
+# パターンのうちクエリの内容に影響しない項目（まとめたパターンの生成元が増えてもクエリを再生成しない）
+_UNHASHED_KEYS = frozenset(["source_ids"])
+
+
+def _hashed_content(pattern: dict) -> dict:
+    content = {key: value for key, value in pattern.items() if key not in _UNHASHED_KEYS}
+    # 対象クラスごとにまとめたクエリは、含まれるパターンからも取り除く
+    if isinstance(content.get("patterns"), list):
+        content["patterns"] = [_hashed_content(child) for child in content["patterns"]]
+    return content
+
+
+def pattern_hash(pattern: dict, version: str) -> str:
+    """パターンとクエリ生成器のバージョンからハッシュを求める（生成元の実装対のIDは含めない）"""
+    canonical = json.dumps(_hashed_content(pattern), ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{version}\0{canonical}".encode("utf-8")).hexdigest()
+
+
+def query_filename(pattern: dict) -> str:
+    """パターンに対応するクエリのファイル名（pattern_nameを小文字に変換し、.qlを付加）"""
+    return f"{pattern['name'].lower()}.ql"
+
+
+class QueryManifest:
+    """クエリ保存フォルダごとに、パターン名とパターンのハッシュ・クエリファイルの対応を保持する
+
+    マニフェストは /codeql_queries_js/{folder_name}/.manifest.json に保存される。
+    """
+
+    def __init__(self, folder_name: str):
+        self.folder = path_const.QUERIES / folder_name
+        self.path = self.folder / MANIFEST_NAME
+        self.version = generator_version()
+        self.entries = {}
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f).get("queries", {})
+
+    def is_current(self, pattern: dict) -> bool:
+        """パターンに対応するクエリが前回と同じ内容で生成済みか判定する"""
+        entry = self.entries.get(pattern["name"])
+        return (
+            entry is not None
+            and entry["hash"] == pattern_hash(pattern, self.version)
+            and (self.folder / entry["file"]).exists()
+        )
+
+    def update(self, pattern: dict) -> None:
+        """パターンのクエリを生成したことを記録する"""
+        self.entries[pattern["name"]] = {
+            "hash": pattern_hash(pattern, self.version),
+            "file": query_filename(pattern),
+        }
+
+    def prune(self, active_names) -> list:
+        """現在のパターンに含まれないクエリを削除する
+
+        Args:
+            active_names: 現在のパターン名の集合
+
+        Returns:
+            list: 削除したクエリのパスのリスト
+        """
+        active_names = set(active_names)
+        deleted = []
+        for name in [name for name in self.entries if name not in active_names]:
+            entry = self.entries.pop(name)
+            file_path = self.folder / entry["file"]
+            if file_path.exists():
+                os.remove(file_path)
+                deleted.append(file_path)
+        return deleted
+
+    def save(self) -> None:
+        """マニフェストを保存する"""
+        os.makedirs(self.folder, exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"generator_version": self.version, "queries": self.entries}, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+# プロセスごとに読み込んだマニフェスト（ワーカープロセスでの参照用）
+_loaded = {}
+
+
+def load_manifest(folder_name: str, reload: bool = False) -> QueryManifest:
+    """プロセス内で共有されるマニフェストを取得する（初回呼び出し時に読み込む）
+
+    ワーカープロセスでは変更の有無の判定にのみ使い、更新・保存はメインプロセスで行う。
+
+    Args:
+        folder_name (str): クエリ保存用のフォルダ名
+        reload (bool, optional): 読み込み済みでもファイルから読み込み直すか. Defaults to False.
+
+    Returns:
+        QueryManifest: 読み込んだマニフェスト
+    """
+    manifest = _loaded.get(folder_name)
+    if manifest is None or reload:
+        manifest = _loaded[folder_name] = QueryManifest(folder_name)
+    return manifest
@@ -0,0 +1,148 @@
+# codeql CLI を呼び出してデータベースの作成とクエリの評価を行うモジュール
+import json
+import os
+import subprocess
+import time
+from pathlib import Path
+
+# codeql CLI の実行ファイル（環境変数 CODEQL で差し替えられる）
+DEFAULT_EXECUTABLE = "codeql"
+
+
+class CodeQLError(subprocess.CalledProcessError):
+    """codeql CLI が失敗した場合の例外"""
+
+    def __str__(self) -> str:
+        stderr = (self.stderr or "").strip().splitlines()
+        return f"codeql failed ({self.returncode}): {stderr[-1] if stderr else ''}"
+
+
+class CodeQL:
+    """codeql CLI の呼び出しを管理するクラス
+
+    スレッド数とメモリ量は全てのコマンドに共通で指定する。
+    実行ファイルを差し替えることで、同じ引数を受け取るスタブでも動作する。
+    """
+
+    def __init__(self, executable: str | None = None, threads: int = 0, ram: int | None = None):
+        """
+        Args:
+            executable (str | None, optional): codeql の実行ファイル（Noneの場合は環境変数 CODEQL、なければ "codeql"）. Defaults to None.
+            threads (int, optional): 評価に使うスレッド数（0の場合はCPU数）. Defaults to 0.
+            ram (int | None, optional): 評価に使うメモリ量(MB)（Noneの場合はcodeqlの既定値）. Defaults to None.
+        """
+        self.executable = executable or os.environ.get("CODEQL", DEFAULT_EXECUTABLE)
+        self.threads = threads
+        self.ram = ram
+
+    def _resource_options(self) -> list:
+        options = [f"--threads={self.threads}"]
+        if self.ram:
+            options.append(f"--ram={self.ram}")
+        return options
+
+    def _run(self, args: list) -> subprocess.CompletedProcess:
+        command = [self.executable, *map(str, args)]
+        result = subprocess.run(command, capture_output=True, text=True, encoding="utf-8")
+        if result.returncode != 0:
+            raise CodeQLError(result.returncode, command, result.stdout, result.stderr)
+        return result
+
+    def create_database(self, source_root, database, overwrite: bool = False) -> Path:
+        """JavaScriptのリポジトリからデータベースを作成する
+
+        Args:
+            source_root: リポジトリのパス
+            database: 作成するデータベースのパス
+            overwrite (bool, optional): 既存のデータベースを作り直すか. Defaults to False.
+
+        Returns:
+            Path: データベースのパス
+        """
+        args = ["database", "create", database, "--language=javascript", f"--source-root={source_root}", *self._resource_options()]
+        if overwrite:
+            args.append("--overwrite")
+        self._run(args)
+        return Path(database)
+
+    def run_query(self, database, query, output, extra_args: list = ()) -> float:
+        """データベースに対して1つのクエリを評価し、結果をBQRSファイルに保存する
+
+        Args:
+            database: データベースのパス
+            query: クエリ(.ql)のパス
+            output: 結果を保存するBQRSファイルのパス
+            extra_args (list, optional): codeql query run に追加する引数. Defaults to ().
+
+        Returns:
+            float: 評価にかかった時間（秒）
+        """
+        start = time.perf_counter()
+        self._run(["query", "run", f"--database={database}", f"--output={output}", *self._resource_options(), *extra_args, query])
+        return time.perf_counter() - start
+
+    def count_results(self, bqrs) -> int:
+        """BQRSファイルの #select の結果の件数を求める
+
+        Args:
+            bqrs: BQRSファイルのパス
+
+        Returns:
+            int: 結果の件数
+        """
+        info = json.loads(self._run(["bqrs", "info", "--format=json", bqrs]).stdout)
+        for result_set in info.get("resultSets", []):
+            if result_set.get("name") == "#select":
+                return result_set.get("rows", 0)
+        return 0
+
+    def summarize_log(self, evaluator_log, output) -> Path:
+        """評価ログを述語ごとの評価時間の要約に変換する
+
+        Args:
+            evaluator_log: codeql query run --evaluator-log で出力した評価ログのパス
+            output: 要約の保存先
+
+        Returns:
+            Path: 要約のパス
+        """
+        self._run(["generate", "log-summary", "--format=predicates", evaluator_log, output])
+        return Path(output)
+
+
+def is_database(path) -> bool:
+    """作成済みのCodeQLデータベースか判定する"""
+    return (Path(path) / "codeql-database.yml").exists()
+
+
+def parse_log_summary(path, top: int = 5) -> dict:
+    """codeql generate log-summary --format=predicates の出力を集計する
+
+    要約は述語ごとのJSONオブジェクトが連続したもので、評価時間 ("millis") を持つものを合計する。
+
+    Args:
+        path: 要約のパス
+        top (int, optional): 記録する評価時間の長い述語の数. Defaults to 5.
+
+    Returns:
+        dict: 評価時間の合計 ("evaluator_ms")、評価時間の長い述語 ("predicates": [[述語名, ミリ秒], ...])
+    """
+    text = Path(path).read_text(encoding="utf-8")
+    decoder = json.JSONDecoder()
+    predicates = {}
+    pos = 0
+    while True:
+        # オブジェクトの間の空白・改行を読み飛ばす
+        while pos < len(text) and text[pos].isspace():
+            pos += 1
+        if pos >= len(text):
+            break
+        event, pos = decoder.raw_decode(text, pos)
+        millis = event.get("millis")
+        if millis is None:
+            continue
+        name = event.get("predicateName") or event.get("raHash") or "?"
+        predicates[name] = predicates.get(name, 0) + millis
+
+    ranked = sorted(predicates.items(), key=lambda item: item[1], reverse=True)
+    return {"evaluator_ms": sum(predicates.values()), "predicates": [list(item) for item in ranked[:top]]}
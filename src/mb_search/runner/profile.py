@@ -0,0 +1,146 @@
+# スイートの評価記録とパターンの定義を対応付け、コストの高いクエリを順位付けしたレポートを作成するモジュール
+import argparse
+import csv
+import json
+import os
+from pathlib import Path
+
+from mb_search import logs, path_const, stream
+from mb_search.query import manifest
+from mb_search.runner import suite
+
+logger = logs.get_logger(__name__)
+
+# レポートの列
+REPORT_FIELDS = [
+    "rank", "query", "pattern", "target_node_type", "conditions", "seconds", "evaluator_ms",
+    "results", "hits", "seconds_per_hit", "repositories", "failed", "top_predicate",
+]
+
+
+def load_pattern_metadata(pattern_files: list) -> dict:
+    """パターンファイルを読み込み、クエリのファイル名からパターンへの辞書を作成する
+
+    Args:
+        pattern_files (list): /pattern 以下のパターンのファイル名のリスト（.json または .jsonl）
+
+    Returns:
+        dict: クエリのファイル名からパターンへの辞書（後のファイルのパターンが優先される）
+    """
+    patterns = {}
+    for file_name in pattern_files:
+        if not (path_const.PATTERN / file_name).exists():
+            continue
+        if str(file_name).endswith(".jsonl"):
+            loaded = stream.load_patterns(file_name)
+        else:
+            with open(path_const.PATTERN / file_name, "r", encoding="utf-8") as f:
+                loaded = json.load(f)
+        for pattern in loaded:
+            if pattern:
+                patterns[manifest.query_filename(pattern)] = pattern
+    return patterns
+
+
+def _top_predicates(records: list) -> dict:
+    """クエリごとに、全てのリポジトリで最も評価時間の長かった述語を求める"""
+    totals = {}
+    for record in records:
+        for name, millis in record.get("predicates", []):
+            query_totals = totals.setdefault(record["query"], {})
+            query_totals[name] = query_totals.get(name, 0) + millis
+    return {query: max(query_totals, key=query_totals.get) for query, query_totals in totals.items()}
+
+
+def build_report(records: list, patterns: dict | None = None, hits: dict | None = None) -> list:
+    """クエリごとのコストのレポートを作成する
+
+    結果1件あたりのコストは、確認済みの真の検出数 (hits) が与えられたクエリではその件数で、
+    それ以外は結果の件数で求める。結果が0件のクエリは1件あたりのコストを None とする。
+
+    Args:
+        records (list): suite.run_suite の記録のリスト
+        patterns (dict | None, optional): クエリのファイル名からパターンへの辞書. Defaults to None.
+        hits (dict | None, optional): クエリのファイル名から真の検出数への辞書. Defaults to None.
+
+    Returns:
+        list: 評価時間の降順に並べた、REPORT_FIELDS を持つ行のリスト
+    """
+    patterns = patterns or {}
+    hits = hits or {}
+    top_predicates = _top_predicates(records)
+
+    rows = []
+    for rank, entry in enumerate(suite.summarize(records), start=1):
+        pattern = patterns.get(entry["query"], {})
+        query_hits = hits.get(entry["query"], entry["results"])
+        rows.append({
+            "rank": rank,
+            "query": entry["query"],
+            "pattern": pattern.get("name"),
+            "target_node_type": pattern.get("target_node_type"),
+            "conditions": ",".join(condition["type"] for condition in pattern.get("conditions", [])),
+            "seconds": round(entry["seconds"], 3),
+            "evaluator_ms": entry["evaluator_ms"],
+            "results": entry["results"],
+            "hits": query_hits,
+            "seconds_per_hit": round(entry["seconds"] / query_hits, 6) if query_hits else None,
+            "repositories": entry["repositories"],
+            "failed": entry["failed"],
+            "top_predicate": top_predicates.get(entry["query"]),
+        })
+    return rows
+
+
+def write_report(rows: list, folder_name: str) -> tuple:
+    """レポートをJSONとCSVで保存する
+
+    Args:
+        rows (list): build_report で作成した行のリスト
+        folder_name (str): クエリ保存用のフォルダ名
+
+    Returns:
+        tuple: (JSONのパス, CSVのパス)（/results/{folder_name}.profile.json, .csv）
+    """
+    os.makedirs(path_const.RESULTS, exist_ok=True)
+    json_path = path_const.RESULTS / f"{folder_name}.profile.json"
+    csv_path = path_const.RESULTS / f"{folder_name}.profile.csv"
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(rows, f, ensure_ascii=False, indent=2)
+    with open(csv_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    return json_path, csv_path
+
+
+def print_report(rows: list, top: int = 20) -> None:
+    """コストの高いクエリを表示する（表全体を1件のログとして出力する）"""
+    lines = [f"{'rank':>4} {'seconds':>9} {'eval_ms':>9} {'results':>8} {'sec/hit':>9}  query (conditions)"]
+    for row in rows[:top]:
+        per_hit = "-" if row["seconds_per_hit"] is None else f"{row['seconds_per_hit']:.4f}"
+        lines.append(f"{row['rank']:>4} {row['seconds']:>9.2f} {row['evaluator_ms']:>9} {row['results']:>8} {per_hit:>9}  {row['query']} ({row['conditions']})")
+    logger.info("\n".join(lines), extra={"event": "profile_report", "rows": rows[:top]})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="スイートの評価記録からクエリごとのコストのレポートを作成する")
+    parser.add_argument("--folder", default="MBQL", help="クエリ保存用のフォルダ名")
+    parser.add_argument("--records", default=None, help="評価記録のパス（既定は /results/{folder}.timings.jsonl）")
+    parser.add_argument("--patterns", nargs="*", default=["MB_patterns.json", "MB_patterns.jsonl", "MB_patterns.distinct.json"], help="/pattern 以下のパターンのファイル名")
+    parser.add_argument("--hits", default=None, help="クエリのファイル名から真の検出数への辞書（JSON）のパス")
+    parser.add_argument("--top", type=int, default=20, help="表示するクエリの件数")
+    logs.add_arguments(parser)
+    args = parser.parse_args()
+    logs.configure_from_args(args)
+
+    hits = None
+    if args.hits:
+        with open(args.hits, "r", encoding="utf-8") as f:
+            hits = json.load(f)
+
+    records = suite.load_records(Path(args.records or suite.results_path(args.folder)))
+    rows = build_report(records, load_pattern_metadata(args.patterns), hits)
+    json_path, csv_path = write_report(rows, args.folder)
+    print_report(rows, args.top)
+    logger.info(f"--> レポートが保存されました: {json_path}, {csv_path}", extra={"event": "profile_saved", "path": str(json_path), "csv_path": str(csv_path)})
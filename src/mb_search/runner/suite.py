@@ -0,0 +1,221 @@
+# 生成したクエリのスイートを path_const.REPO 以下の各リポジトリに対して評価し、
+# クエリごとの評価時間と結果の件数を記録するモジュール
+import argparse
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from mb_search import logs, path_const
+from mb_search.runner.codeql import CodeQL, CodeQLError, is_database, parse_log_summary
+
+logger = logs.get_logger(__name__)
+
+# 評価の結果
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+
+
+def find_repositories(root=None) -> list:
+    """評価対象のリポジトリを取得する
+
+    Args:
+        root (optional): リポジトリを配置したディレクトリ（Noneの場合は path_const.REPO）. Defaults to None.
+
+    Returns:
+        list: リポジトリのパスのリスト（名前順）
+    """
+    root = Path(root or path_const.REPO)
+    return sorted(path for path in root.iterdir() if path.is_dir() and not path.name.startswith("."))
+
+
+def find_queries(folder_name: str) -> list:
+    """クエリ保存用のフォルダにあるクエリを取得する
+
+    Args:
+        folder_name (str): クエリ保存用のフォルダ名
+
+    Returns:
+        list: クエリ(.ql)のパスのリスト（名前順）
+    """
+    return sorted((path_const.QUERIES / folder_name).glob("*.ql"))
+
+
+def database_path(repository) -> Path:
+    """リポジトリのデータベースの保存先（/.cache/codeql-db/{リポジトリ名}）"""
+    return path_const.CODEQL_DB / Path(repository).name
+
+
+def results_path(folder_name: str) -> Path:
+    """評価結果の記録の保存先（/results/{folder_name}.timings.jsonl）"""
+    return path_const.RESULTS / f"{folder_name}.timings.jsonl"
+
+
+def prepare_database(codeql: CodeQL, repository, rebuild: bool = False) -> Path:
+    """リポジトリのデータベースを作成する（作成済みの場合は再利用する）
+
+    Args:
+        codeql (CodeQL): codeql CLI
+        repository: リポジトリのパス
+        rebuild (bool, optional): 作成済みでも作り直すか. Defaults to False.
+
+    Returns:
+        Path: データベースのパス
+    """
+    database = database_path(repository)
+    if is_database(database) and not rebuild:
+        return database
+    os.makedirs(database.parent, exist_ok=True)
+    return codeql.create_database(repository, database, overwrite=True)
+
+
+def run_repository(codeql: CodeQL, repository, queries: list, folder_name: str, rebuild: bool = False, profile: bool = False) -> list:
+    """1つのリポジトリに対して全てのクエリを順に評価する
+
+    同じデータベースで続けて評価するため、共有ライブラリの cached 述語の評価結果は
+    データベースのキャッシュを通じて後続のクエリで再利用される。
+
+    Args:
+        codeql (CodeQL): codeql CLI
+        repository: リポジトリのパス
+        queries (list): クエリのパスのリスト
+        folder_name (str): クエリ保存用のフォルダ名（BQRSファイルの保存先に使う）
+        rebuild (bool, optional): データベースを作り直すか. Defaults to False.
+        profile (bool, optional): 評価ログを出力し、述語ごとの評価時間を記録するか. Defaults to False.
+
+    Returns:
+        list: クエリごとの記録（"repository", "query", "status", "seconds", "results", "error"、
+              profile の場合は "evaluator_ms", "predicates" も含む）のリスト
+    """
+    repository = Path(repository)
+    try:
+        database = prepare_database(codeql, repository, rebuild)
+    except CodeQLError as e:
+        # データベースを作成できない場合はリポジトリ単位の失敗として記録する
+        return [{"repository": repository.name, "query": None, "status": STATUS_FAILED, "seconds": None, "results": None, "error": str(e)}]
+
+    bqrs_dir = path_const.RESULTS / folder_name / repository.name
+    os.makedirs(bqrs_dir, exist_ok=True)
+
+    records = []
+    for query in queries:
+        query = Path(query)
+        record = {"repository": repository.name, "query": query.name, "status": STATUS_FAILED, "seconds": None, "results": None}
+        bqrs = bqrs_dir / f"{query.stem}.bqrs"
+        evaluator_log = bqrs_dir / f"{query.stem}.evaluator.log"
+        extra_args = [f"--evaluator-log={evaluator_log}"] if profile else []
+        try:
+            record["seconds"] = round(codeql.run_query(database, query, bqrs, extra_args), 3)
+            record["results"] = codeql.count_results(bqrs)
+            if profile:
+                summary = codeql.summarize_log(evaluator_log, bqrs_dir / f"{query.stem}.summary.jsonl")
+                record.update(parse_log_summary(summary))
+            record["status"] = STATUS_OK
+        except CodeQLError as e:
+            record["error"] = str(e)
+        records.append(record)
+    return records
+
+
+def run_suite(folder_name: str = "MBQL", repositories: list | None = None, jobs: int = 1, threads: int = 0, ram: int | None = None,
+              executable: str | None = None, rebuild: bool = False, output=None, profile: bool = False) -> list:
+    """クエリのスイートを複数のリポジトリに対して並列に評価する
+
+    リポジトリ単位でワーカーに割り当て、評価が終わったリポジトリから順に記録をJSON Lines形式で追記する。
+
+    Args:
+        folder_name (str, optional): クエリ保存用のフォルダ名. Defaults to "MBQL".
+        repositories (list | None, optional): リポジトリのパスのリスト（Noneの場合は path_const.REPO 以下の全て）. Defaults to None.
+        jobs (int, optional): 同時に評価するリポジトリ数. Defaults to 1.
+        threads (int, optional): 1つのリポジトリの評価に使うスレッド数（0の場合はCPU数）. Defaults to 0.
+        ram (int | None, optional): 1つのリポジトリの評価に使うメモリ量(MB). Defaults to None.
+        executable (str | None, optional): codeql の実行ファイル. Defaults to None.
+        rebuild (bool, optional): 作成済みのデータベースを作り直すか. Defaults to False.
+        output (optional): 記録の保存先（Noneの場合は /results/{folder_name}.timings.jsonl）. Defaults to None.
+        profile (bool, optional): 評価ログから述語ごとの評価時間を記録するか. Defaults to False.
+
+    Returns:
+        list: クエリごとの記録のリスト
+    """
+    queries = find_queries(folder_name)
+    repositories = find_repositories() if repositories is None else [Path(repository) for repository in repositories]
+    codeql = CodeQL(executable, threads=threads, ram=ram)
+    output = Path(output or results_path(folder_name))
+    os.makedirs(output.parent, exist_ok=True)
+
+    logger.info(f"--> 評価: クエリ {len(queries)}件 × リポジトリ {len(repositories)}件 (jobs={jobs}, threads={threads}, ram={ram})",
+                extra={"event": "suite_start", "queries": len(queries), "repositories": len(repositories), "jobs": jobs, "threads": threads, "ram": ram})
+    all_records = []
+    with open(output, "w", encoding="utf-8") as f, ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        futures = {executor.submit(run_repository, codeql, repository, queries, folder_name, rebuild, profile): repository for repository in repositories}
+        for future in as_completed(futures):
+            records = future.result()
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            all_records.extend(records)
+            failed = sum(record["status"] == STATUS_FAILED for record in records)
+            logger.info(f"--> {futures[future].name}: {len(records) - failed}件成功 / {failed}件失敗",
+                        extra={"event": "repository_evaluated", "repository": futures[future].name, "ok": len(records) - failed, "failed": failed})
+
+    logger.info(f"--> 評価結果が保存されました: {output}", extra={"event": "suite_saved", "path": str(output)})
+    return all_records
+
+
+def load_records(path) -> list:
+    """run_suite で保存した記録を読み込む"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def summarize(records: list) -> list:
+    """クエリごとに全てのリポジトリの評価時間と結果の件数を合計する
+
+    Args:
+        records (list): run_suite の記録のリスト
+
+    Returns:
+        list: クエリごとの集計（"query", "seconds", "results", "evaluator_ms", "repositories", "failed"）を評価時間の降順に並べたリスト
+    """
+    summary = {}
+    for record in records:
+        if record["query"] is None:
+            continue
+        entry = summary.setdefault(record["query"], {"query": record["query"], "seconds": 0.0, "results": 0, "evaluator_ms": 0, "repositories": 0, "failed": 0})
+        if record["status"] == STATUS_OK:
+            entry["seconds"] += record["seconds"]
+            entry["results"] += record["results"]
+            entry["evaluator_ms"] += record.get("evaluator_ms", 0)
+            entry["repositories"] += 1
+        else:
+            entry["failed"] += 1
+    return sorted(summary.values(), key=lambda entry: entry["seconds"], reverse=True)
+
+
+def print_slowest(records: list, top: int = 10) -> None:
+    """評価時間の長いクエリを表示する（表全体を1件のログとして出力する）"""
+    entries = summarize(records)[:top]
+    lines = [f"{'seconds':>10} {'results':>8} {'repos':>5} {'failed':>6}  query"]
+    for entry in entries:
+        lines.append(f"{entry['seconds']:>10.2f} {entry['results']:>8} {entry['repositories']:>5} {entry['failed']:>6}  {entry['query']}")
+    logger.info("\n".join(lines), extra={"event": "slowest_queries", "queries": entries})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="生成したCodeQLクエリをリポジトリに対して評価し、クエリごとの評価時間を記録する")
+    parser.add_argument("--folder", default="MBQL", help="クエリ保存用のフォルダ名")
+    parser.add_argument("--repo-root", default=None, help="リポジトリを配置したディレクトリ（既定は path_const.REPO）")
+    parser.add_argument("--jobs", type=int, default=1, help="同時に評価するリポジトリ数")
+    parser.add_argument("--threads", type=int, default=0, help="1つのリポジトリの評価に使うスレッド数(0はCPU数)")
+    parser.add_argument("--ram", type=int, default=None, help="1つのリポジトリの評価に使うメモリ量(MB)")
+    parser.add_argument("--codeql", default=None, help="codeql の実行ファイル（既定は環境変数 CODEQL または codeql）")
+    parser.add_argument("--rebuild", action="store_true", help="作成済みのデータベースを作り直す")
+    parser.add_argument("--profile", action="store_true", help="評価ログから述語ごとの評価時間を記録する")
+    parser.add_argument("--top", type=int, default=10, help="表示する遅いクエリの件数")
+    logs.add_arguments(parser)
+    args = parser.parse_args()
+    logs.configure_from_args(args)
+
+    records = run_suite(args.folder, find_repositories(args.repo_root), jobs=args.jobs, threads=args.threads, ram=args.ram,
+                        executable=args.codeql, rebuild=args.rebuild, profile=args.profile)
+    print_slowest(records, args.top)
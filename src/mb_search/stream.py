@@ -0,0 +1,151 @@
+# 大規模なMBデータセットを逐次的に読み込み、生成したパターンを逐次書き出すモジュール
+import json
+import os
+from typing import Iterator
+
+from mb_search import metrics, path_const
+
+# JSON配列を逐次読み込む際に1度に読み込む文字数
+_READ_SIZE = 64 * 1024
+
+_WHITESPACE = " \t\r\n"
+
+
+def iter_mb_items(file_path) -> Iterator[dict]:
+    """MBデータセットの実装対を1件ずつ読み込む
+
+    JSON Lines形式（.jsonl）は1行ずつ、JSON配列形式はファイル全体を読み込まずに
+    要素ごとにデコードするため、データセットの大きさによらずメモリ使用量は一定になる。
+
+    Args:
+        file_path: MBデータセットのファイルパス（.json または .jsonl）
+
+    Yields:
+        dict: "id", "slow", "fast" を持つMBデータ
+    """
+    with open(file_path, "r", encoding="utf-8") as f:
+        if str(file_path).endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+
+        yield from _iter_json_array(f)
+
+
+def _iter_json_array(f) -> Iterator:
+    """ファイルオブジェクトからトップレベルのJSON配列の要素を1つずつデコードする"""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+
+    def fill() -> bool:
+        nonlocal buffer, pos, eof
+        chunk = f.read(_READ_SIZE)
+        if not chunk:
+            eof = True
+            return False
+        # デコード済みの部分は破棄してバッファが大きくならないようにする
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        return True
+
+    def skip(chars: str) -> None:
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in chars:
+                pos += 1
+            if pos < len(buffer) or eof or not fill():
+                return
+
+    skip(_WHITESPACE)
+    if pos >= len(buffer) or buffer[pos] != "[":
+        raise ValueError("MB dataset must be a JSON array or JSON Lines")
+    pos += 1
+
+    while True:
+        skip(_WHITESPACE + ",")
+        if pos >= len(buffer):
+            raise ValueError("Unexpected end of MB dataset: missing ']'")
+        if buffer[pos] == "]":
+            return
+
+        # 要素の途中でバッファが尽きている場合は追加で読み込んで再試行する。
+        # 数値は途中までの文字列（"-0." の "-0" など）でもデコードできてしまうため、
+        # 要素の後に区切り文字（"," か "]"）が読み込まれるまで確定させない
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof or not fill():
+                    raise
+                continue
+            rest = buffer[end:].lstrip(_WHITESPACE)
+            if (rest and rest[0] in ",]") or eof or not fill():
+                break
+        pos = end
+        yield item
+
+
+class PatternWriter:
+    """生成されたパターンをJSON Lines形式で1件ずつ追記するクラス
+
+    パターンは生成されるたびに書き出してフラッシュするため、実行が途中で止まっても
+    それまでのパターンは失われず、全パターンをメモリに保持する必要もない。
+    追記する場合は、書き出してからジャーナルに記録するまでの間に停止した実装対を
+    再開時に処理し直してもパターンが重複しないよう、既に書き出した名前のパターンは書き出さない。
+    """
+
+    def __init__(self, file_name: str, append: bool = False):
+        self.path = path_const.PATTERN / file_name
+        self.append = append
+        self.count = 0
+        self._file = None
+        self._written = set()
+
+    def __enter__(self) -> "PatternWriter":
+        # パターンディレクトリが存在しない場合は作成
+        os.makedirs(path_const.PATTERN, exist_ok=True)
+        if self.append and self.path.exists():
+            self._written = self._load_names()
+        self._file = open(self.path, "a" if self.append else "w", encoding="utf-8")
+        return self
+
+    def _load_names(self) -> set:
+        names = set()
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    names.add(json.loads(line)["name"])
+                except json.JSONDecodeError:
+                    # 書き込み途中で停止した最終行は無視する
+                    continue
+        return names
+
+    def write(self, pattern: dict) -> None:
+        """パターンを1行のJSONとして書き出す（追記時に既に書き出した名前のパターンは書き出さない）"""
+        if pattern["name"] in self._written:
+            return
+        self._written.add(pattern["name"])
+        with metrics.timer("write.pattern"):
+            self._file.write(json.dumps(pattern, ensure_ascii=False) + "\n")
+            self._file.flush()
+        self.count += 1
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self._file.close()
+        self._file = None
+
+
+def load_patterns(file_name: str) -> list:
+    """PatternWriterで書き出したパターンを読み込む
+
+    Args:
+        file_name (str): パターンのファイル名
+
+    Returns:
+        list: パターンのリスト
+    """
+    with open(path_const.PATTERN / file_name, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
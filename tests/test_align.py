@@ -0,0 +1,61 @@
+# 複数の差分を列挙する比較で、子ノードのリストを patience diff の方法で対応付けることを確認するテスト
+import random
+import shutil
+
+import pytest
+
+from mb_search.ast import analyzer
+
+
+def _assert_alignment(keys1: list, keys2: list, pairs: list) -> None:
+    """対応付けが順序を保ち、同じ要素どうしだけを組にしていることを確認する"""
+    assert all(keys1[i] == keys2[j] for i, j in pairs)
+    assert all(i1 < i2 and j1 < j2 for (i1, j1), (i2, j2) in zip(pairs, pairs[1:]))
+
+
+def test_inserted_and_removed_elements_do_not_shift_the_rest():
+    keys1, keys2 = list("abcxde"), list("abdey")
+
+    pairs = analyzer._align_keys(keys1, keys2)
+
+    assert pairs == [(0, 0), (1, 1), (4, 2), (5, 3)]
+
+
+def test_unique_anchors_skip_repeated_keys():
+    keys1, keys2 = list("xaxb"), list("xxab")
+
+    assert analyzer._unique_anchors(keys1, keys2, 0, 4, 0, 4) == [(1, 2), (3, 3)]
+    # 順序が入れ替わったアンカーは、順序を保つ最長の組だけを使う
+    assert analyzer._unique_anchors(list("abcd"), list("cdab"), 0, 4, 0, 4) in ([(0, 2), (1, 3)], [(2, 0), (3, 1)])
+
+
+def test_regions_without_anchors_fall_back_to_lcs_only_when_small(monkeypatch):
+    keys1, keys2 = list("xyxy"), list("yxyx")
+
+    pairs = analyzer._align_keys(keys1, keys2)
+    assert len(pairs) == 3
+    _assert_alignment(keys1, keys2, pairs)
+
+    # 区間が _LCS_TABLE_LIMIT を超える場合は対応付けない（呼び出し側で位置順に比較する）
+    monkeypatch.setattr(analyzer, "_LCS_TABLE_LIMIT", len(keys1) * len(keys2) - 1)
+    assert analyzer._align_keys(keys1, keys2) == []
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_alignment_preserves_order(seed):
+    rng = random.Random(seed)
+    keys1 = [rng.randrange(8) for _ in range(rng.randrange(40))]
+    keys2 = [rng.randrange(8) for _ in range(rng.randrange(40))]
+
+    _assert_alignment(keys1, keys2, analyzer._align_keys(keys1, keys2))
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="the node parser backend requires Node.js")
+def test_all_differences_are_found_after_an_inserted_statement():
+    slow_ast = analyzer.generate_ast("a(); x(); b(); c(1);")
+    fast_ast = analyzer.generate_ast("a(); b(); c(2);")
+
+    differences = analyzer.find_structural_differences(slow_ast, fast_ast)
+
+    assert [path for _, path in differences] == [["body", 1], ["body", 3, "expression", "arguments", 0]]
+    assert differences[0][0]["expression"]["callee"]["name"] == "x"
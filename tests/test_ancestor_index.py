@@ -0,0 +1,65 @@
+# 祖先ノードの索引が、ルートからパスを辿り直す従来の判定と同じ結果を返すことを確認するテスト
+import shutil
+
+import pytest
+
+from mb_search.ast import analyzer
+from mb_search.bench import samples
+from mb_search.pattern import creator
+
+pytestmark = pytest.mark.skipif(shutil.which("node") is None, reason="the node parser backend requires Node.js")
+
+
+def _node_paths(value, path=()):
+    """AST中の全てのノードのパスを列挙する"""
+    if isinstance(value, dict):
+        yield list(path)
+        children = value.items()
+    elif isinstance(value, list):
+        children = enumerate(value)
+    else:
+        return
+    for key, child in children:
+        yield from _node_paths(child, (*path, key))
+
+
+def _walked_types(ast_root: dict, path: list, include_self: bool, include_root: bool) -> list:
+    """パスの接頭辞ごとにルートからノードを取得し直し、種類を深い方から並べる（従来の判定）"""
+    end = len(path) if include_self else len(path) - 1
+    start = 0 if include_root else 1
+    types = []
+    for i in range(end, start - 1, -1):
+        node = analyzer._get_property_by_path(ast_root, path[:i]) if i else ast_root
+        if isinstance(node, dict):
+            types.append(node.get("type"))
+    return types
+
+
+def _asts() -> list:
+    pairs = samples.load_bundled_pairs() + samples.synthetic_pairs(2, 20, nesting=4)
+    return [analyzer.generate_ast(pair["slow"]) for pair in pairs]
+
+
+@pytest.mark.parametrize("include_self, include_root", [(True, True), (True, False), (False, True), (False, False)])
+def test_ancestor_types_match_the_path_walk(include_self, include_root):
+    for ast_root in _asts():
+        index = analyzer.build_ancestor_index(ast_root)
+        for path in _node_paths(ast_root):
+            if not path and not include_self:
+                continue
+            expected = _walked_types(ast_root, path, include_self, include_root)
+
+            assert list(index.ancestor_types(path, include_self, include_root)) == expected
+            assert list(analyzer.build_ancestor_index(ast_root, path).ancestor_types(path, include_self, include_root)) == expected
+
+
+def test_context_predicates_match_the_path_walk():
+    for ast_root in _asts():
+        index = analyzer.build_ancestor_index(ast_root)
+        for path in _node_paths(ast_root):
+            in_loop = bool(path) and any(t in analyzer.LOOP_TYPES for t in _walked_types(ast_root, path, True, False))
+            in_function = any(t in creator.FUNCTION_TYPES for t in _walked_types(ast_root, path, False, True)) if path else False
+
+            assert analyzer._is_in_loop_recursive(ast_root, path, index) == in_loop
+            assert analyzer._is_in_loop_recursive(ast_root, path) == in_loop
+            assert creator._is_in_function(ast_root, path, index) == in_function
@@ -0,0 +1,75 @@
+# asyncio 版パイプラインのワーカーの再起動・キャッシュのキー・ワーカープロセスの計測値の合算を確認するテスト
+import asyncio
+import multiprocessing
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from mb_search import async_pipeline, metrics, path_const
+from mb_search.ast import analyzer, cache
+from mb_search.bench import samples
+
+pytestmark = pytest.mark.skipif(shutil.which("node") is None, reason="the node parser backend requires Node.js")
+
+
+@pytest.fixture
+def collected_metrics():
+    """テストの間だけ計測を有効にし、前後の計測値を捨てる"""
+    metrics.enable()
+    metrics.collect()
+    yield metrics.get_metrics()
+    metrics.collect()
+    metrics.enable(False)
+
+
+def test_worker_restarts_after_the_process_exits(collected_metrics):
+    async def scenario():
+        parser = async_pipeline.AsyncParserWorker()
+        try:
+            first = await parser.parse_many(["var a = 1;"])
+            parser._process.kill()
+            await parser._process.wait()
+            # 同時に送ったリクエストは、1つだけ起動し直したプロセスで解析される
+            rest = await asyncio.gather(*(parser.parse_many([f"var b{i} = {i};"]) for i in range(3)))
+        finally:
+            await parser.close()
+        return first, rest
+
+    first, rest = asyncio.run(scenario())
+
+    assert first[0]["type"] == "Program"
+    assert [asts[0]["body"][0]["declarations"][0]["id"]["name"] for asts in rest] == ["b0", "b1", "b2"]
+    assert collected_metrics.counters["parse.node_startup"] == 2
+
+
+def test_cache_key_follows_locations(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "_cache", cache.ASTCache(tmp_path / "ast_cache.sqlite3"))
+    code = "var x = 1;"
+
+    async def scenario():
+        parser = async_pipeline.AsyncParserWorker()
+        try:
+            return await async_pipeline._parse_with_cache(parser, [code], True, "range")
+        finally:
+            await parser.close()
+
+    (ast,) = asyncio.run(scenario())
+
+    assert "range" in ast
+    assert cache.get_cache().get(code, analyzer._cache_options("range", "node")) == ast
+    assert cache.get_cache().get(code, analyzer._cache_options("none", "node")) is None
+
+
+def test_process_pool_metrics_are_merged(tmp_path, monkeypatch, collected_metrics):
+    for name in ("QUERIES", "PATTERN"):
+        monkeypatch.setattr(path_const, name, tmp_path / name.lower())
+
+    # イベントループのスレッドがある状態で fork しないよう spawn で起動する
+    with ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context("spawn")) as executor:
+        stats = asyncio.run(async_pipeline.run_async(samples.load_bundled_pairs(), concurrency=2, batch_size=4, write_queries=False,
+                                                     use_cache=False, executor=executor))
+
+    assert stats["items"] == 12
+    # パターン生成はワーカープロセスでだけ行われるため、合算されていなければ計測値が残らない
+    assert collected_metrics.timers["pattern"].count == stats["items"] - stats["failed"]
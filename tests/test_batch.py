@@ -0,0 +1,38 @@
+# プロセスプールでの一括処理が、逐次処理と同じ順序・同じ内容のパターンとクエリを生成することを確認するテスト
+import json
+import shutil
+
+import pytest
+
+from mb_search import main, path_const
+from mb_search.ast import cache
+from mb_search.bench import samples
+
+pytestmark = pytest.mark.skipif(shutil.which("node") is None, reason="the node parser backend requires Node.js")
+
+
+def _run(tmp_path, monkeypatch, items, workers):
+    root = tmp_path / f"workers_{workers}"
+    for name in ("QUERIES", "PATTERN"):
+        monkeypatch.setattr(path_const, name, root / name.lower())
+    monkeypatch.setattr(cache, "_cache", cache.ASTCache(tmp_path / "ast_cache.sqlite3"))
+    patterns = main.run_batch(items, workers=workers, pattern_file="batch.json")
+    queries = {path.name: path.read_text(encoding="utf-8") for path in (root / "queries").rglob("*.ql")}
+    with open(root / "pattern" / "batch.json", "r", encoding="utf-8") as f:
+        saved = json.load(f)
+    return patterns, saved, queries
+
+
+def test_parallel_run_matches_sequential_run(tmp_path, monkeypatch):
+    items = samples.load_bundled_pairs()
+    # 構文解析に失敗する実装対も、入力と同じ位置に None として残る
+    items.insert(2, {"id": "broken", "slow": "var = ;", "fast": "var x;"})
+
+    sequential = _run(tmp_path, monkeypatch, items, workers=1)
+    parallel = _run(tmp_path, monkeypatch, items, workers=2)
+
+    patterns, saved, queries = parallel
+    assert parallel == sequential
+    assert len(patterns) == len(items) and patterns[2] is None
+    assert saved == patterns
+    assert 0 < len(queries) <= sum(pattern is not None for pattern in patterns)
@@ -0,0 +1,33 @@
+# ベンチマークの結果と基準値の比較、およびリポジトリで管理する基準値を確認するテスト
+from mb_search.bench import pipeline
+
+
+def _results(**cases) -> dict:
+    return {"cases": cases}
+
+
+def test_compare_reports_stages_slower_than_threshold():
+    baseline = _results(small={"parse": 0.1, "diff": 0.01, "render": 0.001}, large={"parse": 1.0})
+    current = _results(small={"parse": 0.13, "diff": 0.02, "render": 0.01}, large={"parse": 1.1}, new_case={"parse": 9.0})
+
+    regressions = pipeline.compare(current, baseline, threshold=0.2)
+
+    # 基準値が MIN_SECONDS より短い段階と、基準値のないケースは比較しない
+    assert regressions == [
+        {"case": "small", "stage": "parse", "baseline": 0.1, "current": 0.13, "ratio": 1.3},
+        {"case": "small", "stage": "diff", "baseline": 0.01, "current": 0.02, "ratio": 2.0},
+    ]
+    assert pipeline.compare(current, baseline, threshold=1.5) == []
+
+
+def test_tracked_baseline_covers_every_case():
+    baseline = pipeline.load_results(pipeline.BASELINE_PATH)
+
+    assert baseline is not None
+    assert set(baseline["cases"]) == {*pipeline.CASES, pipeline.RENDER_CASE}
+    for name in pipeline.CASES:
+        assert set(pipeline.STAGES) <= set(baseline["cases"][name])
+
+
+def test_missing_baseline_loads_as_none(tmp_path):
+    assert pipeline.load_results(tmp_path / "missing.json") is None
@@ -0,0 +1,57 @@
+# ASTのキャッシュが最後に参照された順に古いものから削除し、パーサーが変わると以前のASTを参照しないことを確認するテスト
+import itertools
+
+import pytest
+
+from mb_search import path_const
+from mb_search.ast import cache
+
+AST = {"type": "Program", "body": [{"type": "EmptyStatement"}] * 20}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """put・get ごとに1秒ずつ進む時刻（参照の順序を確定させる）"""
+    ticks = itertools.count(1)
+    monkeypatch.setattr(cache.time, "time", lambda: float(next(ticks)))
+    monkeypatch.setattr(cache, "_SIZE_CHECK_INTERVAL", 1)
+
+
+def _entry_size(tmp_path) -> int:
+    probe = cache.ASTCache(tmp_path / "probe.sqlite3", version="v")
+    probe.put("probe", AST)
+    size = probe._connection().execute("SELECT size FROM ast_cache").fetchone()[0]
+    probe.close()
+    return size
+
+
+def test_least_recently_used_entries_are_evicted_first(tmp_path, clock):
+    ast_cache = cache.ASTCache(tmp_path / "ast_cache.sqlite3", max_bytes=_entry_size(tmp_path) * 3, version="v")
+    for code in ("a", "b", "c"):
+        ast_cache.put(code, AST)
+    # a を参照すると、最後に参照された時刻の古い順は b, c, a になる
+    assert ast_cache.get("a") == AST
+
+    # 上限を超えると、上限の90%（2件分）以下になるまで b, c の順に削除される
+    ast_cache.put("d", AST)
+
+    assert [code for code in "abcd" if ast_cache.get(code) is not None] == ["a", "d"]
+
+
+def test_entries_of_another_parser_version_or_options_are_not_used(tmp_path):
+    path = tmp_path / "ast_cache.sqlite3"
+    cache.ASTCache(path, version="v1").put("var x;", AST, "loc=none")
+
+    assert cache.ASTCache(path, version="v1").get("var x;", "loc=none") == AST
+    assert cache.ASTCache(path, version="v1").get("var x;", "loc=full") is None
+    assert cache.ASTCache(path, version="v2").get("var x;", "loc=none") is None
+
+
+def test_parser_version_follows_the_parser_script(tmp_path, monkeypatch):
+    monkeypatch.setattr(path_const, "JSCODE", tmp_path)
+    (tmp_path / "ast_parser.js").write_text("// v1\n", encoding="utf-8")
+    first = cache.parser_version()
+    (tmp_path / "ast_parser.js").write_text("// v2\n", encoding="utf-8")
+
+    assert cache.parser_version() != first
+    assert first.startswith("esprima-unknown-")
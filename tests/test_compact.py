@@ -0,0 +1,46 @@
+# 省メモリなAST表現（CompactNode）が、dict・listのASTと同じ内容・同じ差分とパターンになることを確認するテスト
+import pickle
+import shutil
+
+import pytest
+
+from mb_search.ast import analyzer
+from mb_search.ast.compact import CompactNode, compact_ast, to_dict
+from mb_search.bench import samples
+from mb_search.pattern import creator
+
+pytestmark = pytest.mark.skipif(shutil.which("node") is None, reason="the node parser backend requires Node.js")
+
+
+def _pairs() -> list:
+    pairs = samples.load_bundled_pairs() + samples.synthetic_pairs(3, 20, nesting=3)
+    return [(pair, analyzer.generate_ast(pair["slow"]), analyzer.generate_ast(pair["fast"])) for pair in pairs]
+
+
+def test_compact_ast_round_trips_and_shares_keys():
+    ast = analyzer.generate_ast("var r = /ab+c/gi; for (var i = 0; i < n; i++) { a(i); b(i); }", locations="full")
+    compact = compact_ast(ast)
+
+    assert to_dict(compact) == ast
+    assert to_dict(pickle.loads(pickle.dumps(compact))) == ast
+    assert analyzer.generate_ast("var r = /ab+c/gi; for (var i = 0; i < n; i++) { a(i); b(i); }", locations="full", compact=True) == compact
+
+    first, second = compact["body"][1]["body"]["body"]
+    assert isinstance(first, CompactNode) and first._shape is second._shape
+    # "type" を持たない正規表現リテラルの値はdictのまま残す
+    assert isinstance(compact["body"][0]["declarations"][0]["init"]["regex"], dict)
+
+
+def test_compact_asts_give_the_same_differences_and_patterns():
+    for pair, slow_ast, fast_ast in _pairs():
+        compact_slow, compact_fast = compact_ast(slow_ast), compact_ast(fast_ast)
+
+        node, path = analyzer.find_structural_difference(slow_ast, fast_ast)
+        compact_node, compact_path = analyzer.find_structural_difference(compact_slow, compact_fast)
+        assert compact_path == path and to_dict(compact_node) == node
+
+        differences = analyzer.find_structural_differences(slow_ast, fast_ast)
+        compact_differences = analyzer.find_structural_differences(compact_slow, compact_fast)
+        assert [(to_dict(node), path) for node, path in compact_differences] == differences
+
+        assert creator.create_pattern_from_asts(pair["id"], compact_slow, compact_fast) == creator.create_pattern_from_asts(pair["id"], slow_ast, fast_ast)
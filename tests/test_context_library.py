@@ -0,0 +1,60 @@
+# 共有ライブラリ（MBContext.qll）のコンテキスト述語と、それを使うwhere句の生成を確認するテスト
+import os
+import re
+from pathlib import Path
+
+import pytest
+
+from mb_search import main, path_const
+from mb_search.query import generator
+
+LIBRARY_FILE = Path(__file__).resolve().parents[1] / "codeql_queries_js" / f"{generator.CONTEXT_LIBRARY}.qll"
+
+
+def _query(*conditions) -> str:
+    return generator.render_query({
+        "name": "p",
+        "target_node_type": "NewExpression",
+        "conditions": [{"type": "constructor_call", "constructor_name": "String"}, *conditions],
+    })
+
+
+def test_in_conditional_covers_switch_and_conditional_expression():
+    query = _query({"type": "in_conditional"})
+
+    assert "(inConditional(newExpr.getEnclosingStmt()) or inConditionalExpr(newExpr))" in query
+    assert "exists(SwitchStmt switchStmt | switchStmt.getAChildStmt*() = s)" in generator.CONTEXT_LIBRARY_SOURCE
+    assert "predicate inConditionalExpr(Expr e) { exists(ConditionalExpr cond | cond.getAChildExpr+() = e) }" in generator.CONTEXT_LIBRARY_SOURCE
+
+
+def test_tracked_library_matches_generator():
+    assert LIBRARY_FILE.read_text(encoding="utf-8") == generator.CONTEXT_LIBRARY_SOURCE
+
+
+@pytest.mark.parametrize("cond_type", sorted(generator.CONTEXT_CLAUSES))
+def test_context_conditions_use_library_predicates(cond_type):
+    query = _query({"type": cond_type})
+
+    assert f"\nimport {generator.CONTEXT_LIBRARY}\n" in query
+    assert generator.CONTEXT_CLAUSES[cond_type].format("newExpr") in query
+    # 包含関係の判定はライブラリの述語だけで行い、クエリにはインライン展開しない
+    assert "exists(" not in query
+
+
+def test_every_clause_predicate_is_defined_in_the_library():
+    used = {name for clause in generator.CONTEXT_CLAUSES.values() for name in re.findall(r"([a-zA-Z]+)\(\{0?\}", clause)}
+    defined = set(re.findall(r"^(?:predicate|int) (\w+)\(", generator.CONTEXT_LIBRARY_SOURCE, re.MULTILINE))
+
+    assert used == {"inLoop", "loopDepth", "inFunction", "inConditional", "inConditionalExpr"}
+    assert used <= defined
+
+
+def test_save_context_library_writes_only_when_changed(tmp_path, monkeypatch):
+    monkeypatch.setattr(path_const, "QUERIES", tmp_path)
+    path = main.save_context_library()
+    assert open(path, encoding="utf-8").read() == generator.CONTEXT_LIBRARY_SOURCE
+    os.utime(path, ns=(0, 0))
+
+    # 内容が同じ場合は書き直さない
+    assert main.save_context_library() == path
+    assert os.stat(path).st_mtime_ns == 0
@@ -0,0 +1,47 @@
+# パターンのコンテキスト条件が、生成元のノードに対してクエリと同じ判定で成り立つことを確認するテスト
+import shutil
+
+import pytest
+
+from mb_search.ast import analyzer
+from mb_search.pattern import creator, selectivity
+
+pytestmark = pytest.mark.skipif(shutil.which("node") is None, reason="the node parser backend requires Node.js")
+
+LOOP_CONDITIONS = ("in_loop", "in_nested_loop")
+
+# (slowコード, fastコード, パターンに含まれるべきコンテキスト条件, 含まれてはならないコンテキスト条件)
+CASES = [
+    # 内側のループの条件式は内側のループの本体ではないため、ネストの深さは1
+    ("for (var i = 0; i < n; i++) { for (var j = 0; j < arr.length; j++) { s += arr[j]; } }",
+     "for (var i = 0; i < n; i++) { for (var j = 0, l = arr.length; j < l; j++) { s += arr[j]; } }",
+     {"in_loop"}, {"in_nested_loop"}),
+    ("for (var i = 0; i < n; i++) { for (var j = 0; j < m; j++) { var s = new String(x); } }",
+     "for (var i = 0; i < n; i++) { for (var j = 0; j < m; j++) { var s = x; } }",
+     {"in_loop", "in_nested_loop"}, set()),
+    # 関数の本体では外側のループを数えない
+    ("for (var i = 0; i < n; i++) { xs.forEach(function (x) { for (var j = 0; j < m; j++) { var s = new String(x); } }); }",
+     "for (var i = 0; i < n; i++) { xs.forEach(function (x) { for (var j = 0; j < m; j++) { var s = x; } }); }",
+     {"in_loop", "in_function"}, {"in_nested_loop"}),
+    ("while (a) { do { xs.forEach(x => s.push(new String(x))); } while (b); }",
+     "while (a) { do { xs.forEach(x => s.push(x)); } while (b); }",
+     {"in_loop", "in_nested_loop"}, set()),
+]
+
+
+@pytest.mark.parametrize("slow, fast, expected, unexpected", CASES)
+def test_context_conditions_hold_for_the_source_node(slow, fast, expected, unexpected):
+    slow_ast, fast_ast = analyzer.generate_ast(slow), analyzer.generate_ast(fast)
+    diff_node, _ = analyzer.find_structural_difference(slow_ast, fast_ast)
+    pattern = creator.create_pattern_from_asts(1, slow_ast, fast_ast)
+
+    cond_types = {cond["type"] for cond in pattern["conditions"]}
+    assert expected <= cond_types
+    assert not unexpected & cond_types
+
+    # 生成元のノードが、コーパスの見積もり（クエリの述語と同じ判定）でもループの条件に一致する
+    profile = selectivity.CorpusProfile([slow_ast])
+    (site,) = [site for site in profile.sites[diff_node["type"]] if site[0] is diff_node]
+    for cond in pattern["conditions"]:
+        if cond["type"] in LOOP_CONDITIONS:
+            assert selectivity._MATCHERS[cond["type"]](cond, site), cond
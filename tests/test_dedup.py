@@ -0,0 +1,78 @@
+# 同じクエリになるパターンが同じキーにまとめられ、異なるクエリになるパターンはまとめられないことを確認するテスト
+import pytest
+
+from mb_search.pattern import dedup
+from mb_search.query import generator, manifest
+
+_LOOP = {"type": "in_loop", "check": "is_in_loop"}
+
+
+def _method(node_type: str, object_name, extra=()) -> dict:
+    condition = {"type": "method_call", "method_name": "push", "path": ["callee"]}
+    if object_name is not ...:
+        condition["object_name"] = object_name
+    return {"name": "p", "target_node_type": node_type, "conditions": [condition, *extra]}
+
+
+# 同じ組のパターンは同じクエリになり、異なる組のパターンは異なるクエリになる
+EQUIVALENCE_CLASSES = [
+    [
+        _method("CallExpression", None),
+        _method("CallExpression", ""),
+        _method("CallExpression", ...),
+        _method("CallExpression", "VAR_1"),
+        _method("AssignmentExpression", None),
+        _method("AssignmentExpression", "VAR_2", [{"type": "identifier_name", "name": "x"}]),
+    ],
+    [
+        _method("CallExpression", "arr"),
+        _method("AssignmentExpression", "arr"),
+    ],
+    [
+        _method("CallExpression", "", [_LOOP]),
+        {**_method("AssignmentExpression", None, [dict(_LOOP, check="loop_depth")]), "name": "q"},
+    ],
+    [
+        {"name": "p", "target_node_type": "Identifier", "conditions": [{"type": "identifier_name", "name": "VAR_1"}, _LOOP]},
+        {"name": "p", "target_node_type": "Identifier", "conditions": [_LOOP, {"type": "identifier_name", "name": "VAR_7"}]},
+    ],
+    [
+        {"name": "p", "target_node_type": "Identifier", "conditions": [{"type": "identifier_name", "name": "arr"}, _LOOP]},
+    ],
+]
+
+
+@pytest.mark.parametrize("patterns", EQUIVALENCE_CLASSES)
+def test_equivalent_patterns_share_key_and_query(patterns):
+    keys = {dedup.canonical_key(pattern) for pattern in patterns}
+    queries = {generator.render_query(dict(pattern, name="p")) for pattern in patterns}
+
+    assert len(keys) == 1
+    assert len(queries) == 1 and None not in queries
+
+
+def test_different_classes_have_different_keys():
+    keys = [dedup.canonical_key(patterns[0]) for patterns in EQUIVALENCE_CLASSES]
+    queries = [generator.render_query(dict(patterns[0], name="p")) for patterns in EQUIVALENCE_CLASSES]
+
+    assert len(set(keys)) == len(keys)
+    assert len(set(queries)) == len(queries)
+
+
+def test_index_merges_equivalent_patterns():
+    index = dedup.PatternIndex()
+    for i, pattern in enumerate(EQUIVALENCE_CLASSES[0]):
+        index.add(dict(pattern, name=f"pattern_{i}"), source_id=i)
+
+    (distinct,) = index.distinct_patterns()
+    assert distinct["name"] == "pattern_0"
+    assert distinct["source_ids"] == list(range(len(EQUIVALENCE_CLASSES[0])))
+
+
+def test_manifest_hash_ignores_source_ids():
+    pattern = dict(_method("CallExpression", "arr"), source_ids=[1])
+    combined = {"name": "combined", "patterns": [pattern]}
+    version = manifest.generator_version()
+
+    assert manifest.pattern_hash(pattern, version) == manifest.pattern_hash(dict(pattern, source_ids=[1, 2]), version)
+    assert manifest.pattern_hash(combined, version) == manifest.pattern_hash({"name": "combined", "patterns": [dict(pattern, source_ids=[3])]}, version)
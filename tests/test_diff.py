@@ -0,0 +1,43 @@
+# 構造ハッシュを使った差分の検出が、ハッシュを使わない比較と同じ差分を見つけることを確認するテスト
+import shutil
+
+import pytest
+
+from mb_search.ast import analyzer
+from mb_search.bench import samples
+
+pytestmark = pytest.mark.skipif(shutil.which("node") is None, reason="the node parser backend requires Node.js")
+
+
+def _pairs() -> list:
+    pairs = samples.load_bundled_pairs() + samples.synthetic_pairs(5, 30, nesting=3)
+    return [(analyzer.generate_ast(pair["slow"]), analyzer.generate_ast(pair["fast"])) for pair in pairs]
+
+
+def test_hashed_difference_matches_plain_comparison():
+    for slow_ast, fast_ast in _pairs():
+        plain_node, plain_path = analyzer.find_structural_difference(slow_ast, fast_ast)
+        hashed_node, hashed_path = analyzer.find_structural_difference(
+            slow_ast, fast_ast, analyzer.compute_structural_hashes(slow_ast), analyzer.compute_structural_hashes(fast_ast))
+
+        assert hashed_node is plain_node
+        assert hashed_path == plain_path
+
+
+def test_hashes_ignore_locations_and_key_order():
+    code = "for (var i = 0; i < n; i++) { s.push(new String(i)); }"
+    plain = analyzer.generate_ast(code, locations="none")
+    located = analyzer.generate_ast(code, locations="full")
+    reordered = dict(reversed(list(plain.items())))
+
+    root_hash = lambda ast: analyzer.compute_structural_hashes(ast)[id(ast)]
+    assert root_hash(plain) == root_hash(located) == root_hash(reordered)
+    assert analyzer.find_structural_difference(plain, located, analyzer.compute_structural_hashes(plain), analyzer.compute_structural_hashes(located)) == (None, [])
+
+
+def test_hashes_distinguish_primitive_types():
+    hashes = {}
+    values = [{"value": 1}, {"value": 1.0}, {"value": True}, {"value": "1"}]
+    digests = [analyzer._structural_hash(value, hashes) for value in values]
+
+    assert len(set(digests)) == len(values)
@@ -0,0 +1,69 @@
+# ASTの生成（1件ずつ・一括）が並行して呼び出しても干渉しないこと、位置情報の形式と解析エラーをスニペットごとに扱うことを確認するテスト
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from mb_search.ast import analyzer, cache, worker
+
+pytestmark = pytest.mark.skipif(shutil.which("node") is None, reason="the node parser backend requires Node.js")
+
+SNIPPETS = [f"var v{i} = {i};" for i in range(16)]
+
+
+def _name(ast: dict) -> str:
+    return ast["body"][0]["declarations"][0]["id"]["name"]
+
+
+@pytest.mark.parametrize("use_worker", [False, True])
+def test_concurrent_generate_ast_returns_each_snippets_ast(tmp_path, monkeypatch, use_worker):
+    monkeypatch.chdir(tmp_path)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        asts = list(executor.map(lambda code: analyzer.generate_ast(code, use_worker=use_worker, use_cache=False), SNIPPETS))
+
+    assert [_name(ast) for ast in asts] == [f"v{i}" for i in range(len(SNIPPETS))]
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize("use_worker", [False, True])
+def test_locations_are_emitted_only_when_requested(use_worker):
+    code = "a();"
+    parse = lambda locations: analyzer.generate_ast(code, use_worker=use_worker, use_cache=False, locations=locations)
+
+    assert "loc" not in parse("none") and "range" not in parse("none")
+    assert "range" in parse("range")["body"][0] and "loc" not in parse("range")
+    assert parse("full")["body"][0]["loc"]["start"] == {"line": 1, "column": 0}
+
+
+def test_unknown_locations_are_rejected():
+    with pytest.raises(ValueError):
+        analyzer.generate_ast("a();", locations="lines")
+    with pytest.raises(ValueError):
+        analyzer.generate_asts(["a();"], locations="lines")
+
+
+@pytest.mark.parametrize("use_worker", [False, True])
+def test_batch_returns_errors_per_snippet(use_worker):
+    codes = ["var a = 1;", "var = ;", "var b = 2;"]
+
+    asts = analyzer.generate_asts(codes, use_worker=use_worker, use_cache=False)
+
+    assert _name(asts[0]) == "a" and _name(asts[2]) == "b"
+    assert isinstance(asts[1], analyzer.ASTParseError)
+    assert "Unexpected token" in asts[1].stderr
+
+
+def test_batch_caches_only_parsed_snippets(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "_cache", cache.ASTCache(tmp_path / "ast_cache.sqlite3"))
+    codes = ["var a = 1;", "var = ;"]
+
+    first = analyzer.generate_asts(codes)
+    options = analyzer._cache_options(worker.DEFAULT_LOCATIONS, "node")
+
+    assert cache.get_cache().get(codes[0], options) == first[0]
+    assert cache.get_cache().get(codes[1], options) is None
+    # 2回目はキャッシュにあるASTを使い、解析に失敗したスニペットだけを解析し直す
+    second = analyzer.generate_asts(codes)
+    assert second[0] == first[0] and isinstance(second[1], analyzer.ASTParseError)
@@ -0,0 +1,63 @@
+# パターンからのクエリ生成で、既定のパターン名・説明、コンテキスト条件のwhere句、対象クラスごとにまとめたクエリを確認するテスト
+from mb_search.query import generator
+
+_METHOD_CALL = {"type": "method_call", "method_name": "concat", "object_name": "VAR_1"}
+
+
+def test_method_call_pattern_uses_method_call_defaults():
+    for node_type in ("CallExpression", "AssignmentExpression"):
+        query = generator.render_query({"target_node_type": node_type, "conditions": [_METHOD_CALL]})
+
+        assert "@name MethodCallPattern\n" in query
+        assert "@description Method call pattern detected.\n" in query
+        assert 'select callExpr, "Method call pattern detected."' in query
+
+
+def test_other_patterns_use_generic_defaults():
+    query = generator.render_query({"target_node_type": "NewExpression", "conditions": [{"type": "constructor_call", "constructor_name": "String"}]})
+
+    assert "@name CustomGeneratedPattern\n" in query
+    assert "@description No description provided.\n" in query
+
+
+def test_context_conditions_use_library_predicates():
+    conditions = [_METHOD_CALL, *({"type": cond_type} for cond_type in generator.CONTEXT_CLAUSES)]
+    query = generator.render_query({"name": "p", "target_node_type": "CallExpression", "conditions": conditions})
+
+    for clause in generator.CONTEXT_CLAUSES.values():
+        assert clause.format("callExpr") in query
+
+
+_COMBINED_PATTERNS = [
+    {"name": "a", "target_node_type": "CallExpression", "conditions": [_METHOD_CALL]},
+    {"name": "b", "target_node_type": "AssignmentExpression", "conditions": [{"type": "method_call", "method_name": "push"}]},
+    {"name": "c", "target_node_type": "NewExpression", "conditions": [{"type": "constructor_call", "constructor_name": "String"}, {"type": "in_loop"}]},
+    {"name": "d", "target_node_type": "ForStatement", "conditions": []},
+    None,
+]
+
+
+def test_patterns_are_grouped_by_ql_class():
+    groups = generator.group_patterns_by_ql_class(_COMBINED_PATTERNS)
+
+    # メソッド呼び出しのパターンは代入式でも CallExpr を対象にし、変換できないパターンは含めない
+    assert {ql_class: [pattern["name"] for pattern in patterns] for ql_class, patterns in groups.items()} == {"CallExpr": ["a", "b"], "NewExpr": ["c"]}
+
+
+def test_combined_query_ors_the_where_clauses_of_each_pattern():
+    queries = generator.generate_combined_queries(_COMBINED_PATTERNS)
+
+    assert set(queries) == {"MB_combined_CallExpr", "MB_combined_NewExpr"}
+    query = queries["MB_combined_CallExpr"]
+    assert query.count("\nfrom CallExpr callExpr, string msg\n") == 1
+    assert "@description Detects 2 MB-derived performance patterns on CallExpr" in query
+    for pattern in _COMBINED_PATTERNS[:2]:
+        _, _, where_clauses = generator._query_parts(pattern)
+        assert where_clauses.replace("\n  ", "\n    ") + ' and\n    msg = "Method call pattern detected. (' + pattern["name"] + ')"' in query
+    assert "\n  )\n  or\n  (\n" in query
+    assert query.endswith("select callExpr, msg\n")
+    assert generator.CONTEXT_CLAUSES["in_loop"].format("newExpr") in queries["MB_combined_NewExpr"]
+
+
+def test_combined_query_ignores_patterns_of_other_classes():
+    assert generator.generate_combined_query("NewExpr", _COMBINED_PATTERNS[:2]) is None
@@ -0,0 +1,61 @@
+# ログ出力の設定（静かなモードの絞り込み・終了時の書き出し）を確認するテスト
+import io
+import json
+import logging
+import logging.handlers
+
+from mb_search import logs
+from mb_search.runner import suite
+
+
+def test_quiet_mode_keeps_warnings_errors_and_progress():
+    stream = io.StringIO()
+    logs.configure("DEBUG", quiet=True, stream=stream)
+    try:
+        logger = logs.get_logger("test")
+        logger.info("info message")
+        logger.warning("warning message")
+        logger.error("error message")
+        logs.Progress(total=1, label="テスト").finish()
+    finally:
+        logs.shutdown()
+
+    output = stream.getvalue()
+    assert "info message" not in output
+    assert "warning message" in output
+    assert "error message" in output
+    assert "テスト: 0/1件" in output
+
+
+def test_shutdown_flushes_and_is_idempotent():
+    stream = io.StringIO()
+    logs.configure("INFO", stream=stream)
+    logs.get_logger("test").info("queued message")
+    logs.shutdown()
+    logs.shutdown()
+
+    assert stream.getvalue() == "queued message\n"
+
+
+def test_shutdown_removes_queue_handler_and_restores_propagation():
+    logs.configure("INFO", stream=io.StringIO())
+    logs.shutdown()
+
+    logger = logging.getLogger(logs.ROOT_LOGGER)
+    assert not any(isinstance(handler, logging.handlers.QueueHandler) for handler in logger.handlers)
+    assert logger.propagate
+
+
+def test_runner_tables_are_logged():
+    stream = io.StringIO()
+    logs.configure("INFO", fmt=logs.FORMAT_JSON, stream=stream)
+    try:
+        records = [{"query": "a.ql", "status": suite.STATUS_OK, "seconds": 1.5, "results": 3}]
+        suite.print_slowest(records)
+    finally:
+        logs.shutdown()
+
+    (entry,) = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert entry["event"] == "slowest_queries"
+    assert entry["queries"][0]["query"] == "a.ql"
+    assert "a.ql" in entry["message"]
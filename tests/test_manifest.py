@@ -0,0 +1,72 @@
+# クエリのマニフェストが変更のないクエリの再生成を省き、現在のパターンにないクエリを削除することを確認するテスト
+import shutil
+
+import pytest
+
+from mb_search import main, path_const
+from mb_search.ast import cache
+from mb_search.bench import samples
+from mb_search.query import manifest
+
+PATTERN = {"name": "pattern_1", "target_node_type": "NewExpression", "conditions": [{"type": "constructor_call", "constructor_name": "String"}]}
+
+
+@pytest.fixture(autouse=True)
+def isolated_paths(tmp_path, monkeypatch):
+    for name in ("QUERIES", "PATTERN"):
+        monkeypatch.setattr(path_const, name, tmp_path / name.lower())
+    monkeypatch.setattr(cache, "_cache", cache.ASTCache(tmp_path / "ast_cache.sqlite3"))
+
+
+def _written(query_manifest: manifest.QueryManifest, pattern: dict) -> None:
+    """クエリファイルを書き出したことにしてマニフェストに記録する"""
+    query_manifest.folder.mkdir(parents=True, exist_ok=True)
+    (query_manifest.folder / manifest.query_filename(pattern)).write_text("select 1", encoding="utf-8")
+    query_manifest.update(pattern)
+
+
+def test_is_current_until_the_pattern_generator_or_file_changes(monkeypatch):
+    query_manifest = manifest.QueryManifest("MBQL")
+    assert not query_manifest.is_current(PATTERN)
+    _written(query_manifest, PATTERN)
+    query_manifest.save()
+
+    reloaded = manifest.QueryManifest("MBQL")
+    assert reloaded.is_current(PATTERN)
+    assert reloaded.is_current(dict(PATTERN, source_ids=[1, 2]))
+    assert not reloaded.is_current(dict(PATTERN, target_node_type="CallExpression"))
+
+    monkeypatch.setattr(manifest, "generator_version", lambda: "changed")
+    assert not manifest.QueryManifest("MBQL").is_current(PATTERN)
+    monkeypatch.undo()
+
+    (reloaded.folder / manifest.query_filename(PATTERN)).unlink()
+    assert not reloaded.is_current(PATTERN)
+
+
+def test_prune_removes_queries_of_inactive_patterns():
+    query_manifest = manifest.QueryManifest("MBQL")
+    stale = dict(PATTERN, name="pattern_2")
+    _written(query_manifest, PATTERN)
+    _written(query_manifest, stale)
+
+    deleted = query_manifest.prune([PATTERN["name"]])
+
+    assert deleted == [query_manifest.folder / "pattern_2.ql"]
+    assert not deleted[0].exists()
+    assert list(query_manifest.entries) == [PATTERN["name"]]
+    assert (query_manifest.folder / "pattern_1.ql").exists()
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="the node parser backend requires Node.js")
+def test_rerun_skips_unchanged_queries_and_prunes_removed_pairs():
+    items = samples.load_bundled_pairs()
+
+    first = main.run_stream(items, workers=1)["queries"]
+    second = main.run_stream(items, workers=1)["queries"]
+    third = main.run_stream(items[:2], workers=1)["queries"]
+
+    assert first["written"] > 0 and first["skipped"] == 0
+    assert second == {"written": 0, "skipped": first["written"], "deleted": 0, "failed": first["failed"]}
+    assert third["written"] == 0 and third["deleted"] == first["written"] - third["skipped"]
+    assert len(list((path_const.QUERIES / "MBQL").glob("*.ql"))) == third["skipped"]
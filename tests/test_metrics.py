@@ -0,0 +1,88 @@
+# 計測値の記録・分位点の見積もり・プロセス間での合算・レポートの保存を確認するテスト
+import csv
+import json
+
+import pytest
+
+from mb_search import metrics, path_const
+
+
+@pytest.fixture
+def collected_metrics():
+    """テストの間だけ計測を有効にし、前後の計測値を捨てる"""
+    metrics.enable()
+    metrics.collect()
+    yield metrics.get_metrics()
+    metrics.collect()
+    metrics.enable(False)
+
+
+def test_nothing_is_recorded_while_disabled():
+    metrics.collect()
+    with metrics.timer("stage"):
+        metrics.count("items")
+        metrics.observe("nodes", 3)
+
+    assert metrics.collect() == {"timers": {}, "counters": {}, "histograms": {}}
+
+
+def test_quantiles_are_within_a_bucket():
+    histogram = metrics.Histogram()
+    for value in range(1, 1001):
+        histogram.observe(float(value))
+
+    # バケットの上限値を返すため、真の値以上で約9%を超えない
+    for q, exact in ((0.5, 500), (0.95, 950)):
+        assert exact <= histogram.quantile(q) <= exact * 2 ** (1 / metrics._BUCKETS_PER_OCTAVE)
+    assert histogram.quantile(1.0) == 1000
+    assert metrics.Histogram().quantile(0.5) is None
+
+    zeros = metrics.Histogram()
+    zeros.observe(0.0)
+    assert zeros.quantile(0.5) == 0.0
+
+
+def test_snapshots_merge_like_a_single_process():
+    whole, first, second = metrics.Metrics(), metrics.Metrics(), metrics.Metrics()
+    for i, value in enumerate([0.0, 0.5, 1.5, 2.0, 8.0, 0.25]):
+        for target in (whole, first if i % 2 else second):
+            target.observe("nodes", value)
+            target.count("items")
+
+    merged = metrics.Metrics()
+    for part in (first, second):
+        # ワーカープロセスからはJSONに変換できる形式で受け渡す
+        merged.merge(json.loads(json.dumps(part.snapshot())))
+
+    assert merged.rows() == whole.rows()
+
+
+def test_call_collecting_returns_the_metrics_of_the_call(collected_metrics):
+    metrics.count("before")
+
+    def work(n):
+        with metrics.timer("work"):
+            metrics.count("items", n)
+        return n * 2
+
+    result, snapshot = metrics.call_collecting(work, 3)
+
+    assert result == 6
+    assert snapshot["counters"] == {"before": 1, "items": 3}
+    assert snapshot["timers"]["work"]["count"] == 1
+    assert metrics.get_metrics().counters == {}
+
+
+def test_write_report_saves_json_and_csv(tmp_path, monkeypatch):
+    monkeypatch.setattr(path_const, "RESULTS", tmp_path)
+    recorded = metrics.Metrics()
+    with recorded.timer("parse"):
+        pass
+    recorded.count("parse.cache_hit", 2)
+
+    json_path, csv_path = metrics.write_report("run", recorded)
+
+    rows = json.loads(json_path.read_text(encoding="utf-8"))
+    assert [(row["kind"], row["name"], row["count"]) for row in rows] == [("timer", "parse", 1), ("counter", "parse.cache_hit", 2)]
+    with open(csv_path, encoding="utf-8", newline="") as f:
+        assert [row["name"] for row in csv.DictReader(f)] == ["parse", "parse.cache_hit"]
@@ -0,0 +1,46 @@
+# Python版 esprima のバックエンドが ast_parser.js（Node.js）と同じASTを生成することを確認するテスト
+import shutil
+
+import pytest
+
+from mb_search.ast import backends, conformance
+from mb_search.bench import samples
+
+pytest.importorskip("esprima", reason="the python parser backend requires the python-parser extra")
+pytestmark = pytest.mark.skipif(shutil.which("node") is None, reason="the node parser backend requires Node.js")
+
+# Python版で属性名・null のフィールドの扱いが異なる構文
+SNIPPETS = [
+    "if (a) { b(); }",
+    "var x; var y = 1;",
+    "(function () {})();",
+    "var f = () => 1; var g = async () => { await f(); };",
+    "async function h() { return await g(); }",
+    "function* gen() { yield 1; }",
+    "var r = /ab+c/gi; var t = `a${b}c`;",
+    "var n = 1.5e3 + 0x10 + 2;",
+    "label: for (;;) { break label; }",
+    "try { a(); } catch (e) {} finally { b(); }",
+    "class A extends B { constructor() { super(); } get x() { return 1; } }",
+    "var { a, b: [c] } = obj; var [d, ...e] = arr;",
+    "switch (x) { case 1: break; default: }",
+    "new String('a'); a.b.c(d, ...e);",
+]
+
+
+def _codes() -> list:
+    pairs = samples.load_bundled_pairs() + samples.synthetic_pairs(5, 50, nesting=3)
+    return SNIPPETS + [code for pair in pairs for code in (pair["slow"], pair["fast"])]
+
+
+@pytest.mark.parametrize("locations", ["none", "range", "full"])
+def test_python_backend_matches_node(locations):
+    result = conformance.compare(_codes(), reference="node", candidate="python", locations=locations)
+
+    assert result["examples"] == []
+    assert result["equal"] == result["snippets"]
+
+
+def test_python_backend_reports_parse_errors():
+    with pytest.raises(backends.ASTParseError):
+        backends.get_backend("python").parse("var = ;")
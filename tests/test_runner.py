@@ -0,0 +1,126 @@
+# スタブの codeql CLI を使い、スイートの評価からコストのレポート作成までを通して確認するテスト
+import json
+from pathlib import Path
+
+import pytest
+
+from mb_search import path_const
+from mb_search.runner import profile, suite
+
+STUB = Path(__file__).with_name("stubs") / "codeql"
+
+QUERIES = {
+    "pattern_1_string_constructor_in_loop.ql": "// stub: results=3\n// stub: sleep=0.2\nimport javascript\n",
+    "pattern_2_push_method.ql": "// stub: results=0\nimport javascript\n",
+    "pattern_3_broken.ql": "// stub: fail\nimport javascript\n",
+}
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    """クエリ・リポジトリ・データベース・結果の保存先を一時ディレクトリに置き換える"""
+    for name in ("QUERIES", "RESULTS", "CODEQL_DB", "PATTERN"):
+        monkeypatch.setattr(path_const, name, tmp_path / name.lower())
+    monkeypatch.setenv("CODEQL_STUB_LOG", str(tmp_path / "codeql.log"))
+
+    query_dir = path_const.QUERIES / "MBQL"
+    query_dir.mkdir(parents=True)
+    for name, text in QUERIES.items():
+        (query_dir / name).write_text(text, encoding="utf-8")
+
+    repo_root = tmp_path / "repository"
+    for name in ("alpha", "beta", "broken"):
+        (repo_root / name).mkdir(parents=True)
+        (repo_root / name / "index.js").write_text("var s = new String('a');\n", encoding="utf-8")
+    (repo_root / "broken" / "FAIL_DATABASE").touch()
+    return tmp_path
+
+
+def _stub_calls(workspace: Path, command: list) -> int:
+    log = workspace / "codeql.log"
+    return sum(json.loads(line)[:2] == command for line in log.read_text(encoding="utf-8").splitlines())
+
+
+def test_run_suite_records_timings_results_and_failures(workspace):
+    repositories = suite.find_repositories(workspace / "repository")
+    records = suite.run_suite("MBQL", repositories, jobs=2, executable=str(STUB), profile=True)
+
+    # broken はデータベースの作成に失敗し、リポジトリ単位の失敗として1件だけ記録される
+    broken = [record for record in records if record["repository"] == "broken"]
+    assert len(broken) == 1
+    assert broken[0]["query"] is None and broken[0]["status"] == suite.STATUS_FAILED
+
+    by_key = {(record["repository"], record["query"]): record for record in records if record["query"]}
+    assert len(by_key) == 6
+    for repository in ("alpha", "beta"):
+        slow = by_key[(repository, "pattern_1_string_constructor_in_loop.ql")]
+        assert slow["status"] == suite.STATUS_OK
+        assert slow["results"] == 3
+        assert slow["seconds"] >= 0.2
+        assert slow["evaluator_ms"] == 10 + 3 + 40 + 5
+        assert slow["predicates"][0] == ["MBContext::inLoop#f", 40]
+        assert by_key[(repository, "pattern_2_push_method.ql")]["results"] == 0
+        failed = by_key[(repository, "pattern_3_broken.ql")]
+        assert failed["status"] == suite.STATUS_FAILED
+        assert "could not resolve module" in failed["error"]
+
+    # 記録はJSON Lines形式で保存される
+    assert sorted(map(json.dumps, suite.load_records(suite.results_path("MBQL")))) == sorted(map(json.dumps, records))
+
+    # 2回目の評価では作成済みのデータベースを再利用する
+    assert _stub_calls(workspace, ["database", "create"]) == 3
+    suite.run_suite("MBQL", repositories, executable=str(STUB))
+    assert _stub_calls(workspace, ["database", "create"]) == 4  # 作成に失敗した broken だけを作り直す
+
+
+def test_profile_report_ranks_queries_by_cost(workspace):
+    records = suite.run_suite("MBQL", suite.find_repositories(workspace / "repository"), executable=str(STUB), profile=True)
+
+    path_const.PATTERN.mkdir()
+    pattern = {"name": "pattern_1_String_constructor_in_loop", "target_node_type": "NewExpression",
+               "conditions": [{"type": "constructor_call", "constructor_name": "String"}, {"type": "in_loop", "check": "is_in_loop"}]}
+    (path_const.PATTERN / "MB_patterns.jsonl").write_text(json.dumps(pattern) + "\n", encoding="utf-8")
+
+    patterns = profile.load_pattern_metadata(["MB_patterns.jsonl", "missing.json"])
+    rows = profile.build_report(records, patterns, hits={"pattern_1_string_constructor_in_loop.ql": 2})
+
+    assert [row["query"] for row in rows][0] == "pattern_1_string_constructor_in_loop.ql"
+    top = rows[0]
+    assert top["rank"] == 1
+    assert top["pattern"] == pattern["name"]
+    assert top["conditions"] == "constructor_call,in_loop"
+    assert top["results"] == 6 and top["hits"] == 2 and top["repositories"] == 2
+    assert top["seconds_per_hit"] == pytest.approx(top["seconds"] / 2, rel=1e-3)
+    assert top["top_predicate"] == "MBContext::inLoop#f"
+
+    by_query = {row["query"]: row for row in rows}
+    assert by_query["pattern_2_push_method.ql"]["seconds_per_hit"] is None
+    assert by_query["pattern_3_broken.ql"]["failed"] == 2
+
+    json_path, csv_path = profile.write_report(rows, "MBQL")
+    assert json.loads(json_path.read_text(encoding="utf-8")) == rows
+    assert csv_path.read_text(encoding="utf-8").splitlines()[0] == ",".join(profile.REPORT_FIELDS)
+
+
+def test_report_sums_repositories_and_ranks_by_total_seconds():
+    def record(repository, query, seconds, results, predicates=(), status=suite.STATUS_OK):
+        return {"repository": repository, "query": query, "status": status, "seconds": seconds, "results": results,
+                "evaluator_ms": int(seconds * 1000), "predicates": [list(predicate) for predicate in predicates]}
+
+    records = [
+        record("alpha", "a.ql", 1.0, 4, [("p", 30), ("q", 20)]),
+        record("beta", "a.ql", 1.0, 0, [("q", 20)]),
+        record("alpha", "b.ql", 3.0, 1, [("r", 5)]),
+        record("beta", "b.ql", 0.0, 0, status=suite.STATUS_FAILED),
+        record("gamma", None, 0.0, 0, status=suite.STATUS_FAILED),
+    ]
+
+    rows = profile.build_report(records, hits={"a.ql": 8})
+
+    assert [(row["rank"], row["query"]) for row in rows] == [(1, "b.ql"), (2, "a.ql")]
+    b, a = rows
+    assert (b["seconds"], b["repositories"], b["failed"], b["seconds_per_hit"]) == (3.0, 1, 1, 3.0)
+    assert (a["seconds"], a["results"], a["hits"], a["seconds_per_hit"]) == (2.0, 4, 8, 0.25)
+    # 述語の評価時間は全てのリポジトリで合計してから最も長いものを選ぶ
+    assert a["top_predicate"] == "q" and b["top_predicate"] == "r"
+    assert a["pattern"] is None and a["conditions"] == ""
@@ -0,0 +1,59 @@
+# 検出範囲の見積もりが、生成したクエリのコンテキスト述語（MBContext.qll）と同じ判定をすることを確認するテスト
+import shutil
+
+import pytest
+
+from mb_search.ast import analyzer
+from mb_search.pattern import selectivity
+
+pytestmark = pytest.mark.skipif(shutil.which("node") is None, reason="the node parser backend requires Node.js")
+
+
+def _contexts(code: str, node_type: str) -> dict:
+    """コード中の node_type のノードについて、呼び出し先の名前ごとのコンテキストを求める"""
+    profile = selectivity.CorpusProfile([analyzer.generate_ast(code)])
+    return {site[0]["callee"]["name"]: site[2:] for site in profile.sites[node_type] if site[0]["callee"]["type"] == "Identifier"}
+
+
+def test_loop_and_function_do_not_cross_function_bodies():
+    contexts = _contexts(
+        "for (;;) { a(); function f() { b(); for (;;) { c(); } } xs.map(function () { d(); }); xs.map(x => e(x)); }",
+        "CallExpression",
+    )
+
+    assert contexts["a"] == (1, False, False)
+    assert contexts["b"] == (0, True, False)
+    assert contexts["c"] == (1, True, False)
+    assert contexts["d"] == (0, True, False)
+    # 本体が式のアロー関数は外側の文のコンテキストになる
+    assert contexts["e"] == (1, False, False)
+
+
+def test_loop_test_is_not_in_loop():
+    contexts = _contexts("while (a()) { for (b(); c(); d()) { e(); } }", "CallExpression")
+
+    assert contexts["a"] == (0, False, False)
+    assert contexts["b"] == contexts["c"] == contexts["d"] == (1, False, False)
+    assert contexts["e"] == (2, False, False)
+
+
+def test_conditionals_include_tests_switch_and_conditional_expression():
+    contexts = _contexts(
+        "if (a()) { b(); } switch (c()) { case 1: d(); } var x = e() ? f() : 0; g(); if (y) { (function () { h(); })(); }",
+        "CallExpression",
+    )
+
+    assert all(contexts[name][2] for name in "abcdef")
+    assert contexts["g"] == (0, False, False)
+    assert contexts["h"] == (0, True, False)
+
+
+def test_guard_drops_parent_node_type():
+    profile = selectivity.CorpusProfile([analyzer.generate_ast("a(); b(); c();")])
+    pattern = {"name": "p", "target_node_type": "CallExpression", "parent_node_type": "ExpressionStatement",
+               "conditions": [{"type": "function_call", "function_name": "a"}]}
+
+    checked, verdict, _ = selectivity.SelectivityGuard(profile, max_rate=1.0).check(pattern)
+
+    assert verdict == selectivity.VERDICT_OK
+    assert "parent_node_type" not in checked
@@ -0,0 +1,29 @@
+# JSON配列形式のMBデータセットを、読み込みの区切りをまたぐ要素も含めて正しくデコードすることを確認するテスト
+import io
+import json
+
+import pytest
+
+from mb_search import stream
+
+ITEMS = [12345, -0.5e10, "abc", True, None, {"id": 1, "slow": "a;", "fast": "b;"}, [1, [2, 3]], 678]
+
+
+def test_elements_split_at_every_offset(monkeypatch):
+    monkeypatch.setattr(stream, "_READ_SIZE", 3)
+    text = json.dumps(ITEMS)
+    # 読み込みの区切りが全ての位置に来るよう、先頭の空白で位置をずらす
+    for shift in range(stream._READ_SIZE):
+        assert list(stream._iter_json_array(io.StringIO(" " * shift + text))) == ITEMS
+
+
+@pytest.mark.parametrize("tail", ["12345", "-1.25e3", "true", '"xyz"'])
+def test_scalar_across_the_64k_boundary(tail):
+    # 最初の読み込み（64 KiB）がスカラー値の途中で終わるようにする
+    head = '["' + "x" * (stream._READ_SIZE - 5 - 2) + '", '
+    text = head + tail + "]"
+    assert len(head) + 2 == stream._READ_SIZE
+
+    items = list(stream._iter_json_array(io.StringIO(text)))
+
+    assert items == ["x" * (stream._READ_SIZE - 7), json.loads(tail)]
@@ -0,0 +1,63 @@
+# クエリの保存に失敗した実装対や、ジャーナルへの記録前に停止した実装対を再開時に処理し直しても、
+# パターンが重複して書き出されないことを確認するテスト
+import shutil
+
+import pytest
+
+from mb_search import journal, main, path_const, stream
+from mb_search.ast import cache
+from mb_search.bench import samples
+
+pytestmark = pytest.mark.skipif(shutil.which("node") is None, reason="the node parser backend requires Node.js")
+
+
+@pytest.fixture(autouse=True)
+def isolated_paths(tmp_path, monkeypatch):
+    for name in ("QUERIES", "PATTERN"):
+        monkeypatch.setattr(path_const, name, tmp_path / name.lower())
+    monkeypatch.setattr(cache, "_cache", cache.ASTCache(tmp_path / "ast_cache.sqlite3"))
+
+
+def test_resume_does_not_duplicate_patterns_of_failed_items(monkeypatch):
+    items = samples.load_bundled_pairs()
+    failing_id = items[0]["id"]
+    write_query_if_changed = main.write_query_if_changed
+
+    def fail_once(pattern, folder_name):
+        if pattern["name"].startswith(f"pattern_{failing_id}_"):
+            raise OSError("disk full")
+        return write_query_if_changed(pattern, folder_name)
+
+    monkeypatch.setattr(main, "write_query_if_changed", fail_once)
+    first = main.run_stream(items, workers=1, pattern_file="resume.jsonl")
+    monkeypatch.setattr(main, "write_query_if_changed", write_query_if_changed)
+    second = main.run_stream(items, workers=1, pattern_file="resume.jsonl", resume=True)
+
+    names = [pattern["name"] for pattern in stream.load_patterns("resume.jsonl")]
+    assert first["failed"] == 1
+    assert second["items"] == 1 and second["failed"] == 0
+    assert len(names) == len(set(names))
+    assert any(name.startswith(f"pattern_{failing_id}_") for name in names)
+
+
+def test_resume_after_a_crash_between_write_and_record(monkeypatch):
+    items = samples.load_bundled_pairs()
+    record = journal.RunJournal.record
+
+    def crash_on_third(self, result):
+        # パターンを書き出した後、3件目の実装対をジャーナルに記録する前に停止する
+        if len(self.records) == 2:
+            raise KeyboardInterrupt
+        record(self, result)
+
+    monkeypatch.setattr(journal.RunJournal, "record", crash_on_third)
+    with pytest.raises(KeyboardInterrupt):
+        main.run_stream(items, workers=1, pattern_file="crash.jsonl")
+    monkeypatch.setattr(journal.RunJournal, "record", record)
+    resumed = main.run_stream(items, workers=1, pattern_file="crash.jsonl", resume=True)
+    main.run_stream(items, workers=1, pattern_file="fresh.jsonl")
+
+    names = [pattern["name"] for pattern in stream.load_patterns("crash.jsonl")]
+    assert resumed["skipped"] == 2
+    assert len(names) == len(set(names))
+    assert sorted(names) == sorted(pattern["name"] for pattern in stream.load_patterns("fresh.jsonl"))
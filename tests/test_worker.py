@@ -0,0 +1,79 @@
+# 常駐させた ast_parser.js のワーカーの再起動と、位置情報の出力形式の扱いを確認するテスト
+import shutil
+
+import pytest
+
+from mb_search import metrics
+from mb_search.ast import analyzer, worker
+
+pytestmark = pytest.mark.skipif(shutil.which("node") is None, reason="the node parser backend requires Node.js")
+
+
+@pytest.fixture
+def parser():
+    parser = worker.ParserWorker()
+    yield parser
+    parser.close()
+
+
+@pytest.fixture
+def collected_metrics():
+    """テストの間だけ計測を有効にし、前後の計測値を捨てる"""
+    metrics.enable()
+    metrics.collect()
+    yield metrics.get_metrics()
+    metrics.collect()
+    metrics.enable(False)
+
+
+def test_worker_restarts_after_the_process_exits(parser, collected_metrics):
+    assert parser.parse("var a = 1;")["type"] == "Program"
+    first = parser._process
+    first.kill()
+    first.wait()
+
+    ast = parser.parse("var b = 2;")
+
+    assert ast["body"][0]["declarations"][0]["id"]["name"] == "b"
+    assert parser._process is not first
+    assert collected_metrics.counters["parse.node_startup"] == 2
+
+
+def test_worker_retries_once_when_it_dies_during_a_request(tmp_path, collected_metrics):
+    # 最初のリクエストを受け取ると応答せずに終了するワーカー
+    script = tmp_path / "crash.js"
+    script.write_text("process.stdin.once('data', () => process.exit(1));\n", encoding="utf-8")
+    parser = worker.ParserWorker(script)
+    try:
+        with pytest.raises(BrokenPipeError):
+            parser.parse("var a = 1;")
+    finally:
+        parser.close()
+
+    assert collected_metrics.counters["parse.node_startup"] == 2
+
+
+def test_parse_error_keeps_the_worker_running(parser):
+    parser.parse("var a = 1;")
+    process = parser._process
+
+    with pytest.raises(worker.ASTParseError):
+        parser.parse("var = ;")
+
+    assert parser.parse("var b = 2;")["type"] == "Program"
+    assert parser._process is process
+
+
+def test_default_locations_match_analyzer(parser):
+    code = "var x = 1;"
+
+    assert parser.parse(code) == analyzer.generate_ast(code, use_cache=False)
+    assert parser.parse_many([code]) == [parser.parse(code, worker.DEFAULT_LOCATIONS)]
+    assert "loc" not in parser.parse(code) and "range" not in parser.parse(code)
+
+
+@pytest.mark.parametrize("locations, key", [("full", "loc"), ("range", "range")])
+def test_locations_are_forwarded(parser, locations, key):
+    (ast,) = parser.parse_many(["a();"], locations)
+
+    assert key in ast and key in ast["body"][0]